@@ -0,0 +1,423 @@
+import numpy as np
+import scipy.sparse as sp
+import time
+from contextlib import closing, nullcontext
+from scipy.sparse.linalg import eigsh
+from graph_store import as_csr_graph, shared_graph_pool, worker_graph
+
+def _top_indices(scores, k):
+    '''
+    Indices of k highest scores sorted from highest, selected with partial sort.
+    '''
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+def top_k(scores, ids, k, errors=None):
+    '''
+    Get k nodes with highest scores, selected with partial sort.
+    Parameters:
+        scores (np.ndarray): score of every node
+        ids (list): node IDs in order of scores
+        k (int): number of nodes to return
+        errors (np.ndarray): error bound of score of every node, 0 for all nodes if None
+    Returns:
+        top (list): list of tuples (node, score, error) sorted by score from highest
+    '''
+    top = _top_indices(scores, k)
+    return [(ids[i], float(scores[i]), float(errors[i]) if errors is not None else 0.0) for i in top]
+
+def degree_centrality(graph):
+    '''
+    Degree centrality: number of neighbors of node divided by maximal possible number of neighbors.
+    Parameters:
+        graph (CSRGraph): graph to analyze
+    Returns:
+        centrality (np.ndarray): centrality of every node
+    '''
+    n = graph.number_of_nodes()
+    return graph.degree() / (n - 1) if n > 1 else np.ones(n)
+
+def weighted_degree_centrality(graph):
+    '''
+    Weighted degree centrality: sum of weights of edges of node, normalized to sum to 1.
+    Parameters:
+        graph (CSRGraph): graph to analyze
+    Returns:
+        centrality (np.ndarray): centrality of every node
+    '''
+    strength = graph.strength()
+    total = strength.sum()
+    return strength / total if total > 0 else strength
+
+def eigenvector_centrality(graph, weighted=False, tol=1e-6):
+    '''
+    Eigenvector centrality: leading eigenvector of adjacency matrix, found with sparse Lanczos eigensolver.
+    Vector is positive and normalized to unit length, as in nx.eigenvector_centrality().
+    Parameters:
+        graph (CSRGraph): graph to analyze
+        weighted (bool): use edge weights, every edge has weight 1 if False
+        tol (float): tolerance of eigensolver
+    Returns:
+        centrality (np.ndarray): centrality of every node
+    '''
+    n = graph.number_of_nodes()
+    adjacency = graph.to_scipy().astype(np.float64)
+    if not weighted:
+        adjacency.data[:] = 1.0
+    if n < 3:
+        _, vectors = np.linalg.eigh(adjacency.toarray())
+    else:
+        _, vectors = eigsh(adjacency, k=1, which="LA", tol=tol, v0=np.ones(n))
+    vector = vectors[:, -1]
+    vector = vector if vector.sum() >= 0 else -vector
+    return vector / np.linalg.norm(vector)
+
+def pagerank(graph, alpha=0.85, tol=1e-6, max_iter=100):
+    '''
+    PageRank of weighted graph computed with power iteration on sparse matrix.
+    Random jumps are uniform and rank of nodes without edges is spread uniformly, as in nx.pagerank().
+    Parameters:
+        graph (CSRGraph): graph to analyze
+        alpha (float): damping factor
+        tol (float): convergence tolerance per node
+        max_iter (int): maximal number of iterations
+    Returns:
+        centrality (np.ndarray): PageRank of every node, sums to 1
+    '''
+    n = graph.number_of_nodes()
+    if n == 0:
+        return np.zeros(0)
+    adjacency = graph.to_scipy().astype(np.float64)
+    strength = np.asarray(adjacency.sum(axis=1)).ravel()
+    dangling = strength == 0
+    transition = sp.diags(np.divide(1.0, strength, out=np.zeros(n), where=~dangling)) @ adjacency
+    rank = np.full(n, 1.0 / n)
+    for _ in range(max_iter):
+        previous = rank
+        rank = alpha * (transition.T @ rank + rank[dangling].sum() / n) + (1 - alpha) / n
+        if np.abs(rank - previous).sum() < n * tol:
+            break
+    else:
+        print(f"PageRank did not converge in {max_iter} iterations.")
+    return rank / rank.sum()
+
+def _neighbors(graph, frontier):
+    '''
+    Get all edges leaving nodes of frontier.
+    Returns:
+        sources (np.ndarray): node of frontier of every edge
+        targets (np.ndarray): neighbor of every edge
+    '''
+    starts = graph.indptr[frontier]
+    lengths = graph.indptr[frontier + 1] - starts
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.repeat(frontier, lengths), graph.indices[np.repeat(starts, lengths) + offsets]
+
+def _bfs(graph, source, count_paths=False):
+    '''
+    Breadth-first search from source, expanding whole level at once.
+    Returns:
+        distances (np.ndarray): number of hops from source to every node, -1 for unreachable nodes
+        sigma (np.ndarray): number of shortest paths from source to every node, None if count_paths is False
+        levels (list): tuples (sources, targets) of shortest path edges between consecutive levels
+    '''
+    n = graph.number_of_nodes()
+    distances = np.full(n, -1, dtype=np.int64)
+    distances[source] = 0
+    sigma = None
+    if count_paths:
+        sigma = np.zeros(n)
+        sigma[source] = 1.0
+    levels = []
+    frontier = np.array([source])
+    depth = 0
+    while len(frontier):
+        sources, targets = _neighbors(graph, frontier)
+        frontier = np.unique(targets[distances[targets] < 0])
+        distances[frontier] = depth + 1
+        if count_paths:
+            on_path = distances[targets] == depth + 1
+            sources, targets = sources[on_path], targets[on_path]
+            sigma += np.bincount(targets, weights=sigma[sources], minlength=n)
+            levels.append((sources, targets))
+        depth += 1
+    return distances, sigma, levels
+
+def _betweenness_chunk(graph, sources):
+    '''
+    Sum of Brandes dependencies of every node on given sources and sum of their squares.
+    Returns:
+        dependencies (np.ndarray): sum of dependencies of every node
+        squares (np.ndarray): sum of squared dependencies of every node
+        count (int): number of sources
+    '''
+    n = graph.number_of_nodes()
+    dependencies = np.zeros(n)
+    squares = np.zeros(n)
+    for source in sources:
+        _, sigma, levels = _bfs(graph, source, count_paths=True)
+        delta = np.zeros(n)
+        for parents, children in reversed(levels):
+            delta += np.bincount(parents, weights=sigma[parents] / sigma[children] * (1 + delta[children]), minlength=n)
+        delta[source] = 0
+        dependencies += delta
+        squares += delta ** 2
+    return dependencies, squares, len(sources)
+
+def _distance_chunk(graph, pivots):
+    '''
+    Sum of distances from given pivots to every node.
+    Returns:
+        distances (np.ndarray): sum of distances to every node from pivots reaching it
+        reached (np.ndarray): number of pivots reaching every node
+        eccentricity (int): smallest eccentricity of pivots
+        count (int): number of pivots
+    '''
+    n = graph.number_of_nodes()
+    total = np.zeros(n)
+    reached = np.zeros(n, dtype=np.int64)
+    eccentricity = n
+    for pivot in pivots:
+        distances, _, _ = _bfs(graph, pivot)
+        reachable = distances >= 0
+        total[reachable] += distances[reachable]
+        reached += reachable
+        eccentricity = min(eccentricity, int(distances.max()))
+    return total, reached, eccentricity, len(pivots)
+
+_CHUNK_FUNCTIONS = {
+    "betweenness": _betweenness_chunk,
+    "distance": _distance_chunk,
+}
+
+def _run_chunk(task):
+    '''
+    Run chunk function on graph loaded by worker of shared_graph_pool(). Runs in worker process.
+    '''
+    name, sources = task
+    return _CHUNK_FUNCTIONS[name](worker_graph(), sources)
+
+'''
+Number of sampled sources of first round of sampled measures stopping at resolved top nodes,
+every next round doubles number of sources.
+'''
+INITIAL_SAMPLES = 64
+
+def _sampled_rounds(graph, name, sources, sizes, processes=None, graph_dir=None, time_budget=None, chunk_size=8):
+    '''
+    Run chunk function over chunks of sampled sources in rounds, round r processes sources up to sizes[r].
+    Rounds run in one pool of worker processes sharing graph memory mapped from graph_dir, or in current process if processes=0.
+    When time budget runs out, remaining chunks are dropped and no more rounds are run.
+    Yields:
+        results (list): results of finished chunks of round
+    '''
+    start = time.time()
+    done = 0
+    with (nullcontext() if processes == 0 else shared_graph_pool(graph, graph_dir, processes)) as pool:
+        for size in sizes:
+            chunks = [sources[i:i + chunk_size] for i in range(done, size, chunk_size)]
+            done = size
+            if pool is None:
+                finished = (_CHUNK_FUNCTIONS[name](graph, chunk) for chunk in chunks)
+            else:
+                finished = pool.imap_unordered(_run_chunk, [(name, chunk) for chunk in chunks])
+            results = []
+            out_of_time = False
+            for result in finished:
+                results.append(result)
+                if time_budget is not None and time.time() - start > time_budget:
+                    out_of_time = True
+                    break
+            yield results
+            if out_of_time:
+                return
+
+def _round_sizes(n, samples, top):
+    '''
+    Number of sources processed after every round: all samples in one round if top is None,
+    otherwise INITIAL_SAMPLES doubled every round up to samples.
+    '''
+    total = n if samples is None else min(samples, n)
+    if top is None:
+        return [total]
+    sizes = [min(INITIAL_SAMPLES, total)]
+    while sizes[-1] < total:
+        sizes.append(min(2 * sizes[-1], total))
+    return sizes
+
+def _resolved(centrality, error, top):
+    '''
+    Check if error bounds of top nodes are not larger than spread of their scores, so their order is meaningful.
+    '''
+    indices = _top_indices(centrality, top)
+    return len(indices) > 0 and error[indices].max() <= centrality[indices[0]] - centrality[indices[-1]]
+
+def _sample(n, samples, seed):
+    '''
+    Sample nodes in random order, all nodes if samples is None or not smaller than n.
+    '''
+    order = np.random.default_rng(seed).permutation(n)
+    return order if samples is None or samples >= n else order[:samples]
+
+def _betweenness_estimate(results, n, failure):
+    '''
+    Betweenness estimate and its error bounds from results of finished chunks, see sampled_betweenness().
+    '''
+    k = sum(count for _, _, count in results)
+    dependencies = sum(dependency for dependency, _, _ in results)
+    squares = sum(square for _, square, _ in results)
+    scale = n / ((n - 1) * (n - 2))
+    centrality = dependencies * scale / k
+    if k >= n:
+        return centrality, np.zeros(n), k
+    bound = n / (n - 1)
+    log_term = np.log(4 * n / failure)
+    error = np.full(n, bound * np.sqrt(log_term / (2 * k)))
+    if k > 1:
+        variance = np.maximum(squares * scale ** 2 - k * centrality ** 2, 0) / (k - 1)
+        error = np.minimum(error, np.sqrt(2 * variance * log_term / k) + 7 * bound * log_term / (3 * (k - 1)))
+    return centrality, error, k
+
+def sampled_betweenness(graph, samples=4096, time_budget=None, processes=None, seed=None, graph_dir=None, confidence=0.95, top=None):
+    '''
+    Betweenness centrality estimated with Brandes algorithm from sampled sources, normalized as nx.betweenness_centrality().
+    Shortest paths are counted in hops, edge weights are not used.
+    Every sampled source adds at most n/(n-1) to estimate. Error of every node is the smaller of empirical Bernstein
+    bound, which uses variance of contributions of sources to that node, and Hoeffding bound, which holds for
+    any node, each taken with half of failure probability, so all estimates are within their errors with given
+    confidence. Bernstein bound shrinks with estimate, but its range term 7n/(n-1)*log(4n/(1-confidence))/(3(k-1))
+    does not, so with k sources nodes with betweenness below it cannot be told apart, only their order is kept.
+    With top set, sources are sampled in rounds doubling their number, and sampling stops when error bounds of
+    top nodes are not larger than spread of their estimates. Round r is bounded with failure probability
+    (1-confidence)/2^(r+1), so bounds of all rounds hold together with given confidence.
+    Error is 0 if all nodes are used as sources.
+    Parameters:
+        graph (CSRGraph): graph to analyze
+        samples (int): maximal number of sampled sources, all nodes if None
+        time_budget (float): time limit in seconds, sources not processed within limit are skipped
+        processes (int): number of worker processes, defaults to number of CPUs, 0 to run in current process
+        seed (int): seed of random generator
+        graph_dir (str): directory where graph is already saved as CSRGraph, graph is saved to temporary directory if None
+        confidence (float): confidence of error bound
+        top (int): number of top nodes whose estimates should be resolved, None to always use all samples
+    Returns:
+        centrality (np.ndarray): estimated betweenness of every node
+        error (np.ndarray): bound of absolute error of estimate of every node
+    '''
+    n = graph.number_of_nodes()
+    if n < 3:
+        return np.zeros(n), np.zeros(n)
+    sizes = _round_sizes(n, samples, top)
+    results = []
+    with closing(_sampled_rounds(graph, "betweenness", _sample(n, samples, seed), sizes, processes, graph_dir, time_budget)) as rounds:
+        for r, finished in enumerate(rounds):
+            results += finished
+            failure = (1 - confidence) / 2 ** (r + 1) if top is not None else 1 - confidence
+            centrality, error, k = _betweenness_estimate(results, n, failure)
+            if top is not None and _resolved(centrality, error, top):
+                break
+    best = int(np.argmax(centrality))
+    print(f"Betweenness estimated from {k} of {n} sources with confidence {confidence}: error bound {error[best]:.3g} "
+          f"of largest estimate {centrality[best]:.3g}, at most {error.max():.3g}.")
+    return centrality, error
+
+def _closeness_estimate(results, n, failure):
+    '''
+    Closeness estimate, its error bounds and error bound of mean distances from results of finished chunks, see sampled_closeness().
+    '''
+    k = sum(result[3] for result in results)
+    total = sum(result[0] for result in results)
+    reached = sum(result[1] for result in results)
+    eccentricity = min(result[2] for result in results)
+    mean_distance = np.divide(total, reached, out=np.zeros(n), where=reached > 0)
+    centrality = np.divide(n - 1, n * mean_distance, out=np.zeros(n), where=mean_distance > 0)
+    if k >= n:
+        return centrality, np.zeros(n), 0.0, k
+    distance_error = 2 * eccentricity * np.sqrt(np.log(2 * n / failure) / (2 * k))
+    lowest = np.maximum(mean_distance - distance_error, (n - 1) / n)
+    error = np.where(mean_distance > 0, (n - 1) / (n * lowest) - centrality, 0.0)
+    return centrality, error, distance_error, k
+
+def sampled_closeness(graph, samples=4096, time_budget=None, processes=None, seed=None, graph_dir=None, confidence=0.95, top=None):
+    '''
+    Closeness centrality estimated from distances to sampled pivots, as nx.closeness_centrality() of connected graph.
+    Distances are counted in hops, edge weights are not used. Mean distance of every node is estimated by its mean
+    distance to pivots, so by Hoeffding inequality it is within its error bound of exact value with given confidence.
+    Diameter in the bound is limited by twice the smallest eccentricity of pivots. Error of closeness is the largest
+    change of closeness within error of mean distance, mean distance is at least (n-1)/n.
+    With top set, pivots are sampled in rounds as in sampled_betweenness(). Error is 0 if all nodes are pivots.
+    Parameters:
+        graph (CSRGraph): graph to analyze, expected to be connected
+        samples (int): maximal number of sampled pivots, all nodes if None
+        time_budget (float): time limit in seconds, pivots not processed within limit are skipped
+        processes (int): number of worker processes, defaults to number of CPUs, 0 to run in current process
+        seed (int): seed of random generator
+        graph_dir (str): directory where graph is already saved as CSRGraph, graph is saved to temporary directory if None
+        confidence (float): confidence of error bound
+        top (int): number of top nodes whose estimates should be resolved, None to always use all samples
+    Returns:
+        centrality (np.ndarray): estimated closeness of every node
+        error (np.ndarray): bound of absolute error of estimate of every node
+    '''
+    n = graph.number_of_nodes()
+    if n < 2:
+        return np.zeros(n), np.zeros(n)
+    sizes = _round_sizes(n, samples, top)
+    results = []
+    with closing(_sampled_rounds(graph, "distance", _sample(n, samples, seed), sizes, processes, graph_dir, time_budget)) as rounds:
+        for r, finished in enumerate(rounds):
+            results += finished
+            failure = (1 - confidence) / 2 ** (r + 1) if top is not None else 1 - confidence
+            centrality, error, distance_error, k = _closeness_estimate(results, n, failure)
+            if top is not None and _resolved(centrality, error, top):
+                break
+    print(f"Closeness estimated from {k} of {n} pivots with confidence {confidence}: error bound of mean distance {distance_error:.3g} hops, "
+          f"of closeness at most {error.max():.3g}.")
+    return centrality, error
+
+'''
+Centrality measures computed by analyze_centrality(), functions take CSRGraph and return score of every node.
+Sampled measures also take sampling options and return error bound of every score.
+'''
+CENTRALITY_MEASURES = {
+    "Degree Centrality": degree_centrality,
+    "Weighted Degree Centrality": weighted_degree_centrality,
+    "Eigenvector Centrality": eigenvector_centrality,
+    "PageRank": pagerank,
+    "Betweenness Centrality": sampled_betweenness,
+    "Closeness Centrality": sampled_closeness,
+}
+
+SAMPLED_MEASURES = ("Betweenness Centrality", "Closeness Centrality")
+
+def analyze_centrality(G, amount=10, measures=None, samples=4096, time_budget=None, processes=None, graph_dir=None, seed=None):
+    '''
+    Analyze centrality measures of nodes in graph G.
+    Parameters:
+        G (nx.Graph or CSRGraph): graph to analyze
+        amount (int): number of top nodes to return
+        measures (list): names of measures from CENTRALITY_MEASURES, all measures if None
+        samples (int): maximal number of sampled sources of betweenness and closeness, all nodes if None,
+            sampling stops earlier when error bounds of top nodes are not larger than spread of their scores
+        time_budget (float): time limit in seconds of every sampled measure
+        processes (int): number of worker processes of sampled measures, 0 to run in current process
+        graph_dir (str): directory where G is already saved as CSRGraph, used by workers of sampled measures
+        seed (int): seed of random generator of sampled measures
+    Returns:
+        results (dict): dictionary where keys are centrality measures, values are lists of tuples
+            (node, centrality value, error bound), error bound is 0 for measures which are not sampled
+    '''
+    graph = as_csr_graph(G)
+    ids = graph.ids.tolist()
+    results = {}
+    for measure in measures or CENTRALITY_MEASURES:
+        if measure in SAMPLED_MEASURES:
+            scores, errors = CENTRALITY_MEASURES[measure](graph, samples, time_budget, processes, seed, graph_dir, top=amount)
+        else:
+            scores, errors = CENTRALITY_MEASURES[measure](graph), None
+        print(f"{measure} calculated.")
+        results[measure] = top_k(scores, ids, amount, errors)
+    return results
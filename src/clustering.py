@@ -1,81 +1,537 @@
-import networkx as nx
-import community as community_louvain  
-from cdlib import algorithms
+import igraph as ig
+import leidenalg
 import numpy as np
+import scipy.sparse as sp
+import multiprocessing
+import os
+import random
+import time
+from graph_store import CSRGraph, as_csr_graph, shared_graph_pool, worker_graph
+from partition import Partition, as_partition
+try:
+    import resource
+except ImportError:
+    resource = None
 
-def apply_clustering_algorithms(G):
+class PreparedGraph:
+    '''
+    Integer-indexed igraph representation of graph, built once per run from CSR arrays
+    and shared by all clustering algorithms. Labels are mapped back to node IDs only at the end.
+    Parameters:
+        G (nx.Graph or CSRGraph): graph to prepare
+    Attributes:
+        csr (CSRGraph): graph in CSR form
+        ids (list): node IDs, index in list is vertex index in igraph
+        igraph (ig.Graph): igraph graph with "weight" edge attribute
+    '''
+    def __init__(self, G):
+        self.csr = as_csr_graph(G)
+        self.ids = self.csr.ids.tolist()
+        sources, targets, weights = self.csr.edges()
+        self.igraph = ig.Graph(n=len(self.ids), edges=np.column_stack((sources, targets)))
+        self.igraph.es["weight"] = weights.astype(np.float64)
+        self._index = None
+
+    def __repr__(self):
+        return f"PreparedGraph(nodes={self.igraph.vcount()}, edges={self.igraph.ecount()})"
+
+    @property
+    def index(self):
+        '''
+        Dictionary where keys are node IDs, values are vertex indices.
+        '''
+        if self._index is None:
+            self._index = {node: i for i, node in enumerate(self.ids)}
+        return self._index
+
+    def membership(self, partition):
+        '''
+        Get community of every vertex from partition of node IDs.
+        Parameters:
+            partition (dict or Partition): partition of nodes of graph
+        Returns:
+            membership (np.ndarray): community index of every vertex
+        '''
+        return as_partition(partition).labels_for(self.ids)
+
+    def to_dict(self, membership):
+        '''
+        Map community of every vertex back to node IDs.
+        Parameters:
+            membership (list): community of every vertex
+        Returns:
+            partition (dict): dictionary where keys are nodes, values are community assignments
+        '''
+        return dict(zip(self.ids, np.asarray(membership).tolist()))
+
+def prepare_graph(G):
+    '''
+    Get PreparedGraph of G, preparing it only if it is not prepared yet.
+    Parameters:
+        G (nx.Graph, CSRGraph or PreparedGraph): graph
+    Returns:
+        prepared (PreparedGraph): prepared graph
+    '''
+    return G if isinstance(G, PreparedGraph) else PreparedGraph(G)
+
+def _csr(G):
+    '''
+    Get CSRGraph of G without preparing igraph copy.
+    '''
+    return G.csr if isinstance(G, PreparedGraph) else as_csr_graph(G)
+
+def louvain(prepared, seed=None, initial_membership=None):
+    '''
+    Louvain clustering of weighted graph: local moving of nodes followed by aggregation,
+    repeated on aggregated graph until no node is moved.
+    Parameters:
+        prepared (PreparedGraph): graph to partition
+        seed (int): seed of random generator
+        initial_membership (list): community of every vertex to start from, singletons if None
+    Returns:
+        membership (list): community of every vertex
+    '''
+    partition = leidenalg.ModularityVertexPartition(prepared.igraph, initial_membership=initial_membership, weights="weight")
+    optimiser = leidenalg.Optimiser()
+    if seed is not None:
+        optimiser.set_rng_seed(seed)
+    optimiser.move_nodes(partition)
+    aggregate = partition.aggregate_partition()
+    while optimiser.move_nodes(aggregate) > 0:
+        partition.from_coarse_partition(aggregate)
+        aggregate = aggregate.aggregate_partition()
+    return partition.membership
+
+def leiden(prepared, seed=None, initial_membership=None, resolution=None):
+    '''
+    Leiden clustering of graph.
+    Parameters:
+        prepared (PreparedGraph): graph to partition
+        seed (int): seed of random generator
+        initial_membership (list): community of every vertex to start from, singletons if None
+        resolution (float): resolution parameter of weighted modularity, same as reported by resolution_sweep(),
+            plain unweighted modularity if None
+    Returns:
+        membership (list): community of every vertex
+    '''
+    if resolution is None:
+        return leidenalg.find_partition(prepared.igraph, leidenalg.ModularityVertexPartition,
+                                        initial_membership=initial_membership, seed=seed).membership
+    return leidenalg.find_partition(prepared.igraph, leidenalg.RBConfigurationVertexPartition,
+                                    initial_membership=initial_membership, seed=seed, weights="weight",
+                                    resolution_parameter=resolution).membership
+
+def label_propagation(prepared, seed=None):
+    '''
+    Label Propagation clustering of graph.
+    Parameters:
+        prepared (PreparedGraph): graph to partition
+        seed (int): seed of random generator
+    Returns:
+        membership (list): community of every vertex
+    '''
+    if seed is None:
+        return prepared.igraph.community_label_propagation().membership
+    # igraph has no getter of its generator, it uses random module unless it is replaced
+    ig.set_random_number_generator(random.Random(seed))
+    try:
+        return prepared.igraph.community_label_propagation().membership
+    finally:
+        ig.set_random_number_generator(random)
+
+'''
+Clustering methods applied by apply_clustering_algorithms(), new methods are added by registering
+a function taking PreparedGraph and seed and returning community of every vertex.
+'''
+CLUSTERING_METHODS = {
+    "louvain": louvain,
+    "leiden": leiden,
+    "label_propagation": label_propagation,
+}
+
+'''
+Methods accepting initial_membership, which can be warm started from previous partition.
+'''
+WARM_START_METHODS = ("louvain", "leiden")
+
+def _previous_indices(previous, ids):
+    '''
+    Index of every node of ids in previous partition, -1 for nodes not present in it.
+    '''
+    index = previous.index
+    return np.fromiter((index.get(node, -1) for node in ids), dtype=np.int64, count=len(ids))
+
+def warm_start_membership(prepared, previous):
+    '''
+    Build initial membership from previous partition, nodes not present in it start as singletons.
+    Parameters:
+        prepared (PreparedGraph): graph to partition
+        previous (Partition): previous partition of graph
+    Returns:
+        membership (np.ndarray): initial community of every vertex, numbered from 0
+    '''
+    known = _previous_indices(previous, prepared.ids)
+    present = known >= 0
+    membership = np.empty(len(known), dtype=np.int64)
+    _, membership[present] = np.unique(previous.labels[known[present]], return_inverse=True)
+    first_new = membership[present].max() + 1 if present.any() else 0
+    membership[~present] = first_new + np.arange(np.count_nonzero(~present))
+    return membership
+
+def align_labels(previous, ids, membership):
+    '''
+    Relabel communities so that they keep labels of previous partition.
+    Communities are matched one to one with previous communities in order of largest overlap,
+    unmatched communities get new labels above all previous labels.
+    Parameters:
+        previous (Partition): previous partition
+        ids (list): node IDs, in order of membership
+        membership (list): community of every node
+    Returns:
+        labels (np.ndarray): stable community label of every node
+    '''
+    membership = np.asarray(membership, dtype=np.int64)
+    k = int(membership.max()) + 1 if len(membership) else 0
+    known = _previous_indices(previous, ids)
+    present = known >= 0
+    keys = membership[present] * len(previous) + previous.labels[known[present]]
+    pairs, counts = np.unique(keys, return_counts=True)
+    mapping = {}
+    used = set()
+    for pair in pairs[np.argsort(-counts, kind="stable")].tolist():
+        new, old = divmod(pair, len(previous))
+        if new in mapping or old in used:
+            continue
+        mapping[new] = int(previous.label_ids[old])
+        used.add(old)
+    next_label = int(previous.label_ids.max()) + 1 if len(previous) else 0
+    labels = np.empty(k, dtype=np.int64)
+    for community in range(k):
+        if community in mapping:
+            labels[community] = mapping[community]
+        else:
+            labels[community] = next_label
+            next_label += 1
+    return labels[membership]
+
+def _peak_memory_mb():
+    '''
+    Peak resident memory of current process in MB, None where resource module is not available.
+    '''
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _cluster(prepared, method, previous=None, seed=None):
+    '''
+    Run clustering method, warm started from previous partition if method supports it.
+    Parameters:
+        prepared (PreparedGraph): graph to partition
+        method (str): name of method in CLUSTERING_METHODS
+        previous (Partition): previous partition of graph, None to start from singletons
+        seed (int): seed of random generator
+    Returns:
+        membership (list): community of every vertex
+    '''
+    if previous is not None and method in WARM_START_METHODS:
+        initial = warm_start_membership(prepared, previous).tolist()
+        return CLUSTERING_METHODS[method](prepared, seed=seed, initial_membership=initial)
+    return CLUSTERING_METHODS[method](prepared, seed=seed)
+
+def _run_method(method, previous_path=None, seed=None):
+    '''
+    Run clustering method on graph prepared by worker of shared_graph_pool(). Runs in worker process.
+    Parameters:
+        method (str): name of method in CLUSTERING_METHODS
+        previous_path (str): path to previous partition saved with Partition.save(), None to start from singletons
+        seed (int): seed of random generator
+    Returns:
+        membership (np.ndarray): community of every vertex
+        seconds (float): wall time of clustering
+        peak_memory (float): peak resident memory of worker in MB
+    '''
+    start = time.time()
+    previous = Partition.load(previous_path) if previous_path else None
+    membership = _cluster(worker_graph(), method, previous, seed)
+    return np.asarray(membership, dtype=np.int64), time.time() - start, _peak_memory_mb()
+
+def _previous_partition_path(warm_start_dir, method):
+    '''
+    Path to persisted partition of method, None if there is none.
+    '''
+    if warm_start_dir is None:
+        return None
+    path = os.path.join(warm_start_dir, f"{method}.npz")
+    return path if os.path.exists(path) else None
+
+def apply_clustering_algorithms(G, methods=None, processes=None, timeouts=None, graph_dir=None, warm_start_dir=None, seed=None):
     '''
     Apply clustering algorithms to provided graph G.
+    Methods run at the same time in a pool of worker processes. Workers read the graph
+    memory mapped from graph_dir instead of receiving their own pickled copy, and return
+    only community indices of vertices, which are mapped back to node IDs at the end.
+    With processes=0 methods run one after another in current process on one PreparedGraph.
+    With warm_start_dir, Leiden and Louvain start from partitions persisted by previous run, new nodes
+    start as singletons. Communities of every method keep labels of previous run where they overlap,
+    and new partitions are persisted for the next run.
     Parameters:
-        G (nx.Graph): graph to partition
+        G (nx.Graph, CSRGraph or PreparedGraph): graph to partition
+        methods (list): names of methods from CLUSTERING_METHODS, all methods if None
+        processes (int): number of worker processes, defaults to number of methods
+        timeouts (dict): dictionary where keys are method names, values are time limits in seconds,
+            methods exceeding their limit are skipped, used only with worker processes
+        graph_dir (str): directory where G is already saved as CSRGraph, G is saved to temporary directory if None
+        warm_start_dir (str): directory with persisted partitions, None to always start from singletons
+        seed (int): seed of random generator of every method, runs on the same graph give the same partitions if set
     Returns: 
         clusters (dict): dictionary where keys are method names, values are partition results.
     '''
+    methods = list(methods or CLUSTERING_METHODS)
+    memberships = {}
+    if processes == 0:
+        prepared = prepare_graph(G)
+        ids = prepared.ids
+        for method in methods:
+            print(f"Applying {method} clustering...")
+            start = time.time()
+            previous_path = _previous_partition_path(warm_start_dir, method)
+            previous = Partition.load(previous_path) if previous_path else None
+            memberships[method] = _cluster(prepared, method, previous, seed)
+            print(f"{method} clustering done in {time.time() - start:.1f}s.")
+    else:
+        timeouts = timeouts or {}
+        graph = _csr(G)
+        ids = graph.ids.tolist()
+        start = time.time()
+        with shared_graph_pool(graph, graph_dir, processes or len(methods), prepare=PreparedGraph, maxtasksperchild=1) as pool:
+            tasks = {}
+            for method in methods:
+                print(f"Applying {method} clustering...")
+                tasks[method] = pool.apply_async(_run_method, (method, _previous_partition_path(warm_start_dir, method), seed))
+            for method, task in tasks.items():
+                remaining = None
+                if method in timeouts:
+                    remaining = max(0.0, timeouts[method] - (time.time() - start))
+                try:
+                    membership, seconds, peak_memory = task.get(remaining)
+                except multiprocessing.TimeoutError:
+                    print(f"{method} clustering exceeded time limit of {timeouts[method]}s, skipped.")
+                    continue
+                memberships[method] = membership
+                memory = f"{peak_memory:.0f} MB" if peak_memory is not None else "unknown"
+                print(f"{method} clustering done in {seconds:.1f}s, peak memory {memory}.")
+
     clusters = {}
-    print("Applying Louvain clustering...")
-    louvain_partition = community_louvain.best_partition(G)
-    clusters['louvain'] = louvain_partition
-    print("Louvain clustering done.")
-    
-    print("Applying Leiden clustering...")
-    leiden_communities = algorithms.leiden(G)
-    leiden_partition = {node: idx for idx, community in enumerate(leiden_communities.communities) for node in community}
-    clusters['leiden'] = leiden_partition
-    print("Leiden clustering done.")
-    
-    print("Applying Label Propagation clustering...")
-    label_propagation_communities = algorithms.label_propagation(G)
-    label_propagation_partition = {node: idx for idx, community in enumerate(label_propagation_communities.communities) for node in community}
-    clusters['label_propagation'] = label_propagation_partition
-    print("Label Propagation clustering done.")
+    for method, membership in memberships.items():
+        previous_path = _previous_partition_path(warm_start_dir, method)
+        if previous_path:
+            membership = align_labels(Partition.load(previous_path), ids, membership)
+        clusters[method] = dict(zip(ids, np.asarray(membership).tolist()))
+        if warm_start_dir is not None:
+            os.makedirs(warm_start_dir, exist_ok=True)
+            Partition.from_dict(clusters[method]).save(os.path.join(warm_start_dir, f"{method}.npz"))
     return clusters
 
-def calculate_modularity(G, partition):
+'''
+Default grid of resolutions of resolution_sweep().
+'''
+SWEEP_RESOLUTIONS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0)
+
+'''
+Default maximal number of worker processes of resolution_sweep() and consensus_clustering(),
+every worker holds its own igraph copy of graph, so memory grows with number of workers.
+'''
+MAX_GRAPH_WORKERS = 4
+
+def _graph_workers(processes, tasks):
+    '''
+    Number of worker processes holding graph: given number, or number of tasks limited by number of CPUs and MAX_GRAPH_WORKERS.
+    '''
+    return processes or max(1, min(tasks, os.cpu_count() or 1, MAX_GRAPH_WORKERS))
+
+def _run_resolution(resolution, seed=None):
+    '''
+    Run Leiden clustering with given resolution on graph prepared by worker of shared_graph_pool(). Runs in worker process.
+    Returns:
+        membership (np.ndarray): community of every vertex
+        seconds (float): wall time of clustering
+    '''
+    start = time.time()
+    membership = leiden(worker_graph(), seed=seed, resolution=resolution)
+    return np.asarray(membership, dtype=np.int64), time.time() - start
+
+def resolution_sweep(G, resolutions=SWEEP_RESOLUTIONS, processes=None, seed=None, graph_dir=None, quantiles=(0.5, 0.9, 0.99)):
     '''
-    Calculate modularity of given partition of graph G.
+    Run Leiden clustering of G for every resolution of grid.
+    Resolutions run at the same time in a pool of worker processes, every worker prepares graph
+    memory mapped from graph_dir once and reuses it for all resolutions it runs.
+    With processes=0 resolutions run one after another in current process on one PreparedGraph.
     Parameters:
-        G (nx.Graph): partitioned graph
-        partition (dict): dictionary where keys are nodes, values are community assignments
+        G (nx.Graph, CSRGraph or PreparedGraph): graph to partition
+        resolutions (list): resolution parameters of modularity
+        processes (int): number of worker processes, defaults to number of resolutions limited by number of CPUs and MAX_GRAPH_WORKERS
+        seed (int): seed of random generator
+        graph_dir (str): directory where G is already saved as CSRGraph, G is saved to temporary directory if None
+        quantiles (list): quantiles of community sizes to report
     Returns:
-        modularity (float): modularity of given partition
+        sweep (dict): dictionary where keys are resolutions, values are dictionaries with
+            partition (dict), modularity of weighted graph at that resolution, communities (number of communities)
+            and size_quantiles (dictionary where keys are quantiles, values are community sizes)
+    '''
+    memberships = {}
+    if processes == 0:
+        prepared = prepare_graph(G)
+        graph = prepared.csr
+        for resolution in resolutions:
+            start = time.time()
+            memberships[resolution] = np.asarray(leiden(prepared, seed=seed, resolution=resolution), dtype=np.int64)
+            print(f"Leiden clustering with resolution {resolution} done in {time.time() - start:.1f}s.")
+    else:
+        graph = _csr(G)
+        with shared_graph_pool(graph, graph_dir, _graph_workers(processes, len(resolutions)), prepare=PreparedGraph) as pool:
+            tasks = {resolution: pool.apply_async(_run_resolution, (resolution, seed)) for resolution in resolutions}
+            for resolution, task in tasks.items():
+                memberships[resolution], seconds = task.get()
+                print(f"Leiden clustering with resolution {resolution} done in {seconds:.1f}s.")
+
+    ids = graph.ids.tolist()
+    sweep = {}
+    for resolution, membership in memberships.items():
+        statistics = community_statistics(graph, Partition(ids, membership, np.arange(membership.max() + 1)), resolution)
+        modularity = float(statistics["modularity"].sum())
+        sizes = statistics["sizes"]
+        sweep[resolution] = {
+            "partition": dict(zip(ids, membership.tolist())),
+            "modularity": modularity,
+            "communities": len(sizes),
+            "size_quantiles": dict(zip(quantiles, np.quantile(sizes, quantiles).tolist())),
+        }
+        print(f"Resolution {resolution}: modularity {modularity:.4f}, {len(sizes)} communities, largest {sizes.max()} nodes.")
+    return sweep
+
+def _run_seeded(method, seed):
+    '''
+    Run clustering method with given seed on graph prepared by worker of shared_graph_pool(). Runs in worker process.
+    Returns:
+        membership (np.ndarray): community of every vertex
     '''
-    return community_louvain.modularity(partition, G)
+    return np.asarray(CLUSTERING_METHODS[method](worker_graph(), seed=seed), dtype=np.int64)
 
-def calculate_density(G, community):
+def consensus_clustering(G, methods=None, runs=10, processes=None, seed=0, graph_dir=None):
     '''
-    Calculate density of given community in graph G.
-    Density is defined as number of edges divided by number of all possible edges in a clique of the same size.
+    Consensus clustering of G over repeated runs of clustering methods with different seeds.
+    Runs execute at the same time in a pool of worker processes, every worker prepares graph memory mapped
+    from graph_dir once. Consensus graph has the same edges as G, weight of edge is fraction of runs which
+    assigned both its nodes to one community, so it is built without matrix over all pairs of nodes.
+    Edges never co-assigned are dropped and consensus graph is clustered with Louvain.
+    Stability of node is mean agreement of runs with consensus partition over edges of node, weighted
+    by edge weights: fraction of runs co-assigning neighbours in the same consensus community,
+    fraction of runs separating neighbours in different consensus communities.
+    With processes=0 runs execute one after another in current process on one PreparedGraph.
     Parameters:
-        G (nx.Graph): graph containing community
-        community (list): list of nodes in community
+        G (nx.Graph, CSRGraph or PreparedGraph): graph to partition
+        methods (list): names of methods from CLUSTERING_METHODS, all methods if None
+        runs (int): number of runs of every method
+        processes (int): number of worker processes, defaults to number of runs limited by number of CPUs and MAX_GRAPH_WORKERS
+        seed (int): seed of first run, following runs use next seeds, also seed of consensus clustering
+        graph_dir (str): directory where G is already saved as CSRGraph, G is saved to temporary directory if None
     Returns:
-        density (float): density of community as a subgraph of G
+        consensus (dict): dictionary with partition (dict of consensus communities of nodes),
+            stability (dict of stability of nodes) and runs (total number of runs)
     '''
-    subgraph = G.subgraph(community)
-    return nx.density(subgraph)
+    methods = list(methods or CLUSTERING_METHODS)
+    tasks = [(method, seed + i) for method in methods for i in range(runs)]
+    if processes == 0:
+        prepared = prepare_graph(G)
+        graph = prepared.csr
+        memberships = [np.asarray(CLUSTERING_METHODS[method](prepared, seed=run_seed), dtype=np.int64) for method, run_seed in tasks]
+    else:
+        graph = _csr(G)
+        with shared_graph_pool(graph, graph_dir, _graph_workers(processes, len(tasks)), prepare=PreparedGraph) as pool:
+            memberships = pool.starmap(_run_seeded, tasks)
+    print(f"Consensus of {len(memberships)} runs of {', '.join(methods)}.")
+
+    sources, targets, weights = graph.edges()
+    together = np.zeros(len(sources))
+    for membership in memberships:
+        together += membership[sources] == membership[targets]
+    together /= len(memberships)
+    n = graph.number_of_nodes()
+    kept = together > 0
+    adjacency = sp.coo_array((together[kept], (sources[kept], targets[kept])), shape=(n, n))
+    consensus_graph = PreparedGraph(CSRGraph.from_scipy(adjacency + adjacency.T, graph.ids))
+    membership = np.asarray(louvain(consensus_graph, seed=seed), dtype=np.int64)
+
+    weights = weights.astype(np.float64)
+    same = membership[sources] == membership[targets]
+    agreement = np.where(same, together, 1 - together) * weights
+    strength = np.bincount(sources, weights=weights, minlength=n) + np.bincount(targets, weights=weights, minlength=n)
+    agreed = np.bincount(sources, weights=agreement, minlength=n) + np.bincount(targets, weights=agreement, minlength=n)
+    stability = np.divide(agreed, strength, out=np.ones(n), where=strength > 0)
+    ids = graph.ids.tolist()
+    print(f"Consensus partition: {membership.max() + 1} communities, mean stability of nodes {stability.mean():.3f}.")
+    return {
+        "partition": dict(zip(ids, membership.tolist())),
+        "stability": dict(zip(ids, stability.tolist())),
+        "runs": len(memberships),
+    }
 
-def analyze_centrality(G, amount=10):
+def calculate_modularity(G, partition, resolution=1.0):
     '''
-    Analyze centrality measures of nodes in graph G.
+    Calculate modularity of given partition of graph G as sum of contributions of communities from community_statistics().
     Parameters:
-        G (nx.Graph): graph to analyze
-        amount (int): number of top nodes to return
+        G (nx.Graph, CSRGraph or PreparedGraph): partitioned graph
+        partition (dict or Partition): dictionary where keys are nodes, values are community assignments
+        resolution (float): resolution parameter of modularity
     Returns:
-        results (dict): dictionary where keys are centrality measures, values are lists of tuples (node, centrality value)
-    '''
-    degree_centrality = nx.degree_centrality(G)
-    print("Degree centrality calculated.")
-    centrality = nx.eigenvector_centrality(G, max_iter=1000, tol=1e-06)
-    print("Eigenvector centrality calculated.")
-    # closeness_centrality = nx.closeness_centrality(G)
-    # print("Closeness centrality calculated.")
-    # betweenness_centrality = nx.betweenness_centrality(G)
-    # print("Betweenness centrality calculated.")
-    
-    results = {
-        "Degree Centrality": sorted(degree_centrality.items(), key=lambda x: x[1], reverse=True)[:amount],
-        "Eigenvector Centrality": sorted(centrality.items(), key=lambda x: x[1], reverse=True)[:amount],
-        # "Betweenness Centrality": sorted(betweenness_centrality.items(), key=lambda x: x[1], reverse=True)[:amount],
-        # "Closeness Centrality": sorted(closeness_centrality.items(), key=lambda x: x[1], reverse=True)[:amount]
+        modularity (float): modularity of given partition
+    '''
+    return float(community_statistics(G, partition, resolution)["modularity"].sum())
+
+def community_statistics(G, partition, resolution=1.0):
+    '''
+    Calculate statistics of all communities of partition in a single pass over edge arrays.
+    This is the only computation of modularity, its sum over communities is modularity of partition.
+    Self-loops count to internal weight once and to volume twice, as in networkx.
+    Parameters:
+        G (nx.Graph, CSRGraph or PreparedGraph): partitioned graph
+        partition (Partition or dict): partition of nodes of G
+        resolution (float): resolution parameter of modularity
+    Returns:
+        statistics (dict): dictionary of arrays indexed by community index of partition:
+            sizes, internal_edges, internal_weight, cut_weight, volume, density, conductance
+            and modularity, contribution of community to modularity of partition
+    '''
+    graph = _csr(G)
+    partition = as_partition(partition)
+    k = len(partition)
+    labels = partition.labels_for(graph.ids.tolist())
+    sources, targets, weights = graph.edges()
+    weights = weights.astype(np.float64)
+    source_labels, target_labels = labels[sources], labels[targets]
+    internal = source_labels == target_labels
+    internal_edges = np.bincount(source_labels[internal], minlength=k)
+    internal_weight = np.bincount(source_labels[internal], weights=weights[internal], minlength=k)
+    cut_weight = (np.bincount(source_labels[~internal], weights=weights[~internal], minlength=k)
+                  + np.bincount(target_labels[~internal], weights=weights[~internal], minlength=k))
+    loops = np.flatnonzero(graph.indices == np.repeat(np.arange(len(labels)), graph.degree()))
+    if len(loops):
+        internal_weight += np.bincount(labels[graph.indices[loops]], weights=graph.weights[loops].astype(np.float64), minlength=k)
+    volume = 2 * internal_weight + cut_weight
+    sizes = partition.sizes
+    possible = sizes * (sizes - 1) / 2
+    density = np.divide(internal_edges, possible, out=np.zeros(k), where=possible > 0)
+    denominator = np.minimum(volume, volume.sum() - volume)
+    conductance = np.divide(cut_weight, denominator, out=np.zeros(k), where=denominator > 0)
+    total = volume.sum()
+    modularity = 2 * internal_weight / total - resolution * (volume / total) ** 2 if total > 0 else np.zeros(k)
+    return {
+        "sizes": sizes,
+        "internal_edges": internal_edges,
+        "internal_weight": internal_weight,
+        "cut_weight": cut_weight,
+        "volume": volume,
+        "density": density,
+        "conductance": conductance,
+        "modularity": modularity,
     }
-    return results
@@ -1,50 +1,61 @@
 import json
-import pickle
 import networkx as nx
 from review import Review
-from itertools import combinations
+from graph_store import CSRGraph
+from review_table import ReviewTable, ReviewTableBuilder
+from sentiment import score_sentiments
+from projection import bipartite_incidence, table_incidence, limit_heavy_users, project_incidence, projection_savings, projection_to_graph
+from collections import deque
+import numpy as np
 import os
 
 def save_graph(graph, filename):
     '''
-    Save graph to file.
+    Save graph to directory in binary CSR format, see graph_store.CSRGraph.
     Parameters:
-        graph (nx.Graph): graph to save
-        filename (str): path to file
+        graph (nx.Graph or CSRGraph): graph to save, subgraph views are saved without their parent graph
+        filename (str): path to directory
     Returns: 
         None
     '''
-    with open(filename, 'wb') as f:
-        pickle.dump(graph, f)
+    if not isinstance(graph, CSRGraph):
+        graph = CSRGraph.from_networkx(graph)
+    graph.save(filename)
     print(f"Graph saved to {filename}")
 
-def load_graph(filename):
+def load_graph(filename, as_networkx=True):
     '''
-    Load graph from file.
+    Load graph from directory. Arrays are memory mapped, so loading takes seconds.
     Parameters:
-        filename (str): path to file with saved graph
+        filename (str): path to directory with saved graph
+        as_networkx (bool): if False, memory mapped CSRGraph is returned without conversion
     Returns: 
-        graph(nx.Graph): loaded graph
+        graph(nx.Graph or CSRGraph): loaded graph
     '''
-    with open(filename, 'rb') as f:
-        graph = pickle.load(f)
+    graph = CSRGraph.load(filename)
     print(f"Graph loaded from {filename}")
+    if as_networkx:
+        return graph.to_networkx()
     return graph
 
-def process_reviews(input_path, error_log="../output/error_lines.txt"):
+def iter_reviews(input_path, error_log="../output/error_lines.txt", with_offsets=False):
     '''
-    Process reviews from JSON input file to list of Review objects.
+    Lazily parse reviews from JSON input file, yielding one Review object at a time.
+    Faulty lines are written to the error log and skipped, so the whole file is never held in memory.
     Parameters:
         input_path (str): path to input file
         error_log (str): path to error log file
-    Returns: 
-        reviews (list): list of Review objects
+        with_offsets (bool): if True, yield tuples (byte offset of line in input file, Review)
+    Yields:
+        review (Review): parsed review, or tuple (offset, review) if with_offsets is set
     '''
-    reviews = []
     rev = 0
+    offset = 0
     os.makedirs(os.path.dirname(error_log), exist_ok=True)
-    with open(input_path, 'r', encoding='utf-8') as infile, open(error_log, 'w', encoding='utf-8') as errorfile:
+    with open(input_path, 'rb') as infile, open(error_log, 'w', encoding='utf-8') as errorfile:
         for line_num, line in enumerate(infile, start=1):
+            line_offset = offset
+            offset += len(line)
             try:
                 data = json.loads(line.strip())
                 review = Review(
@@ -54,99 +65,172 @@ def process_reviews(input_path, error_log="../output/error_lines.txt"):
                     score=data["rating"],
                     text=data["text"]
                 )
-                reviews.append(review)
-                
-                rev += 1
-                if rev % 100000 == 0:
-                    print(f"Processed {rev} reviews ({line_num} lines).")
             except Exception as e:
-                errorfile.write(f"Exception in review {rev}, line {line_num}: {line}\n")
+                errorfile.write(f"Exception in review {rev}, line {line_num}: {line.decode('utf-8', errors='replace')}\n")
                 errorfile.write(f"Error: {e}\n")
                 continue
+            yield (line_offset, review) if with_offsets else review
+
+            rev += 1
+            if rev % 100000 == 0:
+                print(f"Processed {rev} reviews ({line_num} lines).")
+
+    print(f"Total reviews processed: {rev}")
+
+def process_reviews(input_path, error_log="../output/error_lines.txt"):
+    '''
+    Process reviews from JSON input file to list of Review objects.
+    Prefer iter_reviews() when reviews are consumed once, e.g. by create_bipartite_graph().
+    Parameters:
+        input_path (str): path to input file
+        error_log (str): path to error log file
+    Returns: 
+        reviews (list): list of Review objects
+    '''
+    return list(iter_reviews(input_path, error_log))
+
+def load_review_table(input_path, error_log="../output/error_lines.txt", with_sentiment=False):
+    '''
+    Process reviews from JSON input file to columnar ReviewTable.
+    Review texts are not kept in memory, only offsets of their lines in input file.
+    Parameters:
+        input_path (str): path to input file
+        error_log (str): path to error log file
+        with_sentiment (bool): if True, sentiment of reviews is scored and stored in table
+    Returns:
+        table (ReviewTable): table of parsed reviews
+    '''
+    builder = ReviewTableBuilder(source=input_path)
+    reviews = iter_reviews(input_path, error_log, with_offsets=True)
+    if with_sentiment:
+        offsets = deque()
+        def remember_offsets(pairs):
+            for offset, review in pairs:
+                offsets.append(offset)
+                yield review
+        for review in score_sentiments(remember_offsets(reviews)):
+            builder.append(review, offsets.popleft())
+    else:
+        for offset, review in reviews:
+            builder.append(review, offset)
+    return builder.build()
 
-    print(f"Total reviews processed: {len(reviews)}")
-    return reviews
+def filter_bipartite_arrays(users, products, n_users, n_products, min_reviews=2, min_user_reviews=2, max_rounds=None):
+    '''
+    Filter bipartite graph given as arrays of edges, iterating to a fixed point like a bipartite (k,l)-core.
+    In every round products with less than min_reviews remaining users are removed, then users with less than
+    min_user_reviews remaining products. Removing users can push products below threshold again,
+    so rounds are repeated until nothing changes.
+    Parameters:
+        users (np.ndarray): user index of every edge
+        products (np.ndarray): product index of every edge
+        n_users (int): number of users
+        n_products (int): number of products
+        min_reviews (int): minimal degree of products to keep
+        min_user_reviews (int): minimal degree of users to keep
+        max_rounds (int): maximal number of rounds, None to iterate until fixed point, 1 for single pass
+    Returns:
+        kept_users (np.ndarray): boolean mask of kept users
+        kept_products (np.ndarray): boolean mask of kept products
+    '''
+    kept_users = np.ones(n_users, dtype=bool)
+    kept_products = np.ones(n_products, dtype=bool)
+    rounds = 0
+    while max_rounds is None or rounds < max_rounds:
+        rounds += 1
+        removed_products = kept_products & (np.bincount(products, minlength=n_products) < min_reviews)
+        kept_products &= ~removed_products
+        alive = kept_products[products]
+        users, products = users[alive], products[alive]
+        removed_users = kept_users & (np.bincount(users, minlength=n_users) < min_user_reviews)
+        kept_users &= ~removed_users
+        alive = kept_users[users]
+        users, products = users[alive], products[alive]
+        print(f"Filtering round {rounds}: removed {int(removed_products.sum())} products and {int(removed_users.sum())} users, {len(users)} edges left.")
+        if not removed_users.any() and not removed_products.any():
+            break
+    return kept_users, kept_products
 
-def filter_bipart_graph(graph, min_reviews=2):
+def filter_bipart_graph(graph, min_reviews=2, min_user_reviews=2, max_rounds=None):
     '''
     Filter out nodes with too low degree from bipartiate graph.
+    Degrees are calculated on arrays and filtering is repeated until fixed point, see filter_bipartite_arrays().
     Parameters:
         graph (nx.Graph): bipartite graph
-        min_reviews (int): minimal degree of nodes to keep
+        min_reviews (int): minimal degree of products to keep
+        min_user_reviews (int): minimal degree of users to keep
+        max_rounds (int): maximal number of filtering rounds, None to iterate until fixed point
     Returns:
         graph (nx.Graph): filtered graph
     '''
-    initial_product_count = sum(1 for node in graph.nodes if graph.nodes[node].get("bipartite") == 1)
-    '''
-    In bipartite graph two sets of vertixes are disjoint, so to optimise this function it is better to
-    calculate size of second set by subtracting size of first set from size of all vertexes in graph
-    len(graph) returns number of vertexes in graph, not size of the graph, which is amount of vertexes and edges.
-    '''
-    initial_user_count = len(graph) - initial_product_count 
-    
-    products_to_remove = [
-        node for node in graph.nodes if graph.nodes[node].get("bipartite") == 1 and graph.degree(node) < min_reviews
-    ]
+    incidence, users, products = bipartite_incidence(graph)
+    incidence = incidence.tocoo()
+    kept_users, kept_products = filter_bipartite_arrays(incidence.row, incidence.col, len(users), len(products),
+                                                        min_reviews, min_user_reviews, max_rounds)
+    products_to_remove = [product for product, kept in zip(products, kept_products) if not kept]
+    users_to_remove = [user for user, kept in zip(users, kept_users) if not kept]
     graph.remove_nodes_from(products_to_remove)
-
-    users_to_remove = [
-        node for node in graph.nodes if graph.nodes[node].get("bipartite") == 0 and graph.degree(node) < 2
-    ]
     graph.remove_nodes_from(users_to_remove)
 
-    final_product_count = len([node for node in graph.nodes if graph.nodes[node].get("bipartite") == 1])
-    final_user_count = len([node for node in graph.nodes if graph.nodes[node].get("bipartite") == 0])
-
-    print(f"Initial product count: {initial_product_count}, final product count: {final_product_count}")
-    print(f"Initial user count: {initial_user_count}, final user count: {final_user_count}")
+    print(f"Initial product count: {len(products)}, final product count: {len(products) - len(products_to_remove)}")
+    print(f"Initial user count: {len(users)}, final user count: {len(users) - len(users_to_remove)}")
     print(f"Removed {len(products_to_remove)} products and {len(users_to_remove)} users.")
     return graph
 
-def create_bipartite_graph(reviews):
+def create_bipartite_graph(reviews, keep_reviews=False):
     '''
-    Create bipartite graph from list of Review objects.
+    Create bipartite graph from Review objects or from ReviewTable.
+    Reviews are consumed one by one, so a generator from iter_reviews() can be passed directly
+    and peak memory depends only on the size of the graph.
     Parameters:
-        reviews (list): list of Review objects
+        reviews (iterable or ReviewTable): iterable of Review objects or table of reviews
+        keep_reviews (bool): if True, Review object is stored as "review" attribute of its edge, ignored for ReviewTable
     Returns:
         B (nx.Graph): bipartite graph of users conneted to products they reviewed
     '''
     B = nx.Graph()
-    #i=0
+    if isinstance(reviews, ReviewTable):
+        users, products = reviews.edges()
+        B.add_nodes_from((reviews.user_ids[u] for u in np.unique(users)), bipartite=0)
+        B.add_nodes_from((reviews.product_ids[p] for p in np.unique(products)), bipartite=1)
+        B.add_edges_from(zip((reviews.user_ids[u] for u in users), (reviews.product_ids[p] for p in products)))
+        return B
     for review in reviews:
-
-        #print(review)
         B.add_node(review.user_id, bipartite=0)
         B.add_node(review.product_id, bipartite=1)
-        B.add_edge(review.user_id, review.product_id, review = review)
-        #i+=1
-        # if i%100==0:
-        #     print(f"{B[review.user_id][review.product_id]} edge added")
+        if keep_reviews:
+            B.add_edge(review.user_id, review.product_id, review = review)
+        else:
+            B.add_edge(review.user_id, review.product_id)
     return B
 
-def generate_product_projection(bipartite_graph):
+def generate_product_projection(bipartite_graph, as_csr=False, mode="full", max_degree=1000, percentile=99.9, seed=None):
     '''
     Generate product projection from bipartite graph.
     If two products were reviewed by the same user, they are connected in the projection. 
-    If connction already exists, weight is increased by 1.
+    Weight of connection is number of users who reviewed both products.
+    Projection is calculated as sparse product of user x product incidence matrix with itself.
+    Contribution of heavy users can be limited with mode, see projection.limit_heavy_users().
     Parameters:
-        bipartite_graph (nx.Graph): bipartite graph of users connected to products they reviewed
+        bipartite_graph (nx.Graph or ReviewTable): bipartite graph of users connected to products they reviewed, or table of reviews
+        as_csr (bool): if True, return projection as sparse matrix instead of graph
+        mode (str): projection mode, one of projection.PROJECTION_MODES
+        max_degree (int): maximal user degree for cap_drop and cap_sample modes
+        percentile (float): percentile of user degrees for percentile mode
+        seed (int): seed of random generator for cap_sample mode
     Returns:
-        product_graph (nx.Graph): product projection graph
-    '''
-    product_graph = nx.Graph()
-    #i=0
-    users = [n for n in bipartite_graph.nodes if n.startswith("A")]
-    total = len(users)
-    for i,user in enumerate(users):
-        #print(user)
-        rated = list(bipartite_graph.neighbors(user))
-        #print(rated)
-        for p1, p2 in combinations(rated, 2):
-            #i+=1
-            if product_graph.has_edge(p1, p2):
-                product_graph[p1][p2]['weight'] += 1
-            else:
-                product_graph.add_edge(p1, p2, weight=1)
-        if i%10000==0:
-            print(f"Projecting bipartiate {i/total*100:.2f}% done")
-    return product_graph
+        product_graph (nx.Graph): product projection graph,
+        or tuple (projection (sp.csr_array), products (list)) if as_csr is set
+    '''
+    if isinstance(bipartite_graph, ReviewTable):
+        incidence, users, products = table_incidence(bipartite_graph)
+    else:
+        incidence, users, products = bipartite_incidence(bipartite_graph)
+    print(f"Projecting bipartiate graph of {len(users)} users and {len(products)} products")
+    projection_savings(incidence, max_degree, percentile)
+    incidence, user_weights = limit_heavy_users(incidence, mode, max_degree, percentile, seed)
+    projection = project_incidence(incidence, user_weights)
+    print(f"Projection done in {mode} mode, {projection.nnz//2} edges")
+    if as_csr:
+        return projection, products
+    return projection_to_graph(projection, products)
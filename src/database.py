@@ -1,41 +1,364 @@
+import os
 import sqlite3
 import json
+import threading
+from itertools import islice
+from multiprocessing import Pool
+from collections import OrderedDict, deque
 
-def create_metadata_db(json_path, db_path):
+'''
+Fields of metadata stored in typed columns next to raw JSON line, so they can be read without decoding JSON.
+'''
+METADATA_COLUMNS = {
+    "title": "TEXT",
+    "subtitle": "TEXT",
+    "main_category": "TEXT",
+    "average_rating": "REAL",
+    "rating_number": "INTEGER",
+    "author": "TEXT",
+    "store": "TEXT",
+}
+
+_COLUMN_TYPES = {"TEXT": str, "REAL": float, "INTEGER": int}
+
+def _typed_value(item, column):
+    '''
+    Value of metadata field converted to type of its column, None if it is missing or cannot be converted.
+    Author is stored by name.
+    '''
+    value = item.get(column)
+    if column == "author" and isinstance(value, dict):
+        value = value.get("name")
+    if value is None:
+        return None
+    try:
+        return _COLUMN_TYPES[METADATA_COLUMNS[column]](value)
+    except (TypeError, ValueError):
+        return None
+
+def _parse_lines(lines):
+    '''
+    Parse batch of JSONL lines into rows of metadata and product_category tables. Runs in worker process.
+    Returns:
+        rows (list): tuples of ASIN, raw line and values of typed columns
+        categories (list): tuples of ASIN, category and its position in categories of product
+        errors (list): messages of lines that could not be decoded
+    '''
+    rows, categories, errors = [], [], []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as e:
+            errors.append(str(e))
+            continue
+        asin = item.get('parent_asin')
+        rows.append((asin, line, *(_typed_value(item, column) for column in METADATA_COLUMNS)))
+        categories.extend((asin, category, position) for position, category in enumerate(dict.fromkeys(item.get('categories') or [])))
+    return rows, categories, errors
+
+def _create_metadata_table(conn):
+    '''
+    Create metadata and product_category tables, columns missing in tables created by older version are added.
+    Returns:
+        added (list): names of added columns of metadata table
+    '''
+    columns = ",\n".join(f"{column} {kind}" for column, kind in METADATA_COLUMNS.items())
+    conn.execute(f'''CREATE TABLE IF NOT EXISTS metadata (
+                    asin TEXT PRIMARY KEY,
+                    data TEXT,
+                    {columns}
+                )''')
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(metadata)")}
+    added = [column for column in METADATA_COLUMNS if column not in existing]
+    for column in added:
+        conn.execute(f"ALTER TABLE metadata ADD COLUMN {column} {METADATA_COLUMNS[column]}")
+    conn.execute('''CREATE TABLE IF NOT EXISTS product_category (
+                    asin TEXT,
+                    category TEXT,
+                    position INTEGER,
+                    PRIMARY KEY (asin, category)
+                ) WITHOUT ROWID''')
+    if "position" not in {row[1] for row in conn.execute("PRAGMA table_info(product_category)")}:
+        conn.execute("ALTER TABLE product_category ADD COLUMN position INTEGER")
+    conn.execute("CREATE INDEX IF NOT EXISTS product_category_category ON product_category (category)")
+    return added
+
+def _upgrade_metadata_db(conn, batch_size=10000):
+    '''
+    Add typed columns and product_category table missing in database built by older version,
+    filled from JSON of products. Categories are also refilled if they were stored without positions.
+    Returns:
+        upgraded (bool): True if database was upgraded
+    '''
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if "metadata" not in tables:
+        return False
+    refill = "product_category" not in tables or "position" not in {row[1] for row in conn.execute("PRAGMA table_info(product_category)")}
+    added = _create_metadata_table(conn)
+    if not added and not refill:
+        return False
+    print(f"Upgrading metadata database: filling columns {added}{' and product_category table' if refill else ''} from JSON of products...")
+    if refill:
+        conn.execute("DELETE FROM product_category")
+    update = f"UPDATE metadata SET {', '.join(f'{column} = ?' for column in added)} WHERE asin = ?"
+    last = 0
+    while True:
+        rows = conn.execute("SELECT rowid, data FROM metadata WHERE rowid > ? ORDER BY rowid LIMIT ?", (last, batch_size)).fetchall()
+        if not rows:
+            break
+        last = rows[-1][0]
+        parsed, categories, _ = _parse_lines([data for _, data in rows])
+        if added:
+            positions = [2 + list(METADATA_COLUMNS).index(column) for column in added]
+            conn.executemany(update, [[row[i] for i in positions] + [row[0]] for row in parsed])
+        if refill:
+            conn.executemany("INSERT OR IGNORE INTO product_category (asin, category, position) VALUES (?, ?, ?)", categories)
+    conn.commit()
+    return True
+
+def _insert_batch(conn, insert, parsed):
+    '''
+    Insert batch parsed by _parse_lines() and commit it.
+    Returns:
+        count (int): number of processed lines
+    '''
+    rows, categories, errors = parsed
+    for error in errors:
+        print(f"Error decoding JSON: {error}")
+    conn.executemany(insert, rows)
+    conn.executemany("DELETE FROM product_category WHERE asin = ?", [row[:1] for row in rows])
+    conn.executemany("INSERT OR IGNORE INTO product_category (asin, category, position) VALUES (?, ?, ?)", categories)
+    conn.commit()
+    return len(rows) + len(errors)
+
+def create_metadata_db(json_path, db_path, processes=None, batch_size=10000):
     '''
     Create SQLite database with metadata from JSONL file.
+    Lines are parsed in a process pool and inserted in batches with executemany(). Raw lines are stored
+    as they are, fields of METADATA_COLUMNS are also stored in typed columns and categories of every
+    product in product_category table.
+    At most two batches per worker are read ahead of insertion, so memory does not grow with size of file
+    when parsing is faster than inserting.
+    Database is loaded in WAL mode without waiting for disk syncs.
     Parameters:
         json_path (str): path to JSONL file with metadata
         db_path (str): path to SQLite database
+        processes (int): number of worker processes, defaults to number of CPUs
+        batch_size (int): number of lines parsed and inserted at once
     Returns:
         None
     '''
     conn = sqlite3.connect(db_path)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS metadata (
-                    asin TEXT PRIMARY KEY,
-                    data TEXT
-                )''')
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    _create_metadata_table(conn)
+    placeholders = ", ".join("?" * (len(METADATA_COLUMNS) + 2))
+    insert = f"INSERT OR REPLACE INTO metadata (asin, data, {', '.join(METADATA_COLUMNS)}) VALUES ({placeholders})"
 
+    processes = processes or os.cpu_count() or 1
     with open(json_path, 'r', encoding='utf-8') as f:
-        i=0
-        for line in f:
-            i+=1
-            try:
-                item = json.loads(line.strip())
-                asin = item.get('parent_asin')
-                data = json.dumps(item)
-                c.execute('''INSERT OR REPLACE INTO metadata (asin, data)
-                             VALUES (?, ?)''',
-                          (asin, data))
-            except json.JSONDecodeError as e:
-                print(f"Error decoding JSON: {e}")
-            if i%10000==0:
+        batches = iter(lambda: list(islice(f, batch_size)), [])
+        i = 0
+        with Pool(processes) as pool:
+            pending = deque()
+            for batch in batches:
+                pending.append(pool.apply_async(_parse_lines, (batch,)))
+                if len(pending) < 2 * processes:
+                    continue
+                i += _insert_batch(conn, insert, pending.popleft().get())
+                print(f"Processed {i} items")
+            while pending:
+                i += _insert_batch(conn, insert, pending.popleft().get())
                 print(f"Processed {i} items")
 
-    conn.commit()
     conn.close()
 
+class MetadataClient:
+    '''
+    Client of metadata database keeping one connection per thread and LRU cache of records.
+    Records are read from typed columns and product_category table, JSON of product is decoded only when raw record is requested.
+    Products missing in database are cached as None too, so they are not queried again.
+    When first connection is opened, typed columns and product_category table missing in database built
+    by older version are filled from JSON of products.
+    Parameters:
+        db_path (str): path to SQLite database
+        cache_size (int): maximal number of cached records
+        chunk_size (int): maximal number of ASINs in one IN (...) query
+    Attributes:
+        hits (int): number of records taken from cache
+        misses (int): number of records queried from database
+    '''
+    def __init__(self, db_path, cache_size=100000, chunk_size=500):
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self.chunk_size = chunk_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._connections = []
+        self._checked = False
+
+    def __repr__(self):
+        return f"MetadataClient({self.db_path}, cached={len(self._cache)}, hits={self.hits}, misses={self.misses})"
+
+    def _connection(self):
+        '''
+        Connection of current thread, opened on first use.
+        '''
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+                if not self._checked:
+                    _upgrade_metadata_db(conn)
+                    self._checked = True
+        return conn
+
+    def get(self, asin, raw=False):
+        '''
+        Get metadata of one product.
+        Parameters:
+            asin (str): ASIN of product
+            raw (bool): return whole decoded JSON of product instead of typed fields
+        Returns:
+            metadata (dict): metadata of product, None if product is not in database
+        '''
+        return self.get_many([asin], raw)[asin]
+
+    def get_many(self, asins, raw=False):
+        '''
+        Get metadata of many products, products not in cache are queried in chunks with IN (...) queries.
+        Records have fields of METADATA_COLUMNS which are set and list of categories, they are read without decoding JSON.
+        Raw records are whole decoded JSON of products, they are not cached.
+        Parameters:
+            asins (list): ASINs of products
+            raw (bool): return whole decoded JSON of products instead of typed fields
+        Returns:
+            metadata (dict): dictionary where keys are ASINs, values are metadata of products, None if product is not in database
+        '''
+        if raw:
+            return self._get_raw(asins)
+        result = {}
+        missing = []
+        with self._lock:
+            for asin in dict.fromkeys(asins):
+                if asin in self._cache:
+                    self._cache.move_to_end(asin)
+                    result[asin] = self._cache[asin]
+                else:
+                    missing.append(asin)
+            self.hits += len(result)
+            self.misses += len(missing)
+        if not missing:
+            return result
+
+        fetched = dict.fromkeys(missing)
+        for asin, fields in self.get_fields(missing).items():
+            fetched[asin] = {column: value for column, value in fields.items() if value is not None}
+            fetched[asin]["categories"] = []
+        c = self._connection().cursor()
+        for start in range(0, len(missing), self.chunk_size):
+            chunk = missing[start:start + self.chunk_size]
+            c.execute(f'''SELECT asin, category FROM product_category WHERE asin IN ({','.join('?' * len(chunk))})
+                          ORDER BY asin, position''', chunk)
+            for asin, category in c.fetchall():
+                fetched[asin]["categories"].append(category)
+        result.update(fetched)
+        with self._lock:
+            self._cache.update(fetched)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def _get_raw(self, asins):
+        '''
+        Get decoded JSON of many products, bypasses cache.
+        '''
+        raw = dict.fromkeys(asins)
+        asins = list(raw)
+        c = self._connection().cursor()
+        for start in range(0, len(asins), self.chunk_size):
+            chunk = asins[start:start + self.chunk_size]
+            c.execute(f"SELECT asin, data FROM metadata WHERE asin IN ({','.join('?' * len(chunk))})", chunk)
+            for asin, data in c.fetchall():
+                raw[asin] = json.loads(data)
+        return raw
+
+    def get_fields(self, asins, columns=tuple(METADATA_COLUMNS)):
+        '''
+        Get typed columns of many products without decoding their JSON, bypasses cache.
+        Parameters:
+            asins (list): ASINs of products
+            columns (list): names of columns from METADATA_COLUMNS
+        Returns:
+            fields (dict): dictionary where keys are ASINs, values are dictionaries of columns,
+                products not in database are left out
+        '''
+        columns = list(columns)
+        unknown = set(columns) - set(METADATA_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown metadata columns: {sorted(unknown)}")
+        asins = list(dict.fromkeys(asins))
+        fields = {}
+        c = self._connection().cursor()
+        for start in range(0, len(asins), self.chunk_size):
+            chunk = asins[start:start + self.chunk_size]
+            c.execute(f"SELECT asin, {', '.join(columns)} FROM metadata WHERE asin IN ({','.join('?' * len(chunk))})", chunk)
+            for asin, *values in c.fetchall():
+                fields[asin] = dict(zip(columns, values))
+        return fields
+
+    def category_counts(self, asins):
+        '''
+        Count products of every category among given products with one aggregate query.
+        ASINs are loaded into temporary table joined with product_category table.
+        Parameters:
+            asins (list): ASINs of products
+        Returns:
+            counts (dict): dictionary where keys are categories, values are numbers of products, most common first
+        '''
+        conn = self._connection()
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS query_asins (asin TEXT PRIMARY KEY)")
+        conn.execute("DELETE FROM query_asins")
+        conn.executemany("INSERT OR IGNORE INTO query_asins (asin) VALUES (?)", ((asin,) for asin in asins))
+        rows = conn.execute('''SELECT category, COUNT(*) AS products
+                               FROM product_category JOIN query_asins USING (asin)
+                               GROUP BY category ORDER BY products DESC''').fetchall()
+        conn.execute("DELETE FROM query_asins")
+        conn.commit()
+        return dict(rows)
+
+    def close(self):
+        '''
+        Close connections of all threads.
+        '''
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+_clients = {}
+
+def get_client(db_path):
+    '''
+    Get MetadataClient of database shared by all callers in process.
+    Parameters:
+        db_path (str): path to SQLite database
+    Returns:
+        client (MetadataClient): client of database
+    '''
+    if db_path not in _clients:
+        _clients[db_path] = MetadataClient(db_path)
+    return _clients[db_path]
+
 def get_metadata(product_id, db_path):
     '''
     Get metadata for a product from the database.
@@ -46,15 +369,7 @@ def get_metadata(product_id, db_path):
         metadata (json): metadata for quered product
     '''
     try:
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
-        c.execute('SELECT data FROM metadata WHERE asin = ?', (product_id,))
-        row = c.fetchone()
-        conn.close()
-        if row:
-            return json.loads(row[0])
-        else:
-            return None
+        return get_client(db_path).get(product_id, raw=True)
     except sqlite3.Error as e:
         print(f"Error while fetching {product_id} in {db_path}: {e}")
         return None
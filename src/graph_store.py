@@ -0,0 +1,242 @@
+import os
+import multiprocessing
+import shutil
+import tempfile
+from contextlib import contextmanager
+import networkx as nx
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+
+class CSRGraph:
+    '''
+    Undirected weighted graph stored as compressed sparse rows.
+    Every edge is stored in both directions. Graph is saved as a directory of .npy files,
+    which can be memory mapped on load, so it is read in seconds and shared between processes.
+    Parameters:
+        ids (np.ndarray): node IDs, index in array is integer index of node
+        indptr (np.ndarray): neighbors of node i are indices[indptr[i]:indptr[i+1]]
+        indices (np.ndarray): neighbor indices of all nodes
+        weights (np.ndarray): weights of edges in the same order as indices
+    '''
+    FILES = ("ids", "indptr", "indices", "weights")
+
+    def __init__(self, ids, indptr, indices, weights):
+        self.ids = ids
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+
+    def __repr__(self):
+        return f"CSRGraph(nodes={self.number_of_nodes()}, edges={self.number_of_edges()})"
+
+    def number_of_nodes(self):
+        return len(self.ids)
+
+    def number_of_edges(self):
+        return len(self.indices) // 2
+
+    def degree(self):
+        '''
+        Returns:
+            degrees (np.ndarray): number of neighbors of every node
+        '''
+        return np.diff(self.indptr)
+
+    def strength(self):
+        '''
+        Returns:
+            strengths (np.ndarray): sum of weights of edges of every node
+        '''
+        sources = np.repeat(np.arange(len(self.ids)), self.degree())
+        return np.bincount(sources, weights=self.weights, minlength=len(self.ids))
+
+    def edges(self):
+        '''
+        Get every undirected edge once.
+        Returns:
+            sources (np.ndarray): index of first node of every edge
+            targets (np.ndarray): index of second node of every edge, greater than first
+            weights (np.ndarray): weight of every edge
+        '''
+        sources = np.repeat(np.arange(len(self.ids), dtype=self.indices.dtype), self.degree())
+        upper = sources < self.indices
+        return sources[upper], self.indices[upper], self.weights[upper]
+
+    def to_scipy(self):
+        '''
+        Returns:
+            adjacency (sp.csr_array): symmetric adjacency matrix of weights
+        '''
+        n = len(self.ids)
+        return sp.csr_array((self.weights, self.indices, self.indptr), shape=(n, n))
+
+    def subgraph(self, nodes):
+        '''
+        Induced subgraph of given nodes, nodes not in graph are ignored.
+        Nodes keep their order in graph.
+        Parameters:
+            nodes (list): node IDs
+        Returns:
+            subgraph (CSRGraph): induced subgraph
+        '''
+        order = np.argsort(self.ids)
+        nodes = np.asarray(list(nodes), dtype=str)
+        positions = np.minimum(np.searchsorted(self.ids, nodes, sorter=order), len(order) - 1)
+        selected = order[positions]
+        return self.induced(np.unique(selected[self.ids[selected] == nodes]))
+
+    def induced(self, indices):
+        '''
+        Induced subgraph of nodes with given integer indices.
+        Parameters:
+            indices (np.ndarray): sorted indices of nodes
+        Returns:
+            subgraph (CSRGraph): induced subgraph
+        '''
+        adjacency = self.to_scipy()[indices][:, indices]
+        return CSRGraph.from_scipy(adjacency, self.ids[indices])
+
+    def connected_components(self):
+        '''
+        Returns:
+            count (int): number of connected components
+            labels (np.ndarray): component of every node
+        '''
+        return connected_components(self.to_scipy(), directed=False)
+
+    def largest_component(self):
+        '''
+        Returns:
+            component (CSRGraph): induced subgraph of largest connected component
+        '''
+        _, labels = self.connected_components()
+        return self.induced(np.flatnonzero(labels == np.argmax(np.bincount(labels))))
+
+    def to_networkx(self):
+        '''
+        Convert graph to nx.Graph, with node IDs as nodes and "weight" edge attribute.
+        Returns:
+            graph (nx.Graph): converted graph
+        '''
+        ids = self.ids.tolist()
+        sources, targets, weights = self.edges()
+        graph = nx.Graph()
+        graph.add_nodes_from(ids)
+        graph.add_weighted_edges_from(
+            (ids[u], ids[v], w) for u, v, w in zip(sources.tolist(), targets.tolist(), weights.tolist())
+        )
+        return graph
+
+    @classmethod
+    def from_scipy(cls, adjacency, ids):
+        '''
+        Create graph from symmetric sparse adjacency matrix.
+        Parameters:
+            adjacency (sp.sparray): symmetric adjacency matrix of weights
+            ids (list): node IDs in order of rows
+        Returns:
+            graph (CSRGraph): created graph
+        '''
+        adjacency = sp.csr_array(adjacency)
+        adjacency.sort_indices()
+        return cls(np.array(ids, dtype=str), adjacency.indptr.astype(np.int64),
+                   adjacency.indices.astype(np.int32), adjacency.data)
+
+    @classmethod
+    def from_networkx(cls, graph, weight="weight"):
+        '''
+        Create graph from nx.Graph, also from subgraph views without copying parent graph.
+        Edges without weight get weight 1.
+        Parameters:
+            graph (nx.Graph): graph to convert
+            weight (str): name of edge attribute with weight
+        Returns:
+            graph (CSRGraph): created graph
+        '''
+        nodes = list(graph)
+        adjacency = nx.to_scipy_sparse_array(graph, nodelist=nodes, weight=weight, format="csr")
+        return cls.from_scipy(adjacency, nodes)
+
+    def save(self, directory):
+        '''
+        Save graph as directory of .npy files.
+        Parameters:
+            directory (str): path to directory
+        Returns:
+            None
+        '''
+        os.makedirs(directory, exist_ok=True)
+        for name in self.FILES:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        '''
+        Load graph saved with save().
+        Parameters:
+            directory (str): path to directory
+            mmap (bool): if True, arrays are memory mapped read-only instead of read into memory
+        Returns:
+            graph (CSRGraph): loaded graph
+        '''
+        mode = "r" if mmap else None
+        return cls(*(np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mode) for name in cls.FILES))
+
+def as_csr_graph(graph):
+    '''
+    Get CSRGraph of graph, converting nx.Graph if needed.
+    Parameters:
+        graph (nx.Graph or CSRGraph): graph
+    Returns:
+        graph (CSRGraph): graph in CSR form
+    '''
+    return graph if isinstance(graph, CSRGraph) else CSRGraph.from_networkx(graph)
+
+_worker_graph = None
+
+def _load_worker_graph(graph_dir, prepare=None):
+    '''
+    Memory map graph from directory once per worker process, used as Pool initializer.
+    '''
+    global _worker_graph
+    graph = CSRGraph.load(graph_dir)
+    _worker_graph = prepare(graph) if prepare else graph
+
+def worker_graph():
+    '''
+    Get graph of worker process of shared_graph_pool().
+    Returns:
+        graph (CSRGraph): graph loaded by worker, or result of prepare function of pool
+    '''
+    return _worker_graph
+
+@contextmanager
+def shared_graph_pool(graph, graph_dir=None, processes=None, prepare=None, maxtasksperchild=None):
+    '''
+    Pool of spawned worker processes sharing graph memory mapped from directory.
+    Every worker loads graph once when it starts, tasks get it with worker_graph() instead of
+    receiving their own pickled copy. On exit workers are terminated and temporary directory is removed.
+    Parameters:
+        graph (CSRGraph): graph, saved to temporary directory if graph_dir is None
+        graph_dir (str): directory where graph is already saved as CSRGraph
+        processes (int): number of worker processes, defaults to number of CPUs
+        prepare (callable): function run on loaded graph in every worker, e.g. to build igraph copy, must be picklable
+        maxtasksperchild (int): number of tasks after which worker is replaced, None to keep workers
+    Returns:
+        pool (multiprocessing.pool.Pool): pool of worker processes
+    '''
+    temporary = None
+    if graph_dir is None:
+        temporary = tempfile.mkdtemp(prefix="graph_")
+        graph_dir = temporary
+        graph.save(graph_dir)
+    pool = multiprocessing.get_context("spawn").Pool(processes, initializer=_load_worker_graph,
+                                                     initargs=(graph_dir, prepare), maxtasksperchild=maxtasksperchild)
+    try:
+        yield pool
+    finally:
+        pool.terminate()
+        pool.join()
+        if temporary:
+            shutil.rmtree(temporary, ignore_errors=True)
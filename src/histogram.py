@@ -0,0 +1,70 @@
+import csv
+import numpy as np
+
+def value_counts(values):
+    '''
+    Count occurrences of every distinct value.
+    Non-negative integers are counted with np.bincount when their range is not much larger than their number,
+    other values with np.unique.
+    Parameters:
+        values (array_like): values to count
+    Returns:
+        distinct (np.ndarray): distinct values, sorted
+        counts (np.ndarray): number of occurrences of every distinct value
+    '''
+    values = np.asarray(values)
+    if len(values) == 0:
+        return values, np.zeros(0, dtype=np.int64)
+    if np.issubdtype(values.dtype, np.integer) and values.min() >= 0 and values.max() <= 10 * len(values):
+        counts = np.bincount(values)
+        distinct = np.flatnonzero(counts)
+        return distinct, counts[distinct]
+    return np.unique(values, return_counts=True)
+
+def log_bins(distinct, counts, bins_per_decade=10):
+    '''
+    Aggregate counts of positive integer values into logarithmic bins aligned to integers.
+    Parameters:
+        distinct (np.ndarray): distinct values, result of value_counts()
+        counts (np.ndarray): number of occurrences of every distinct value
+        bins_per_decade (int): number of bins per power of 10
+    Returns:
+        bins (dict): dictionary of arrays with one entry per non-empty bin: left (first value in bin),
+            right (first value after bin), center (geometric mean of first and last value), count (number of
+            occurrences of values in bin) and density (count divided by number of integers in bin)
+    '''
+    positive = distinct > 0
+    distinct, counts = distinct[positive], counts[positive]
+    if len(distinct) == 0:
+        return {column: np.zeros(0) for column in ("left", "right", "center", "count", "density")}
+    low, high = np.log10(distinct.min()), np.log10(distinct.max() + 1)
+    edges = np.logspace(low, high, max(2, int(np.ceil((high - low) * bins_per_decade)) + 1))
+    edges = np.unique(np.ceil(edges - 1e-9))
+    binned = np.histogram(distinct, bins=edges, weights=counts)[0]
+    left, right = edges[:-1], edges[1:]
+    kept = binned > 0
+    left, right, binned = left[kept], right[kept], binned[kept]
+    return {
+        "left": left,
+        "right": right,
+        "center": np.sqrt(left * (right - 1)),
+        "count": binned,
+        "density": binned / (right - left),
+    }
+
+def save_csv(filename, columns):
+    '''
+    Save columns of equal length to CSV file with header.
+    Floating point numbers are written with 10 significant digits, other values (e.g. category names) as they are.
+    Parameters:
+        filename (str): path to CSV file
+        columns (dict): dictionary where keys are column names, values are arrays or lists
+    Returns:
+        None
+    '''
+    rows = zip(*(np.asarray(values).tolist() for values in columns.values()))
+    with open(filename, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow([format(value, ".10g") if isinstance(value, float) else value for value in row])
@@ -0,0 +1,534 @@
+import glob
+import json
+import os
+import numpy as np
+import scipy.sparse as sp
+from data_processing import iter_reviews, filter_bipartite_arrays
+from projection import limit_heavy_users, project_incidence, projection_to_graph
+
+def _pair_keys(first, second):
+    '''
+    Encode pairs of indices as sortable integer keys, pairs with the same first index are contiguous when sorted.
+    '''
+    return (np.asarray(first, dtype=np.int64) << 32) | np.asarray(second, dtype=np.int64)
+
+'''
+Block of added keys is merged with previous block of SortedBlocks while previous block is at most MERGE_RATIO times larger.
+'''
+MERGE_RATIO = 2
+
+class SortedBlocks:
+    '''
+    Set of pair keys stored as sorted blocks of decreasing size, like a log-structured merge tree.
+    Added keys form a new block, which is merged with last blocks while they are at most MERGE_RATIO times larger,
+    so there are O(log n) blocks and adding keys costs amortized O(log n) per key instead of inserting them into one array.
+    Parameters:
+        blocks (list): sorted arrays of distinct keys, no key is in more than one block
+    '''
+    def __init__(self, blocks=()):
+        self.blocks = [np.asarray(block, dtype=np.int64) for block in blocks if len(block)]
+
+    def __len__(self):
+        return sum(len(block) for block in self.blocks)
+
+    @classmethod
+    def from_pairs(cls, first, second):
+        '''
+        Build set of keys of pairs as one block.
+        Parameters:
+            first (np.ndarray): first index of every pair, high 32 bits of key
+            second (np.ndarray): second index of every pair, low 32 bits of key
+        Returns:
+            blocks (SortedBlocks): set of keys
+        '''
+        return cls([np.unique(_pair_keys(first, second))])
+
+    def keys(self):
+        '''
+        Returns:
+            keys (np.ndarray): all keys, sorted
+        '''
+        if len(self.blocks) == 1:
+            return self.blocks[0]
+        return np.sort(np.concatenate(self.blocks), kind="stable") if self.blocks else np.empty(0, dtype=np.int64)
+
+    def contains(self, keys):
+        '''
+        Parameters:
+            keys (np.ndarray): keys to look up
+        Returns:
+            found (np.ndarray): boolean mask of keys in set
+        '''
+        keys = np.asarray(keys, dtype=np.int64)
+        found = np.zeros(len(keys), dtype=bool)
+        for block in self.blocks:
+            positions = np.minimum(np.searchsorted(block, keys), len(block) - 1)
+            found |= block[positions] == keys
+        return found
+
+    def add(self, keys):
+        '''
+        Add keys to set.
+        Parameters:
+            keys (np.ndarray): keys to add, may repeat and may be in set already
+        Returns:
+            added (np.ndarray): sorted keys which were not in set before
+        '''
+        keys = np.unique(np.asarray(keys, dtype=np.int64))
+        keys = keys[~self.contains(keys)]
+        block = keys
+        while self.blocks and len(self.blocks[-1]) <= MERGE_RATIO * len(block):
+            # Timsort merges two sorted runs in linear time
+            block = np.sort(np.concatenate([self.blocks.pop(), block]), kind="stable")
+        if len(block):
+            self.blocks.append(block)
+        return keys
+
+    def counts(self, prefixes):
+        '''
+        Parameters:
+            prefixes (np.ndarray): high 32 bits of keys, e.g. user indices
+        Returns:
+            counts (np.ndarray): number of keys with every prefix
+        '''
+        prefixes = np.asarray(prefixes, dtype=np.int64)
+        counts = np.zeros(len(prefixes), dtype=np.int64)
+        for block in self.blocks:
+            counts += np.searchsorted(block, (prefixes + 1) << 32) - np.searchsorted(block, prefixes << 32)
+        return counts
+
+    def groups(self, prefixes):
+        '''
+        Get keys with given high 32 bits, e.g. all products of given users.
+        Parameters:
+            prefixes (np.ndarray): high 32 bits of keys
+        Returns:
+            owners (np.ndarray): position in prefixes of prefix of every found key, sorted
+            values (np.ndarray): low 32 bits of every found key, sorted within prefix
+        '''
+        prefixes = np.asarray(prefixes, dtype=np.int64)
+        owners, values = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+        for block in self.blocks:
+            starts = np.searchsorted(block, prefixes << 32)
+            lengths = np.searchsorted(block, (prefixes + 1) << 32) - starts
+            offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+            owners.append(np.repeat(np.arange(len(prefixes)), lengths))
+            values.append(block[np.repeat(starts, lengths) + offsets] & 0xFFFFFFFF)
+        owners, values = np.concatenate(owners), np.concatenate(values)
+        order = np.lexsort((values, owners))
+        return owners[order], values[order]
+
+def _encode(ids, order, new_ids):
+    '''
+    Get indices of IDs, IDs not seen yet are appended.
+    Parameters:
+        ids (np.ndarray): known IDs, index in array is index of ID
+        order (np.ndarray): permutation sorting ids
+        new_ids (list): IDs to encode
+    Returns:
+        indices (np.ndarray): index of every ID of new_ids
+        ids (np.ndarray): known IDs with appended unseen IDs
+        order (np.ndarray): permutation sorting extended ids
+    '''
+    values, inverse = np.unique(np.asarray(new_ids, dtype=str), return_inverse=True)
+    positions = np.searchsorted(ids, values, sorter=order)
+    codes = order[np.minimum(positions, len(order) - 1)] if len(order) else np.zeros(len(values), dtype=np.int64)
+    known = (positions < len(order)) & (ids[codes] == values) if len(order) else np.zeros(len(values), dtype=bool)
+    unseen = np.flatnonzero(~known)
+    codes = codes.astype(np.int64)
+    codes[unseen] = len(ids) + np.arange(len(unseen))
+    order = np.insert(order, positions[unseen], codes[unseen])
+    ids = np.concatenate([ids, values[unseen]])
+    return codes[inverse], ids, order
+
+def _csr_positions(matrix, rows, cols):
+    '''
+    Positions in data of CSR matrix with sorted indices of entries given by rows and columns, -1 for entries not stored.
+    Binary search within rows runs for all entries at once.
+    '''
+    indptr, indices = matrix.indptr, matrix.indices
+    if len(indices) == 0:
+        return np.full(len(rows), -1)
+    lo = indptr[rows].astype(np.int64)
+    hi = indptr[rows + 1].astype(np.int64)
+    end = hi.copy()
+    active = lo < hi
+    while active.any():
+        mid = (lo + hi) // 2
+        right = active & (indices[np.minimum(mid, len(indices) - 1)] < cols)
+        lo = np.where(right, mid + 1, lo)
+        hi = np.where(active & ~right, mid, hi)
+        active = lo < hi
+    found = (lo < end) & (indices[np.minimum(lo, len(indices) - 1)] == cols)
+    return np.where(found, lo, -1)
+
+'''
+Projection modes supported by BipartiteState.update(). In cap_sample mode kept products of heavy users are random,
+in percentile mode threshold depends on degrees of all users, so their projection cannot be updated locally.
+'''
+UPDATABLE_MODES = ("full", "newman", "cap_drop")
+
+class BipartiteState:
+    '''
+    Persisted state of review graph that can be updated with new reviews.
+    Stores distinct user-product edges of bipartite graph indexed both by user and by product,
+    which nodes passed filtering thresholds and product projection of filtered graph as sparse matrix over all products.
+    Parameters:
+        user_ids (list): user IDs, index in list is user index
+        product_ids (list): product IDs, index in list is product index
+        edge_users (np.ndarray): user index of every edge
+        edge_products (np.ndarray): product index of every edge
+        kept_users (np.ndarray): boolean mask of users that passed filtering
+        kept_products (np.ndarray): boolean mask of products that passed filtering
+        projection (sp.csr_array): product x product matrix of projection weights
+        min_reviews (int): minimal degree of products to keep
+        mode (str): projection mode used to build projection
+        key (str): identifier of data state was built from, e.g. key of stage cache
+        applied_deltas (list): hashes of delta files already added to state
+        max_degree (int): maximal user degree of cap_drop mode
+        orders (tuple): permutations sorting user IDs and product IDs, computed if None
+        edges (tuple): SortedBlocks of edges keyed by user and by product, built from edge_users and edge_products if None
+    '''
+    def __init__(self, user_ids, product_ids, edge_users, edge_products, kept_users, kept_products, projection, min_reviews=2, mode="full",
+                 key=None, applied_deltas=None, max_degree=1000, orders=None, edges=None):
+        self.user_ids = np.asarray(user_ids, dtype=str)
+        self.product_ids = np.asarray(product_ids, dtype=str)
+        if orders is None:
+            orders = np.argsort(self.user_ids, kind="stable"), np.argsort(self.product_ids, kind="stable")
+        self.user_order, self.product_order = orders
+        if edges is None:
+            edges = SortedBlocks.from_pairs(edge_users, edge_products), SortedBlocks.from_pairs(edge_products, edge_users)
+        self.user_edges, self.product_edges = edges
+        self.kept_users = kept_users
+        self.kept_products = kept_products
+        self._projection = sp.csr_array(projection)
+        self._projection.sort_indices()
+        self._pending = []
+        self._dirty = False
+        self.min_reviews = min_reviews
+        self.mode = mode
+        self.key = key
+        self.applied_deltas = list(applied_deltas or [])
+        self.max_degree = max_degree
+
+    def __repr__(self):
+        return (f"BipartiteState(users={len(self.user_ids)}, products={len(self.product_ids)}, edges={len(self.user_edges)}, "
+                f"kept users={int(self.kept_users.sum())}, kept products={int(self.kept_products.sum())}, projection edges={self.projection.nnz//2})")
+
+    @classmethod
+    def from_table(cls, table, min_reviews=2, mode="full", max_degree=1000, percentile=99.9, seed=None):
+        '''
+        Build state from table of reviews: filter bipartite graph and project it.
+        Parameters:
+            table (ReviewTable): table of reviews
+            min_reviews (int): minimal degree of products to keep
+            mode (str): projection mode, see projection.limit_heavy_users()
+            max_degree (int): maximal user degree for cap_drop and cap_sample modes
+            percentile (float): percentile of user degrees for percentile mode
+            seed (int): seed of random generator for cap_sample mode
+        Returns:
+            state (BipartiteState): built state
+        '''
+        users, products = table.edges()
+        n_users, n_products = len(table.user_ids), len(table.product_ids)
+        print(f"Bipart graph size before filtering: {len(users)}")
+        kept_users, kept_products = filter_bipartite_arrays(users, products, n_users, n_products, min_reviews)
+        kept = kept_users[users] & kept_products[products]
+        print(f"Bipart graph size after filtering: {int(kept.sum())}")
+        print(f"Kept {int(kept_products.sum())} of {n_products} products and {int(kept_users.sum())} of {n_users} users.")
+        incidence = sp.csr_array((np.ones(int(kept.sum()), dtype=np.int32), (users[kept], products[kept])), shape=(n_users, n_products))
+        incidence, user_weights = limit_heavy_users(incidence, mode, max_degree, percentile, seed)
+        projection = project_incidence(incidence, user_weights)
+        return cls(table.user_ids, table.product_ids, users, products, kept_users, kept_products, projection, min_reviews, mode, max_degree=max_degree)
+
+    @property
+    def edge_users(self):
+        '''
+        Returns:
+            edge_users (np.ndarray): user index of every edge, edges are sorted by user and product
+        '''
+        return (self.user_edges.keys() >> 32).astype(np.int32)
+
+    @property
+    def edge_products(self):
+        '''
+        Returns:
+            edge_products (np.ndarray): product index of every edge, edges are sorted by user and product
+        '''
+        return (self.user_edges.keys() & 0xFFFFFFFF).astype(np.int32)
+
+    @property
+    def projection(self):
+        '''
+        Product x product matrix of projection weights over all products.
+        Weights of pairs added by updates which were not in matrix yet are kept aside and merged on first access.
+        Returns:
+            projection (sp.csr_array): symmetric matrix of projection weights
+        '''
+        n_products = len(self.product_ids)
+        if self._pending or self._dirty or self._projection.shape[0] != n_products:
+            projection = self._projection.tocoo()
+            projection.resize((n_products, n_products))
+            rows, cols, weights = (np.concatenate(arrays) for arrays in zip((projection.row, projection.col, projection.data), *self._pending))
+            self._projection = sp.csr_array((weights, (rows, cols)), shape=(n_products, n_products))
+            self._projection.eliminate_zeros()
+            self._projection.sort_indices()
+            self._pending = []
+            self._dirty = False
+        return self._projection
+
+    def projection_graph(self):
+        '''
+        Returns:
+            product_graph (nx.Graph): product projection graph
+        '''
+        return projection_to_graph(self.projection, self.product_ids)
+
+    def _user_weights(self, degrees):
+        '''
+        Weight of pairs of products of users with given number of kept products in projection mode of state.
+        '''
+        degrees = np.asarray(degrees)
+        if self.mode == "newman":
+            weights = np.zeros(len(degrees), dtype=np.float64)
+            np.divide(1.0, degrees - 1, out=weights, where=degrees > 1)
+            return weights
+        if self.mode == "cap_drop":
+            return (degrees <= self.max_degree).astype(np.int64)
+        return np.ones(len(degrees), dtype=np.int64)
+
+    def _grow_core(self, new_users, new_products, kept_users, kept_products):
+        '''
+        Find nodes which pass filtering after adding edges, filtering only nodes near new edges.
+        Adding edges only grows the filtered graph. Every connected group of newly kept nodes has a node with new edge,
+        so candidates are searched from ends of new edges through nodes which were not kept, skipping nodes with too
+        few edges to ever pass thresholds. Candidates are then filtered to a fixed point with kept nodes counted as kept.
+        Parameters:
+            new_users (np.ndarray): user index of every new edge
+            new_products (np.ndarray): product index of every new edge
+            kept_users (np.ndarray): boolean mask of users that passed filtering before update
+            kept_products (np.ndarray): boolean mask of products that passed filtering before update
+        Returns:
+            users (np.ndarray): indices of newly kept users
+            products (np.ndarray): indices of newly kept products
+        '''
+        # Threshold of users of filter_bipartite_arrays() used by from_table()
+        min_user_reviews = 2
+        seen_users = np.zeros(len(kept_users), dtype=bool)
+        seen_products = np.zeros(len(kept_products), dtype=bool)
+        user_frontier = np.unique(new_users[~kept_users[new_users]])
+        product_frontier = np.unique(new_products[~kept_products[new_products]])
+        candidate_users, candidate_products = [], []
+        while len(user_frontier) or len(product_frontier):
+            seen_users[user_frontier] = True
+            seen_products[product_frontier] = True
+            user_frontier = user_frontier[self.user_edges.counts(user_frontier) >= min_user_reviews]
+            product_frontier = product_frontier[self.product_edges.counts(product_frontier) >= self.min_reviews]
+            candidate_users.append(user_frontier)
+            candidate_products.append(product_frontier)
+            _, products = self.user_edges.groups(user_frontier)
+            _, users = self.product_edges.groups(product_frontier)
+            user_frontier = np.unique(users[~kept_users[users] & ~seen_users[users]])
+            product_frontier = np.unique(products[~kept_products[products] & ~seen_products[products]])
+        users = np.sort(np.concatenate(candidate_users)) if candidate_users else np.empty(0, dtype=np.int64)
+        products = np.sort(np.concatenate(candidate_products)) if candidate_products else np.empty(0, dtype=np.int64)
+
+        # Edges of candidates, neighbours are kept, candidates (position in candidate array) or never kept
+        user_owners, user_neighbors = self.user_edges.groups(users)
+        product_owners, product_neighbors = self.product_edges.groups(products)
+        product_positions = np.minimum(np.searchsorted(products, user_neighbors), max(len(products) - 1, 0))
+        product_candidate = (products[product_positions] == user_neighbors) if len(products) else np.zeros(len(user_neighbors), dtype=bool)
+        user_positions = np.minimum(np.searchsorted(users, product_neighbors), max(len(users) - 1, 0))
+        user_candidate = (users[user_positions] == product_neighbors) if len(users) else np.zeros(len(product_neighbors), dtype=bool)
+        alive_users = np.ones(len(users), dtype=bool)
+        alive_products = np.ones(len(products), dtype=bool)
+        while True:
+            product_alive = kept_products[user_neighbors] | (product_candidate & alive_products[product_positions] if len(products) else False)
+            user_alive = kept_users[product_neighbors] | (user_candidate & alive_users[user_positions] if len(users) else False)
+            user_degrees = np.bincount(user_owners, weights=product_alive, minlength=len(users))
+            product_degrees = np.bincount(product_owners, weights=user_alive, minlength=len(products))
+            removed_users = alive_users & (user_degrees < min_user_reviews)
+            removed_products = alive_products & (product_degrees < self.min_reviews)
+            if not removed_users.any() and not removed_products.any():
+                break
+            alive_users &= ~removed_users
+            alive_products &= ~removed_products
+        return users[alive_users], products[alive_products]
+
+    def _add_to_projection(self, rows, cols, weights):
+        '''
+        Add weights to pairs of products in both directions. Weights of pairs stored in matrix are added in place,
+        other pairs are kept aside until projection is accessed.
+        '''
+        n_products = len(self.product_ids)
+        delta = sp.coo_array((np.concatenate([weights, weights]), (np.concatenate([rows, cols]), np.concatenate([cols, rows]))),
+                             shape=(n_products, n_products))
+        delta.sum_duplicates()
+        stored = self._projection
+        inside = (delta.row < stored.shape[0]) & (delta.col < stored.shape[1])
+        positions = np.full(delta.nnz, -1)
+        positions[inside] = _csr_positions(stored, delta.row[inside], delta.col[inside])
+        found = positions >= 0
+        stored.data[positions[found]] += delta.data[found].astype(stored.dtype)
+        self._dirty |= bool((stored.data[positions[found]] == 0).any())
+        if not found.all():
+            self._pending.append((delta.row[~found], delta.col[~found], delta.data[~found].astype(stored.dtype)))
+
+    def update(self, delta_path, error_log="../output/error_lines_delta.txt"):
+        '''
+        Add reviews from delta JSONL file to state, with work proportional to size of delta and its neighbourhood.
+        New edges are added as new sorted blocks of both edge indexes, filtering is re-applied only to nodes near
+        new edges, see _grow_core(). Projection is changed only for affected users: users with new edges, newly kept
+        users and users of newly kept products. Every affected user adds its new weight to pairs with added products
+        and difference of its new and old weight to pairs of its previous products.
+        Supported for projection modes of UPDATABLE_MODES.
+        Parameters:
+            delta_path (str): path to JSONL file with new reviews
+            error_log (str): path to error log file
+        Returns:
+            added (int): number of new user-product edges
+        '''
+        if self.mode not in UPDATABLE_MODES:
+            raise ValueError(f"Incremental update is supported for projection modes {UPDATABLE_MODES}, state was built in {self.mode} mode, "
+                             f"run full build with delta_path = None instead")
+        user_ids, product_ids = [], []
+        for review in iter_reviews(delta_path, error_log):
+            user_ids.append(review.user_id)
+            product_ids.append(review.product_id)
+        delta_users, self.user_ids, self.user_order = _encode(self.user_ids, self.user_order, user_ids)
+        delta_products, self.product_ids, self.product_order = _encode(self.product_ids, self.product_order, product_ids)
+        n_users, n_products = len(self.user_ids), len(self.product_ids)
+
+        new_keys = self.user_edges.add(_pair_keys(delta_users, delta_products))
+        new_users, new_products = new_keys >> 32, new_keys & 0xFFFFFFFF
+        self.product_edges.add(_pair_keys(new_products, new_users))
+
+        old_kept_users = np.pad(self.kept_users, (0, n_users - len(self.kept_users)))
+        old_kept_products = np.pad(self.kept_products, (0, n_products - len(self.kept_products)))
+        kept_users, kept_products = old_kept_users.copy(), old_kept_products.copy()
+        newly_kept_users, newly_kept_products = self._grow_core(new_users, new_products, old_kept_users, old_kept_products)
+        kept_users[newly_kept_users] = True
+        kept_products[newly_kept_products] = True
+
+        _, product_users = self.product_edges.groups(newly_kept_products)
+        affected = np.unique(np.concatenate([new_users, newly_kept_users, product_users]))
+        affected = affected[kept_users[affected]]
+        owners, products = self.user_edges.groups(affected)
+        is_new = np.zeros(len(products), dtype=bool)
+        if len(new_keys):
+            keys = _pair_keys(affected[owners], products)
+            is_new = new_keys[np.minimum(np.searchsorted(new_keys, keys), len(new_keys) - 1)] == keys
+        current = kept_products[products]
+        previous = old_kept_users[affected[owners]] & old_kept_products[products] & ~is_new
+        old_weights = self._user_weights(np.bincount(owners, weights=previous, minlength=len(affected)))
+        old_weights[~old_kept_users[affected]] = 0
+        new_weights = self._user_weights(np.bincount(owners, weights=current, minlength=len(affected)))
+        bounds = np.searchsorted(owners, np.arange(len(affected) + 1))
+
+        rows, cols, weights = [], [], []
+        for i in range(len(affected)):
+            user_products = products[bounds[i]:bounds[i + 1]]
+            old = user_products[previous[bounds[i]:bounds[i + 1]]]
+            added = user_products[current[bounds[i]:bounds[i + 1]] & ~previous[bounds[i]:bounds[i + 1]]]
+            if new_weights[i] != old_weights[i]:
+                first, second = np.triu_indices(len(old), k=1)
+                rows.append(old[first])
+                cols.append(old[second])
+                weights.append(np.full(len(first), new_weights[i] - old_weights[i]))
+            if new_weights[i] and len(added):
+                first, second = np.triu_indices(len(added), k=1)
+                rows += [np.repeat(added, len(old)), added[first]]
+                cols += [np.tile(old, len(added)), added[second]]
+                weights.append(np.full(len(added) * len(old) + len(first), new_weights[i]))
+        if rows:
+            self._add_to_projection(np.concatenate(rows), np.concatenate(cols), np.concatenate(weights))
+        self.kept_users = kept_users
+        self.kept_products = kept_products
+        print(f"Added {len(new_keys)} new edges, {len(newly_kept_products)} products and {len(newly_kept_users)} users passed filtering, "
+              f"{len(affected)} users affected, {sum(len(r) for r in rows)} projection pairs changed.")
+        return len(new_keys)
+
+    def save(self, directory):
+        '''
+        Save state to directory. Every sorted block of edge indexes is saved to its own file.
+        Parameters:
+            directory (str): path to directory
+        Returns:
+            None
+        '''
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, "*_edges_*.npy")) + glob.glob(os.path.join(directory, "edge_*.npy")):
+            os.remove(path)
+        np.save(os.path.join(directory, "user_ids.npy"), self.user_ids)
+        np.save(os.path.join(directory, "product_ids.npy"), self.product_ids)
+        np.save(os.path.join(directory, "user_order.npy"), self.user_order)
+        np.save(os.path.join(directory, "product_order.npy"), self.product_order)
+        for name, edges in (("user", self.user_edges), ("product", self.product_edges)):
+            for i, block in enumerate(edges.blocks):
+                np.save(os.path.join(directory, f"{name}_edges_{i}.npy"), block)
+        np.save(os.path.join(directory, "kept_users.npy"), self.kept_users)
+        np.save(os.path.join(directory, "kept_products.npy"), self.kept_products)
+        sp.save_npz(os.path.join(directory, "projection.npz"), sp.csr_matrix(self.projection))
+        with open(os.path.join(directory, "state.json"), 'w') as f:
+            json.dump({"min_reviews": self.min_reviews, "mode": self.mode, "key": self.key, "applied_deltas": self.applied_deltas,
+                       "max_degree": self.max_degree, "blocks": {"user": len(self.user_edges.blocks), "product": len(self.product_edges.blocks)}}, f)
+        print(f"State saved to {directory}")
+
+    @staticmethod
+    def stored_params(directory):
+        '''
+        Get parameters of state saved in directory without loading it.
+        Parameters:
+            directory (str): path to directory
+        Returns:
+            params (dict): content of state.json (min_reviews, mode, key, applied_deltas, max_degree, blocks), None if there is no saved state
+        '''
+        try:
+            with open(os.path.join(directory, "state.json"), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def stored_key(directory):
+        '''
+        Get key of state saved in directory without loading it.
+        Parameters:
+            directory (str): path to directory
+        Returns:
+            key (str): key of saved state, None if there is no saved state
+        '''
+        params = BipartiteState.stored_params(directory)
+        return params.get("key") if params else None
+
+    @classmethod
+    def load(cls, directory):
+        '''
+        Load state saved with save(). State saved by older version with edge arrays is indexed on load.
+        Parameters:
+            directory (str): path to directory
+        Returns:
+            state (BipartiteState): loaded state
+        '''
+        params = cls.stored_params(directory)
+        if params is None:
+            raise FileNotFoundError(f"No saved state in {directory}, run full build with delta_path = None first to create it")
+        blocks = params.pop("blocks", None)
+        if blocks is None:
+            edge_arrays = (np.load(os.path.join(directory, "edge_users.npy")), np.load(os.path.join(directory, "edge_products.npy")))
+        else:
+            edge_arrays = (None, None)
+            params["orders"] = (np.load(os.path.join(directory, "user_order.npy")), np.load(os.path.join(directory, "product_order.npy")))
+            params["edges"] = tuple(SortedBlocks([np.load(os.path.join(directory, f"{name}_edges_{i}.npy")) for i in range(blocks[name])])
+                                    for name in ("user", "product"))
+        state = cls(
+            np.load(os.path.join(directory, "user_ids.npy")),
+            np.load(os.path.join(directory, "product_ids.npy")),
+            *edge_arrays,
+            np.load(os.path.join(directory, "kept_users.npy")),
+            np.load(os.path.join(directory, "kept_products.npy")),
+            sp.csr_array(sp.load_npz(os.path.join(directory, "projection.npz"))),
+            **params
+        )
+        print(f"State loaded from {directory}")
+        return state
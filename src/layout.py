@@ -0,0 +1,154 @@
+import hashlib
+import os
+import numpy as np
+from matplotlib.collections import LineCollection
+from scipy.sparse.csgraph import shortest_path
+from graph_store import as_csr_graph
+
+def _hop_distances(graph, sources):
+    '''
+    Number of hops from every source to every node, unreachable nodes get distance one larger than largest finite distance.
+    '''
+    distances = shortest_path(graph.to_scipy(), unweighted=True, directed=False, indices=sources)
+    finite = np.isfinite(distances)
+    distances[~finite] = distances[finite].max() + 1
+    return distances
+
+def pivot_mds(graph, dim=2, pivots=50, seed=None):
+    '''
+    Pivot MDS layout: classical multidimensional scaling of hop distances to pivot nodes only.
+    Pivots are chosen one by one as nodes farthest from pivots chosen before.
+    Parameters:
+        graph (CSRGraph): graph to lay out
+        dim (int): number of dimensions
+        pivots (int): number of pivots
+        seed (int): seed of random generator choosing first pivot
+    Returns:
+        positions (np.ndarray): n x dim array of positions of nodes
+        pivot_nodes (np.ndarray): indices of pivots
+        distances (np.ndarray): n x pivots array of hop distances from nodes to pivots
+    '''
+    n = graph.number_of_nodes()
+    k = min(pivots, n)
+    pivot_nodes = [int(np.random.default_rng(seed).integers(n))]
+    columns = [_hop_distances(graph, pivot_nodes[0])]
+    nearest = columns[0].copy()
+    while len(pivot_nodes) < k:
+        pivot = int(np.argmax(nearest))
+        pivot_nodes.append(pivot)
+        columns.append(_hop_distances(graph, pivot))
+        nearest = np.minimum(nearest, columns[-1])
+    distances = np.column_stack(columns)
+    squared = distances ** 2
+    centered = -0.5 * (squared - squared.mean(axis=0) - squared.mean(axis=1)[:, None] + squared.mean())
+    left, singular, _ = np.linalg.svd(centered, full_matrices=False)
+    positions = left[:, :dim] * singular[:dim]
+    if positions.shape[1] < dim:
+        positions = np.pad(positions, ((0, 0), (0, dim - positions.shape[1])))
+    return positions, np.array(pivot_nodes), distances
+
+def stress_layout(graph, dim=2, pivots=50, iterations=100, tol=1e-4, seed=None):
+    '''
+    Sparse stress layout of graph: pivot MDS positions refined with stress majorization restricted to edges
+    and distances to pivots, so memory grows with number of edges and pivots instead of square of number of nodes.
+    Distances are counted in hops, edge weights are not used.
+    Parameters:
+        graph (nx.Graph or CSRGraph): graph to lay out
+        dim (int): number of dimensions
+        pivots (int): number of pivots
+        iterations (int): maximal number of iterations of stress majorization
+        tol (float): iterations stop when relative change of positions is smaller
+        seed (int): seed of random generator
+    Returns:
+        positions (np.ndarray): n x dim array of positions of nodes, in order of graph.ids, scaled to [-1, 1]
+    '''
+    graph = as_csr_graph(graph)
+    n = graph.number_of_nodes()
+    if n < 2:
+        return np.zeros((n, dim))
+    positions, pivot_nodes, distances = pivot_mds(graph, dim, pivots, seed)
+    sources, targets, _ = graph.edges()
+    nodes = np.repeat(np.arange(n), len(pivot_nodes))
+    others = np.tile(pivot_nodes, n)
+    pivot_distances = distances.ravel()
+    distinct = nodes != others
+    first = np.concatenate([sources, targets, nodes[distinct]])
+    second = np.concatenate([targets, sources, others[distinct]])
+    lengths = np.concatenate([np.ones(2 * len(sources)), pivot_distances[distinct]])
+    weights = lengths ** -2.0
+    total_weight = np.bincount(first, weights=weights, minlength=n)
+    total_weight[total_weight == 0] = 1.0
+
+    positions = positions + np.random.default_rng(seed).normal(scale=1e-6, size=positions.shape)
+    for _ in range(iterations):
+        difference = positions[first] - positions[second]
+        norm = np.maximum(np.linalg.norm(difference, axis=1), 1e-9)
+        moved = positions[second] + (lengths / norm)[:, None] * difference
+        updated = np.column_stack([np.bincount(first, weights=weights * moved[:, d], minlength=n) for d in range(dim)])
+        updated /= total_weight[:, None]
+        change = np.linalg.norm(updated - positions) / max(np.linalg.norm(positions), 1e-9)
+        positions = updated
+        if change < tol:
+            break
+    positions -= positions.mean(axis=0)
+    scale = np.abs(positions).max()
+    return positions / scale if scale > 0 else positions
+
+def graph_hash(graph, **params):
+    '''
+    Hash of node IDs, structure of graph and layout parameters, used as key of cached layout.
+    Parameters:
+        graph (CSRGraph): graph
+        params: layout parameters
+    Returns:
+        key (str): hexadecimal hash
+    '''
+    digest = hashlib.sha1()
+    digest.update("\0".join(graph.ids.tolist()).encode())
+    digest.update(np.ascontiguousarray(graph.indptr, dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(graph.indices, dtype=np.int64).tobytes())
+    digest.update(repr(sorted(params.items())).encode())
+    return digest.hexdigest()
+
+def community_layout(graph, cache_dir="../data/layouts", **params):
+    '''
+    Stress layout of community graph, cached on disk by hash of community and parameters.
+    Parameters:
+        graph (nx.Graph or CSRGraph): graph of community
+        cache_dir (str): directory with cached positions, no caching if None
+        params: parameters of stress_layout()
+    Returns:
+        positions (np.ndarray): n x dim array of positions of nodes, in order of CSRGraph ids
+    '''
+    graph = as_csr_graph(graph)
+    if cache_dir is None:
+        return stress_layout(graph, **params)
+    path = os.path.join(cache_dir, f"{graph_hash(graph, **params)}.npy")
+    if os.path.exists(path):
+        return np.load(path)
+    positions = stress_layout(graph, **params)
+    os.makedirs(cache_dir, exist_ok=True)
+    np.save(path, positions)
+    return positions
+
+def draw_graph(ax, graph, positions, node_size=3, width=0.3, node_color="tab:blue", edge_color="black"):
+    '''
+    Draw graph with all edges in one LineCollection and all nodes in one scatter.
+    Parameters:
+        ax (matplotlib.axes.Axes): axes to draw on
+        graph (CSRGraph): graph to draw
+        positions (np.ndarray): n x 2 array of positions of nodes, in order of graph.ids
+        node_size (float or list): size of nodes
+        width (float): width of edges
+        node_color (str): color of nodes
+        edge_color (str): color of edges
+    Returns:
+        None
+    '''
+    sources, targets, _ = graph.edges()
+    segments = np.stack([positions[sources], positions[targets]], axis=1)
+    ax.add_collection(LineCollection(segments, linewidths=width, colors=edge_color, zorder=1))
+    ax.scatter(positions[:, 0], positions[:, 1], s=node_size, c=node_color, zorder=2)
+    ax.autoscale()
+    ax.set_aspect("equal")
+    ax.set_axis_off()
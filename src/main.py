@@ -1,66 +1,163 @@
-import networkx as nx
-from data_processing import load_graph, process_reviews, create_bipartite_graph, filter_bipart_graph, generate_product_projection, save_graph
-from clustering import apply_clustering_algorithms
+import centrality
+import clustering
+import data_processing
+import database
+import graph_store
+import incremental
+import partition
+import projection
+import review
+import review_table
+import sentiment
+import stages
+from data_processing import load_review_table
+from graph_store import CSRGraph
+from incremental import BipartiteState
+from projection import projection_to_csr
+from stage_cache import StageCache
+from partition import build_partitions
+from clustering import apply_clustering_algorithms, resolution_sweep, consensus_clustering, community_statistics
+from centrality import analyze_centrality
 from plotting import plot_community_sizes_distro, plot_statistics_community_sizes, plot_single_community, plot_components_sizes_distro, plot_degree_distro, plot_clusters_categories
-from utility import find_dense, find_largest, save_communities, find_random, save_central_nodes, save_basic_stats
+from utility import find_dense, find_largest, save_community_reports, find_random, save_central_nodes, save_basic_stats, save_community_statistics, save_resolution_sweep, save_consensus_stability
 
 if __name__ == "__main__":
     input_path = '../data/books.json'
     db_path = '../data/metadata.db'
-    graph_filename = '../data/review_graph.pkl'
-    try:
-        review_graph = load_graph(graph_filename)
-        print("Graph loaded from file")
-    except FileNotFoundError:
-        review_graph = nx.Graph()
-        batch_reviews = process_reviews(input_path)
-        B = create_bipartite_graph(batch_reviews)
-        print(f"Bipart graph size before filtering: {len(B.edges)}")
-        B = filter_bipart_graph(B)
-        print(f"Bipart graph size after filtering: {len(B.edges)}")
-
-        review_graph = generate_product_projection(B)
-            ##############################
-        '''
-        BASIC STATISTICS
-        '''
-        ##############################
-        print(f"Graph size: {len(review_graph.nodes)} nodes, {len(review_graph.edges)} edges.")
-        save_basic_stats(review_graph)
-        plot_components_sizes_distro(review_graph)
-        plot_degree_distro(review_graph)
-        print("Basic statistics saved")
-
-        ##############################
-        '''
-        CONNECTIVITY
-        '''
-        ##############################
-        largest_component = max(nx.connected_components(review_graph), key=len)
-        review_graph = review_graph.subgraph(largest_component)
-        print("Graph is connected")
-        
-        save_graph(review_graph, graph_filename)
-        print("Graph generated and saved to file")
-
-    
+    cache_dir = '../data/cache'
+    state_dir = '../data/review_state'
+    # Last partition of every clustering method, Leiden and Louvain start from it and community IDs stay stable between runs
+    partitions_dir = '../data/partitions'
+    # Seed of clustering methods, so that partitions and persisted state settle between runs
+    clustering_seed = 0
+    # Resolutions of Leiden sweep, every partition is saved for later selection, None to skip sweep
+    resolutions = clustering.SWEEP_RESOLUTIONS
+    # Seeded runs of every method combined into consensus partition, added to clusters as "consensus", 0 to skip
+    consensus_runs = 10
+    # Worker processes of resolution sweep and consensus, every worker holds a copy of graph, None for at most clustering.MAX_GRAPH_WORKERS
+    clustering_processes = None
+    # Maximal sampled sources of betweenness and closeness centrality and time limit of each in seconds, None for exact values and no limit,
+    # sampling stops earlier when error bounds of top nodes are smaller than spread of their scores
+    centrality_samples = 4096
+    centrality_time_budget = None
+    # Path to JSONL file with new reviews, when set stored state is updated instead of rebuilding graph
+    delta_path = None
+    min_reviews = 2
+    # Sentiment is not used by clustering, enable only when reviews are needed with it
+    with_sentiment = False
+    # One of projection.PROJECTION_MODES, limits edges added by users who reviewed very many products
+    projection_mode = "full"
+    # Maximal user degree of cap_drop and cap_sample modes, percentile of user degrees of percentile mode, seed of cap_sample mode
+    projection_max_degree = 1000
+    projection_percentile = 99.9
+    projection_seed = None
+    cache = StageCache(cache_dir)
+
+    ##############################
+    '''
+    GRAPH STAGES
+    '''
+    ##############################
+    if delta_path is not None:
+        state = BipartiteState.load(state_dir)
+        delta_hash = cache.file_hash(delta_path)
+        if delta_hash in state.applied_deltas:
+            print(f"Delta {delta_path} was already applied to stored state")
+        else:
+            state.update(delta_path)
+            state.key = cache.key("delta", [state.key, delta_hash])
+            state.applied_deltas.append(delta_hash)
+            state.save(state_dir)
+        projected = cache.stage("projection", lambda: (state.projection, state.product_ids), [state.key],
+                                modules=[stages, incremental, data_processing, projection],
+                                save=stages.save_projection, load=stages.load_projection)
+    else:
+        # Modules of every stage are all modules its compute, save and load functions call, so that changing them invalidates cache
+        reviews = cache.stage("reviews", lambda: load_review_table(input_path, with_sentiment=with_sentiment),
+                              [cache.file_hash(input_path)], {"with_sentiment": with_sentiment},
+                              [stages, data_processing, review, review_table, sentiment],
+                              save=stages.save_table, load=stages.load_table)
+        bipartite = cache.stage("bipartite", lambda: stages.bipartite_arrays(reviews.value), [reviews.key],
+                                modules=[stages, review_table], save=stages.save_arrays, load=stages.load_arrays)
+        filtered = cache.stage("filtered", lambda: stages.filter_arrays(bipartite.value, min_reviews), [bipartite.key],
+                               {"min_reviews": min_reviews}, [stages, data_processing], save=stages.save_arrays, load=stages.load_arrays)
+        projected = cache.stage("projection", lambda: stages.build_projection(bipartite.value, filtered.value, projection_mode, projection_max_degree,
+                                                                              projection_percentile, projection_seed),
+                                [filtered.key], {"mode": projection_mode, "max_degree": projection_max_degree,
+                                                 "percentile": projection_percentile, "seed": projection_seed},
+                                [stages, projection], save=stages.save_projection, load=stages.load_projection)
+        stored = BipartiteState.stored_params(state_dir) or {}
+        if stored.get("applied_deltas"):
+            # Reviews of deltas are not in input_path, replacing the state would lose them
+            print(f"WARNING: state in {state_dir} has {len(stored['applied_deltas'])} applied delta files, "
+                  f"it is not replaced by full build of {input_path}. Remove {state_dir} to replace it.")
+        elif stored.get("key") != projected.key:
+            user_ids, product_ids, users, products = bipartite.value
+            BipartiteState(user_ids, product_ids, users, products, *filtered.value, projected.value[0],
+                           min_reviews, projection_mode, projected.key, max_degree=projection_max_degree).save(state_dir)
+
+    ##############################
+    '''
+    BASIC STATISTICS
+    '''
+    ##############################
+    # Written on every run, also when component is taken from cache
+    product_graph = projection_to_csr(*projected.value)
+    print(f"Graph size: {product_graph.number_of_nodes()} nodes, {product_graph.number_of_edges()} edges.")
+    save_basic_stats(product_graph)
+    plot_components_sizes_distro(product_graph)
+    plot_degree_distro(product_graph)
+    print("Basic statistics saved")
+
+    ##############################
+    '''
+    CONNECTIVITY
+    '''
+    ##############################
+    component = cache.stage("component", product_graph.largest_component, [projected.key], modules=[graph_store, projection],
+                            save=lambda graph, path: graph.save(path), load=CSRGraph.load)
+    review_graph = component.value
+    print(f"Graph ready: {review_graph.number_of_nodes()} nodes, {review_graph.number_of_edges()} edges.")
+
     ##############################
     '''
     CLUSTERING
     '''
     ##############################
     print("Applying clustering algorithms...")
-    clusters = apply_clustering_algorithms(review_graph)
+    # Partitions in partitions_dir are not part of the key: they are rewritten by every computation,
+    # and clusters of unchanged component are taken from cache without clustering again
+    clusters = cache.stage("clusters", lambda: apply_clustering_algorithms(component.value, graph_dir=component.path,
+                                                                           warm_start_dir=partitions_dir, seed=clustering_seed),
+                           [component.key], {"seed": clustering_seed}, [clustering, graph_store, partition]).value
+    if consensus_runs:
+        print("Building consensus of seeded clustering runs...")
+        consensus = cache.stage("consensus", lambda: consensus_clustering(component.value, runs=consensus_runs, processes=clustering_processes,
+                                                                          graph_dir=component.path),
+                                [component.key], {"runs": consensus_runs}, [clustering, graph_store, partition]).value
+        save_consensus_stability(consensus)
+        clusters = {**clusters, "consensus": consensus["partition"]}
+    partitions = build_partitions(clusters)
     print("Clustering algorithms applied.")
 
+    if resolutions:
+        print("Running resolution sweep of Leiden clustering...")
+        sweep = cache.stage("resolution_sweep", lambda: resolution_sweep(component.value, resolutions, processes=clustering_processes, graph_dir=component.path),
+                            [component.key], {"resolutions": list(resolutions)}, [clustering, graph_store, partition])
+        save_resolution_sweep(sweep.value)
+
+    print("Calculating community statistics...")
+    community_stats = {method: community_statistics(component.value, partition) for method, partition in partitions.items()}
+    save_community_statistics(partitions, community_stats)
+
     print("Finding dense communities...")
-    dense = find_dense(review_graph, clusters)
+    dense = find_dense(review_graph, partitions, community_stats=community_stats)
 
     print("Finding communities based on size...")
-    largest, smallest, medium = find_largest(clusters)
+    largest, smallest, medium = find_largest(partitions)
 
     print("Getting random communities...")
-    randos = find_random(clusters)
+    randos = find_random(partitions)
 
     ##############################
     '''
@@ -68,16 +165,8 @@ if __name__ == "__main__":
     '''
     ##############################
     print("Saving communities...")
-    save_communities(largest, db_path, "largest")
-    print("Largest communities saved.")
-    save_communities(smallest, db_path, "smallest")
-    print("Smallest communities saved")
-    save_communities(medium, db_path, "medium")
-    print("Medium communities saved")
-    save_communities(dense, db_path, "dense")
-    print("Dense communities saved")
-    save_communities(randos, db_path, "random")
-    print("Random communities saved")
+    save_community_reports({"largest": largest, "smallest": smallest, "medium": medium, "dense": dense, "random": randos}, db_path)
+    print("Communities saved.")
 
     ##############################
     '''
@@ -85,16 +174,16 @@ if __name__ == "__main__":
     '''
     ##############################
     print("Plotting community size distribution...")
-    plot_community_sizes_distro(clusters)
+    plot_community_sizes_distro(partitions)
 
     print("Plotting categories distribution")
-    plot_clusters_categories(review_graph, clusters, db_path)
+    plot_clusters_categories(review_graph, partitions, db_path)
 
     print("Calculating statistics of clusters...")
-    plot_statistics_community_sizes(review_graph, clusters)
+    plot_statistics_community_sizes(review_graph, partitions, community_stats=community_stats)
 
     print("Plotting single community...")
-    plot_single_community(review_graph, clusters)
+    plot_single_community(review_graph, partitions)
 
     ##############################
     '''
@@ -102,4 +191,10 @@ if __name__ == "__main__":
     '''
     ##############################
     print("Looking for central nodes...")
-    save_central_nodes(review_graph, db_path, review_graph.number_of_nodes()//10)
+    amount = review_graph.number_of_nodes()//10
+    centralities = cache.stage("centralities", lambda: analyze_centrality(component.value, amount, samples=centrality_samples,
+                                                                          time_budget=centrality_time_budget, graph_dir=component.path),
+                               [component.key], {"amount": amount, "samples": centrality_samples, "time_budget": centrality_time_budget},
+                               [centrality, graph_store])
+    save_central_nodes(review_graph, db_path, amount, results=centralities.value)
+    print(f"Metadata lookups: {database.get_client(db_path)}")
@@ -0,0 +1,115 @@
+import numpy as np
+
+class Partition:
+    '''
+    Partition of graph nodes into communities, built once and shared by all analysis functions.
+    Communities are numbered 0..k-1 in order of their original labels.
+    Parameters:
+        nodes (list): node IDs, index in list is node index
+        labels (np.ndarray): community index of every node
+        label_ids (np.ndarray): original label of every community
+    Attributes:
+        members (list): list of communities, every community is list of node IDs
+        sizes (np.ndarray): size of every community
+        by_size (np.ndarray): community indices sorted by size ascending
+    '''
+    def __init__(self, nodes, labels, label_ids):
+        self.nodes = nodes
+        self.labels = labels
+        self.label_ids = label_ids
+        self.sizes = np.bincount(labels, minlength=len(label_ids))
+        order = np.argsort(labels, kind="stable")
+        bounds = np.cumsum(self.sizes)[:-1]
+        self.members = [[nodes[i] for i in group] for group in np.split(order, bounds)] if len(label_ids) else []
+        self.by_size = np.argsort(self.sizes, kind="stable")
+        self._index = None
+
+    def __len__(self):
+        return len(self.label_ids)
+
+    def __repr__(self):
+        return f"Partition(nodes={len(self.nodes)}, communities={len(self)})"
+
+    @classmethod
+    def from_dict(cls, cluster):
+        '''
+        Build partition in a single pass over clustering result.
+        Parameters:
+            cluster (dict): dictionary where keys are nodes, values are community assignments
+        Returns:
+            partition (Partition): built partition
+        '''
+        nodes = list(cluster)
+        label_ids, labels = np.unique(np.fromiter(cluster.values(), dtype=np.int64, count=len(nodes)), return_inverse=True)
+        return cls(nodes, labels, label_ids)
+
+    @property
+    def index(self):
+        '''
+        Dictionary where keys are node IDs, values are node indices.
+        '''
+        if self._index is None:
+            self._index = {node: i for i, node in enumerate(self.nodes)}
+        return self._index
+
+    def labels_for(self, node_ids):
+        '''
+        Get community indices of given nodes.
+        Parameters:
+            node_ids (iterable): node IDs
+        Returns:
+            labels (np.ndarray): community index of every node
+        '''
+        index = self.index
+        return self.labels[np.fromiter((index[node] for node in node_ids), dtype=np.int64)]
+
+    def save(self, filename):
+        '''
+        Save partition to .npz file with node IDs and their original community labels.
+        Parameters:
+            filename (str): path to file
+        Returns:
+            None
+        '''
+        np.savez(filename, nodes=np.array(self.nodes, dtype=str), labels=self.label_ids[self.labels])
+
+    @classmethod
+    def load(cls, filename):
+        '''
+        Load partition saved with save().
+        Parameters:
+            filename (str): path to .npz file
+        Returns:
+            partition (Partition): loaded partition
+        '''
+        with np.load(filename) as data:
+            nodes = data["nodes"].tolist()
+            label_ids, labels = np.unique(data["labels"], return_inverse=True)
+        return cls(nodes, labels, label_ids)
+
+    def to_dict(self):
+        '''
+        Returns:
+            cluster (dict): dictionary where keys are nodes, values are original community labels
+        '''
+        return dict(zip(self.nodes, self.label_ids[self.labels].tolist()))
+
+def as_partition(cluster):
+    '''
+    Get Partition of clustering result, building it if dictionary is given.
+    Parameters:
+        cluster (dict or Partition): dictionary where keys are nodes, values are community assignments
+    Returns:
+        partition (Partition): partition of nodes
+    '''
+    return cluster if isinstance(cluster, Partition) else Partition.from_dict(cluster)
+
+def build_partitions(clusters):
+    '''
+    Build Partition for every method of apply_clustering_algorithms() output.
+    Parameters:
+        clusters (dict): dictionary where keys are method names, values are partition results.
+    Returns:
+        partitions (dict): dictionary where keys are method names, values are Partition objects
+    '''
+    return {method: as_partition(cluster) for method, cluster in clusters.items()}
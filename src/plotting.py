@@ -3,9 +3,13 @@ import numpy as np
 import random
 import os
 import statistics
-from clustering import calculate_modularity
+from clustering import community_statistics
 import networkx as nx
-from utility import get_moderate_community, normalize_clusters
+from utility import get_moderate_community
+from partition import as_partition
+from graph_store import as_csr_graph
+from layout import community_layout, draw_graph
+from histogram import value_counts, log_bins, save_csv
 import database
 from itertools import chain
 from collections import Counter
@@ -15,110 +19,108 @@ from collections import Counter
 ## Functions plotting values
 ##########################################################
 
+def plot_distribution(values, plot_filename, title, xlabel, ylabel, label=None, log=False, figsize=None):
+    '''
+    Plot distribution of integer values and save data of plot to CSV files next to plot.
+    Values are counted with histogram.value_counts(), counts of every value are saved to CSV file with the same name as plot.
+    On logarithmic plot counts are also aggregated into logarithmic bins, drawn as mean count per value in bin
+    and saved to CSV file with "_binned" suffix, so plot can be drawn again from CSV files only.
+    Parameters:
+        values (array_like): values, e.g. degrees of nodes
+        plot_filename (str): path to PNG file
+        title (str): title of plot, None for no title
+        xlabel (str): label of x axis
+        ylabel (str): label of y axis
+        label (str): label of plotted values
+        log (bool): use logarithmic axes and logarithmic bins
+        figsize (tuple): size of figure, default size if None
+    Returns:
+        distinct (np.ndarray): distinct values, sorted
+        counts (np.ndarray): number of occurrences of every distinct value
+    '''
+    distinct, counts = value_counts(values)
+    base = os.path.splitext(plot_filename)[0]
+    save_csv(base + ".csv", {"value": distinct, "count": counts})
+
+    plt.figure(figsize=figsize)
+    if log:
+        bins = log_bins(distinct, counts)
+        save_csv(base + "_binned.csv", bins)
+        plt.plot(distinct, counts, marker='o', linestyle='', alpha=0.3, label=label)
+        plt.plot(bins["center"], bins["density"], marker='s', linestyle='-', label=f"{label}, przedziały logarytmiczne" if label else None)
+        plt.yscale('log')
+        plt.xscale('log')
+    else:
+        plt.plot(distinct, counts, marker='o', linestyle='-', label=label)
+    if title:
+        plt.title(title)
+    plt.xlabel(xlabel)
+    plt.ylabel(ylabel)
+    plt.grid(True, which="both", linestyle='--', linewidth=0.5)
+    plt.savefig(plot_filename)
+    plt.close()
+    return distinct, counts
+
 def plot_community_sizes_distro(clusters, output_dir="../output"):
     '''
     Plot community sizes distribution for each clustering algorithm using matplotlib.
     Parameters:
-        clusters (dict): dictionary where keys are method names, values are partition results.
+        clusters (dict): dictionary where keys are method names, values are Partition objects or partition results.
     Returns:
         None
     '''
     for method, cluster in clusters.items():
-        communities = {c: [k for k, v in cluster.items() if v == c] for c in set(cluster.values())}
-        sizes = [len(community) for community in communities.values()]
-        # print(f"Method: {method}")
-        # print(sizes)
-        # plt.hist(sizes, len(set(sizes)))
-
-        size_counts = {size: sizes.count(size) for size in set(sizes)}
-
-        sorted_sizes = sorted(size_counts.keys())
-        sorted_counts = [size_counts[size] for size in sorted_sizes]
-
-        print(f"Method: {method}")
-        print(f"Sizes: {sorted_sizes}")
-        print(f"Counts: {sorted_counts}")
-
-        plt.plot(sorted_sizes, sorted_counts, marker='o', linestyle='-', label=method)
-
-        plt.yscale('log')
-        plt.xscale('log')
-        plt.title(f"Rozkład wielkości klastrów metody ({method})")
-        plt.xlabel("Wielkość klastra")
-        plt.ylabel("Ilość klastrów")
-        plt.grid(True)
+        os.makedirs(os.path.join(output_dir, method), exist_ok=True)
         plot_filename = output_dir+ "/" + method + "/community_sizes_distro.png"
-        plt.savefig(plot_filename)
-        plt.close()
-        #plt.show()
-        
+        sorted_sizes, sorted_counts = plot_distribution(as_partition(cluster).sizes, plot_filename,
+                                                        f"Rozkład wielkości klastrów metody ({method})",
+                                                        "Wielkość klastra", "Ilość klastrów", label=method, log=True)
+        print(f"Method: {method}")
+        print(f"Sizes: {sorted_sizes.tolist()}")
+        print(f"Counts: {sorted_counts.tolist()}")
 
 def plot_components_sizes_distro(review_graph, output_dir="../output/plots"):
     '''
     Plot distribution of components sizes in graph
     Parameters:
-        review_graph (nx.Graph): given graph
+        review_graph (nx.Graph or CSRGraph): given graph
         output_dir (str): path to diretory where plot will be saved
     Returns:
         None
     '''
     os.makedirs(output_dir, exist_ok=True)
     plot_filename = output_dir + "/components_sizes_distro.png"
-    component_sizes = [len(component) for component in nx.connected_components(review_graph)]
-
-    plt.figure(figsize=(10, 6))
-    plt.hist(component_sizes, bins=30, color='skyblue', edgecolor='black')
-    plt.title("Rozkład rozmiarów składowych spójnych")
-    plt.xlabel("Rozmiar składowej")
-    plt.ylabel("Liczba składowych")
-    plt.grid(True)
-    plt.savefig(plot_filename)
-    plt.close()
+    _, labels = as_csr_graph(review_graph).connected_components()
+    component_sizes = np.bincount(labels)
+    plot_distribution(component_sizes, plot_filename, "Rozkład rozmiarów składowych spójnych",
+                      "Rozmiar składowej", "Liczba składowych", log=True, figsize=(10, 6))
 
 def plot_degree_distro(review_graph, output_dir="../output/plots"):
     '''
     Plot distribution of nodes degrees in graph
     Parameters:
-        review_graph (nx.Graph): given graph
+        review_graph (nx.Graph or CSRGraph): given graph
         output_dir (str): path to diretory where plot will be saved
     Returns:
         None
     '''
     os.makedirs(output_dir, exist_ok=True)
-    plot_filename = output_dir + "/degrees_distro.png"
-    degrees = [degree for _, degree in review_graph.degree()]
-    degree_counts = {degree: degrees.count(degree) for degree in set(degrees)}
-
-    sorted_degrees = sorted(degree_counts.keys())
-    sorted_counts = [degree_counts[degree] for degree in sorted_degrees]
-
-    plt.figure(figsize=(10, 6))
-    plt.plot(sorted_degrees, sorted_counts, marker='o', linestyle='-', label='Rozkład stopni wierzchołków')
-    plt.xlabel("Stopień wierzchołka")
-    plt.ylabel("Liczba wierzchołków")
-    plt.grid(True, which="both", linestyle='--', linewidth=0.5)
-    plt.savefig(plot_filename)
-    plt.close()
+    degrees = as_csr_graph(review_graph).degree()
+    plot_distribution(degrees, output_dir + "/degrees_distro.png", None, "Stopień wierzchołka", "Liczba wierzchołków",
+                      label='Rozkład stopni wierzchołków', figsize=(10, 6))
+    plot_distribution(degrees, output_dir + "/degrees_distro_log.png", None, "Stopień wierzchołka (log)", "Liczba wierzchołków (log)",
+                      label='Rozkład stopni wierzchołków', log=True, figsize=(10, 6))
 
-    plot_filename = output_dir + "/degrees_distro_log.png"
-    plt.figure(figsize=(10, 6))
-    plt.plot(sorted_degrees, sorted_counts, marker='o', linestyle='-', label='Rozkład stopni wierzchołków')
-    plt.xlabel("Stopień wierzchołka (log)")
-    plt.ylabel("Liczba wierzchołków (log)")
-    plt.yscale('log')
-    plt.xscale('log')
-    #plt.grid(True, which="both", linestyle='--', linewidth=0.5)
-    plt.savefig(plot_filename)
-    plt.close()
-
-def plot_statistics_community_sizes(review_graph, clusters, output_dir="../output/plots"):
+def plot_statistics_community_sizes(review_graph, clusters, output_dir="../output/plots", community_stats=None):
     '''
     Plot statistics of community sizes for each clustering algorithm using matplotlib.
-    Statistics are mean, standard deviation, variance, median and mode. Modularity is also plotted.
+    Statistics are mean, standard deviation, variance, median and mode. Modularity and mean conductance are also plotted.
     Parameters:
-        review_graph (nx.Graph): graph to analyze
-        clusters (dict): dictionary where keys are method names, values are partition results.
+        review_graph (nx.Graph or CSRGraph): graph to analyze
+        clusters (dict): dictionary where keys are method names, values are Partition objects or partition results.
         output_dir (str): directory to save plots
+        community_stats (dict): dictionary where keys are method names, values are results of community_statistics(),
+            calculated if None
     Returns:
         None
     '''
@@ -128,9 +130,11 @@ def plot_statistics_community_sizes(review_graph, clusters, output_dir="../outpu
     medians = {}
     modes = {}
     modularities = {}
+    conductances = {}
     for method, cluster in clusters.items():
-        communities = {c: [k for k, v in cluster.items() if v == c] for c in set(cluster.values())}
-        sizes = [len(community) for community in communities.values()]
+        partition = as_partition(cluster)
+        stats = community_stats[method] if community_stats else community_statistics(review_graph, partition)
+        sizes = partition.sizes.tolist()
         means[method] = np.mean(sizes)
         print(f"Method: {method}, mean: {means[method]}")
 
@@ -143,10 +147,14 @@ def plot_statistics_community_sizes(review_graph, clusters, output_dir="../outpu
         modes[method] = statistics.mode(sizes)
         print(f"Method: {method}, mode: {modes[method]}")
         
-        modularities[method] = calculate_modularity(review_graph, cluster)
+        modularities[method] = float(stats["modularity"].sum())
         print(f"Method: {method}, modularity: {modularities[method]}")
+
+        conductances[method] = np.mean(stats["conductance"])
+        print(f"Method: {method}, mean conductance: {conductances[method]}")
     
     plot_from_data(modularities, "Modularność klastrów", "Metoda", "Modularność", output_dir)
+    plot_from_data(conductances, "Średnia przewodność społeczności", "Metoda", "Przewodność", output_dir)
     plot_from_data(means, "Średnia wielkość społeczności", "Metoda", "Średnia", output_dir)
     plot_from_data(std_devs, "Odchylenie standardowe wielkości społeczności", "Metoda", "Odchylenie standardowe", output_dir)
     plot_from_data(medians, "Mediana wielkości społeczności", "Metoda", "Mediana", output_dir)
@@ -181,12 +189,14 @@ def plot_single_community(graph, clusters, output_dir="../output"):
     '''
     Plot single community for each clustering algorithm using matplotlib.
     Community is chosen as the one within a standard deviation of the mean size.
+    Positions of nodes are computed with sparse stress layout and cached, see layout.community_layout().
     Parameters:
-        graph (nx.Graph): graph to analyze
-        clusters (dict): dictionary where keys are method names, values are partition results.
+        graph (nx.Graph or CSRGraph): graph to analyze
+        clusters (dict): dictionary where keys are method names, values are Partition objects or partition results.
     Returns:
         None
     '''
+    graph = as_csr_graph(graph)
     for method, cluster in clusters.items():
         community = get_moderate_community(cluster)
         if community is None:
@@ -194,12 +204,12 @@ def plot_single_community(graph, clusters, output_dir="../output"):
             continue
         print(f"Moderate community of size {len(community)} found for method {method}")
         subgraph = graph.subgraph(community)
-        node_size = [3 * (1 + np.log(subgraph.degree[n])) for n in subgraph.nodes]
-        pos = nx.kamada_kawai_layout(subgraph)
+        node_size = 3 * (1 + np.log(np.maximum(subgraph.degree(), 1)))
+        positions = community_layout(subgraph)
         print("Drawing subgraph")
-        plt.figure(figsize=(15, 15))
-        nx.draw(subgraph, pos, with_labels=False, node_size=node_size, width=0.3)
-        
+        fig, ax = plt.subplots(figsize=(15, 15))
+        draw_graph(ax, subgraph, positions, node_size=node_size, width=0.3, node_color="#1f78b4")
+
         plt.title(f"Przykładowa społeczność {method}")
         plt.savefig(f"{output_dir}/{method}/single_community.png")
         plt.close()
@@ -210,8 +220,8 @@ def plot_clusters_categories(graph, clusters, db_path, output_dir ="../output/pl
     Finds average cluster for each method and random set of nodes
     plots distribution of categories with use of plot_data_distro()
     Parameters:
-        graph (nx.Graph): analysed graph
-        clusters (dict): dictionary containing clusters as values and name of method as key
+        graph (CSRGraph): analysed graph
+        clusters (dict): dictionary containing Partition objects or clusters as values and name of method as key
         output_dir (str): dictionary to store plots
     Returns:
         None
@@ -220,53 +230,61 @@ def plot_clusters_categories(graph, clusters, db_path, output_dir ="../output/pl
     iterations=0
     for method, cluster in clusters.items():
         iterations+=1
-        communities = {c: [k for k, v in cluster.items() if v == c] for c in set(cluster.values())}
-        sizes = [len(community) for community in communities.values()]
-        mean = np.mean(sizes)
-        std_dev = np.std(sizes)
-        moderate = get_moderate_community(cluster, std_dev+mean, mean+5*std_dev)
+        partition = as_partition(cluster)
+        mean = np.mean(partition.sizes)
+        std_dev = np.std(partition.sizes)
+        moderate = get_moderate_community(partition, std_dev+mean, mean+5*std_dev)
         if not moderate: 
             print("no moderate :(")
-            moderate = random.choice(communities)
+            moderate = random.choice(partition.members)
         size += len(moderate)
         title = "Rozkład kategorii w społeczności " + method
         plot_data_distro(moderate, 'categories', 'Kategoria', 'Liczba produktów', title, db_path, output_dir)
     size //= iterations
 
-    random_nodes = random.sample(list(graph.nodes), size)
+    random_nodes = random.sample(graph.ids.tolist(), size)
     title = "Rozkład w losowej społeczności"
     plot_data_distro(random_nodes, 'categories', 'Kategoria', 'Liczba produktów', title, db_path, output_dir)
 
 def plot_data_distro(community, data, xlab, ylab, title, db_path = "../data/metadata.db", output_dir = "../output/plots/"):
     '''
-    Plots distribution of given metadata in given cluster
+    Plots distribution of given metadata in given cluster and saves counts to CSV file next to plot
+    with histogram.save_csv(), so plot can be drawn again from CSV file only.
     Parameters:
         community (list): list of nodes IDs 
         data (str): data to fetch from metadata
         xlab (str): label for x axis
         ylab (str): label for y axis
         title (str): title for plot
+        db_path (str): path to metadata database
         output_dir (str): directory to save plot
     Returns:
-        None
+        values (list): distinct values, most common first
+        counts (list): number of products with every value
     '''
-    metadata = [
-        database.get_metadata(node_id, db_path).get(data)
-        for node_id in community
-    ]
-    flatten = list(chain.from_iterable(metadata))
-    category_counts = Counter(flatten)
+    client = database.get_client(db_path)
+    if data == 'categories':
+        category_counts = Counter(client.category_counts(community))
+    else:
+        metadata = [
+            product_metadata.get(data)
+            for product_metadata in client.get_many(community).values()
+        ]
+        flatten = list(chain.from_iterable(metadata))
+        category_counts = Counter(flatten)
     category_counts.pop('Books', None)
+    values, counts = zip(*category_counts.most_common()) if category_counts else ((), ())
+    plot_path = output_dir + title.replace(" ", "_")
+    save_csv(plot_path + ".csv", {"value": values, "count": counts})
 
-    plt.bar(category_counts.keys(), category_counts.values(), color='skyblue')
+    plt.bar(values, counts, color='skyblue')
     plt.title(title)
     plt.xlabel(xlab)
     plt.ylabel(ylab)
     plt.tight_layout()
-    plot_path = output_dir + title.replace(" ", "_")
     plt.gca().set_xticklabels([])
     plt.savefig(plot_path)
     plt.close()
     print(f"Saved plot in {plot_path}")
-    
+    return list(values), list(counts)
 
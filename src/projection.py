@@ -0,0 +1,180 @@
+import networkx as nx
+import numpy as np
+import scipy.sparse as sp
+from graph_store import CSRGraph
+
+def bipartite_incidence(bipartite_graph):
+    '''
+    Build user x product incidence matrix of bipartite graph.
+    Sides of graph are recognised by "bipartite" node attribute, 0 for users and 1 for products.
+    Parameters:
+        bipartite_graph (nx.Graph): bipartite graph of users connected to products they reviewed
+    Returns:
+        incidence (sp.csr_array): matrix with 1 in row of user and column of product they reviewed
+        users (list): user IDs in order of rows
+        products (list): product IDs in order of columns
+    '''
+    sides = nx.get_node_attributes(bipartite_graph, "bipartite")
+    users = [node for node, side in sides.items() if side == 0]
+    products = [node for node, side in sides.items() if side == 1]
+    user_index = {user: i for i, user in enumerate(users)}
+    product_index = {product: i for i, product in enumerate(products)}
+    rows = np.empty(bipartite_graph.number_of_edges(), dtype=np.int64)
+    cols = np.empty(bipartite_graph.number_of_edges(), dtype=np.int64)
+    for i, (a, b) in enumerate(bipartite_graph.edges()):
+        if sides.get(a) == 1:
+            a, b = b, a
+        rows[i] = user_index[a]
+        cols[i] = product_index[b]
+    incidence = sp.csr_array((np.ones(len(rows), dtype=np.int32), (rows, cols)), shape=(len(users), len(products)))
+    return incidence, users, products
+
+def table_incidence(table):
+    '''
+    Build user x product incidence matrix directly from ReviewTable.
+    Parameters:
+        table (ReviewTable): table of reviews
+    Returns:
+        incidence (sp.csr_array): matrix with 1 in row of user and column of product they reviewed
+        users (list): user IDs in order of rows
+        products (list): product IDs in order of columns
+    '''
+    users, products = table.edges()
+    incidence = sp.csr_array((np.ones(len(users), dtype=np.int32), (users, products)),
+                             shape=(len(table.user_ids), len(table.product_ids)))
+    return incidence, table.user_ids, table.product_ids
+
+PROJECTION_MODES = ("full", "cap_drop", "cap_sample", "newman", "percentile")
+
+def clique_edges(degrees):
+    '''
+    Count pairs of products contributed to projection by users of given degrees.
+    Parameters:
+        degrees (np.ndarray): number of products reviewed by each user
+    Returns:
+        count (int): sum of deg*(deg-1)/2 over users
+    '''
+    degrees = np.asarray(degrees, dtype=np.int64)
+    return int(np.sum(degrees * (degrees - 1) // 2))
+
+def _degree_percentile(degrees, percentile):
+    '''
+    Percentile of degrees of users who reviewed any product, empty rows of filtered users are not counted.
+    '''
+    degrees = degrees[degrees > 0]
+    return np.percentile(degrees, percentile) if len(degrees) else 0
+
+def limit_heavy_users(incidence, mode="full", max_degree=1000, percentile=99.9, seed=None):
+    '''
+    Limit contribution of users who reviewed very many products before projecting incidence matrix.
+    Modes:
+        full - incidence is not changed
+        cap_drop - users with more than max_degree products are dropped
+        cap_sample - users with more than max_degree products keep random sample of max_degree products
+        newman - every pair contributed by user is weighted by 1/(deg-1)
+        percentile - users with degree above given percentile of degrees of users with any product are dropped
+    Parameters:
+        incidence (sp.csr_array): user x product incidence matrix
+        mode (str): one of PROJECTION_MODES
+        max_degree (int): maximal user degree for cap_drop and cap_sample modes
+        percentile (float): percentile of user degrees for percentile mode
+        seed (int): seed of random generator for cap_sample mode
+    Returns:
+        incidence (sp.csr_array): limited incidence matrix
+        user_weights (np.ndarray): weight of every user for newman mode, None for other modes
+    '''
+    if mode not in PROJECTION_MODES:
+        raise ValueError(f"Unknown projection mode {mode}, expected one of {PROJECTION_MODES}")
+    degrees = np.diff(incidence.indptr)
+    if mode == "full":
+        return incidence, None
+    if mode == "newman":
+        user_weights = np.zeros(len(degrees), dtype=np.float64)
+        np.divide(1.0, degrees - 1, out=user_weights, where=degrees > 1)
+        return incidence, user_weights
+    if mode == "cap_sample":
+        keep = np.ones(incidence.nnz, dtype=bool)
+        rng = np.random.default_rng(seed)
+        for user in np.flatnonzero(degrees > max_degree):
+            start, end = incidence.indptr[user], incidence.indptr[user + 1]
+            keep[start:end] = False
+            keep[start + rng.choice(end - start, max_degree, replace=False)] = True
+    else:
+        threshold = max_degree if mode == "cap_drop" else _degree_percentile(degrees, percentile)
+        keep = np.repeat(degrees <= threshold, degrees)
+    limited = incidence.copy()
+    limited.data = limited.data * keep
+    limited.eliminate_zeros()
+    return limited, None
+
+def projection_savings(incidence, max_degree=1000, percentile=99.9):
+    '''
+    Count product pairs contributed to projection by users in every projection mode.
+    Pairs are counted before merging, so this is the amount of work done by the projection.
+    Parameters:
+        incidence (sp.csr_array): user x product incidence matrix
+        max_degree (int): maximal user degree for cap_drop and cap_sample modes
+        percentile (float): percentile of user degrees for percentile mode
+    Returns:
+        savings (dict): dictionary where keys are modes, values are numbers of pairs saved compared to full projection
+    '''
+    degrees = np.diff(incidence.indptr)
+    full = clique_edges(degrees)
+    threshold = _degree_percentile(degrees, percentile)
+    savings = {
+        "full": 0,
+        "cap_drop": full - clique_edges(degrees[degrees <= max_degree]),
+        "cap_sample": full - clique_edges(np.minimum(degrees, max_degree)),
+        "newman": 0,
+        "percentile": full - clique_edges(degrees[degrees <= threshold]),
+    }
+    for mode, saved in savings.items():
+        print(f"Projection mode {mode}: {full - saved} pairs, {saved} saved ({saved / max(full, 1) * 100:.2f}%)")
+    return savings
+
+def project_incidence(incidence, user_weights=None):
+    '''
+    Calculate weighted product projection of incidence matrix with sparse product.
+    Weight of pair of products is number of users who reviewed both of them,
+    or sum of weights of these users if user_weights are given.
+    Parameters:
+        incidence (sp.csr_array): user x product incidence matrix
+        user_weights (np.ndarray): weight of every user, None for unweighted count
+    Returns:
+        projection (sp.csr_array): symmetric product x product matrix of weights with empty diagonal
+    '''
+    weighted = incidence if user_weights is None else sp.diags_array(user_weights) @ incidence
+    projection = (incidence.T @ weighted).tocsr()
+    projection.setdiag(0)
+    projection.eliminate_zeros()
+    return projection
+
+def projection_to_csr(projection, products):
+    '''
+    Convert projection matrix to CSRGraph without building nx.Graph.
+    Products without any co-reviewed product are not included, same as in projection_to_graph().
+    Parameters:
+        projection (sp.csr_array): symmetric product x product matrix of weights
+        products (list): product IDs in order of rows
+    Returns:
+        product_graph (CSRGraph): product projection graph
+    '''
+    connected = np.flatnonzero(np.diff(projection.indptr) > 0)
+    return CSRGraph.from_scipy(projection[connected][:, connected], np.asarray(products, dtype=str)[connected])
+
+def projection_to_graph(projection, products):
+    '''
+    Convert projection matrix to weighted graph.
+    Products without any co-reviewed product are not included, same as in edge-by-edge projection.
+    Parameters:
+        projection (sp.csr_array): symmetric product x product matrix of weights
+        products (list): product IDs in order of rows
+    Returns:
+        product_graph (nx.Graph): product projection graph
+    '''
+    upper = sp.triu(projection, k=1).tocoo()
+    product_graph = nx.Graph()
+    product_graph.add_weighted_edges_from(
+        (products[i], products[j], w) for i, j, w in zip(upper.row.tolist(), upper.col.tolist(), upper.data.tolist())
+    )
+    return product_graph
@@ -1,17 +1,20 @@
-from textblob import TextBlob
 from datetime import datetime
 
 class Review:
     '''
     Class representing a single review.
+    Sentiment is not computed on construction, it is obtained from TextBlob on first access
+    or assigned in bulk by sentiment.score_sentiments().
     Parameters:
         user_id (str): user id
         product_id (str): product id
-        date (str): date of review
+        date (str): date of review as unix timestamp, kept as timestamp (int) and date (datetime)
         score (float): score of review
         text (str): text of review
         sentiment (float): sentiment of review obtained from TextBlob
     '''
+    __slots__ = ("user_id", "product_id", "timestamp", "date", "score", "text", "_sentiment")
+
     def __init__(self, user_id, product_id, date, score, text):
         if not user_id or not isinstance(user_id, str):
             raise ValueError(f"Faulty user id {user_id}")
@@ -21,14 +24,33 @@ class Review:
         self.product_id = product_id
         if not date:
             raise ValueError(f"Faulty date {date}")
-        self.date = datetime.utcfromtimestamp(int(date))
+        self.timestamp = int(date)
+        self.date = datetime.utcfromtimestamp(self.timestamp)
         if not score:
             raise ValueError(f"Faulty score {score}")
         self.score = float(score)
         if not isinstance(text, str):
             raise ValueError(f"Faukty text {text}")
-        self.sentiment = TextBlob(text).sentiment.polarity
+        self._sentiment = None
         self.text = text
 
+    @property
+    def key(self):
+        '''
+        Identifier of review used as a key of sentiment cache.
+        '''
+        return f"{self.user_id}:{self.product_id}:{self.timestamp}"
+
+    @property
+    def sentiment(self):
+        if self._sentiment is None:
+            from sentiment import polarity
+            self._sentiment = polarity(self.text)
+        return self._sentiment
+
+    @sentiment.setter
+    def sentiment(self, value):
+        self._sentiment = value
+
     def __repr__(self):
-        return f"Review(user={self.user_id}, product={self.product_id}, date={self.date}, score={self.score}, sentiment={self.sentiment})"
\ No newline at end of file
+        return f"Review(user={self.user_id}, product={self.product_id}, date={self.date}, score={self.score}, sentiment={self._sentiment})"
@@ -0,0 +1,138 @@
+import json
+from array import array
+import numpy as np
+
+class ReviewTable:
+    '''
+    Columnar table of reviews.
+    User and product IDs are dictionary-encoded as integers, other fields are kept in NumPy arrays.
+    Review texts are not kept in memory, they are read from source file on demand.
+    Parameters:
+        user_ids (list): list of user IDs, index in list is integer code of user
+        product_ids (list): list of product IDs, index in list is integer code of product
+        users (np.ndarray): user code of every review
+        products (np.ndarray): product code of every review
+        timestamps (np.ndarray): unix timestamp of every review in seconds
+        ratings (np.ndarray): rating of every review
+        sentiment (np.ndarray): sentiment polarity of every review, NaN if not scored
+        offsets (np.ndarray): byte offset of review line in source file, -1 if unknown
+        source (str): path to JSON file with reviews
+    '''
+    def __init__(self, user_ids, product_ids, users, products, timestamps, ratings, sentiment, offsets, source=None):
+        self.user_ids = user_ids
+        self.product_ids = product_ids
+        self.users = users
+        self.products = products
+        self.timestamps = timestamps
+        self.ratings = ratings
+        self.sentiment = sentiment
+        self.offsets = offsets
+        self.source = source
+
+    def __len__(self):
+        return len(self.users)
+
+    def __repr__(self):
+        return f"ReviewTable(reviews={len(self)}, users={len(self.user_ids)}, products={len(self.product_ids)})"
+
+    def edges(self):
+        '''
+        Get distinct user-product pairs, repeated reviews of the same product by the same user are merged.
+        Returns:
+            users (np.ndarray): user codes of pairs
+            products (np.ndarray): product codes of pairs
+        '''
+        pairs = np.unique(self.users.astype(np.int64) * len(self.product_ids) + self.products)
+        return (pairs // len(self.product_ids)).astype(np.int32), (pairs % len(self.product_ids)).astype(np.int32)
+
+    def text(self, index):
+        '''
+        Read text of review from source file.
+        Parameters:
+            index (int): row of review in table
+        Returns:
+            text (str): text of review
+        '''
+        if self.source is None or self.offsets[index] < 0:
+            raise ValueError(f"Text of review {index} is not available")
+        with open(self.source, 'rb') as f:
+            f.seek(int(self.offsets[index]))
+            return json.loads(f.readline())["text"]
+
+    def save(self, filename):
+        '''
+        Save table to .npz file.
+        Parameters:
+            filename (str): path to file
+        Returns:
+            None
+        '''
+        np.savez(filename, user_ids=np.array(self.user_ids), product_ids=np.array(self.product_ids),
+                 users=self.users, products=self.products, timestamps=self.timestamps, ratings=self.ratings,
+                 sentiment=self.sentiment, offsets=self.offsets, source=np.array(self.source or ""))
+
+    @classmethod
+    def load(cls, filename):
+        '''
+        Load table saved with save().
+        Parameters:
+            filename (str): path to .npz file
+        Returns:
+            table (ReviewTable): loaded table
+        '''
+        with np.load(filename) as data:
+            return cls(data["user_ids"].tolist(), data["product_ids"].tolist(), data["users"], data["products"],
+                       data["timestamps"], data["ratings"], data["sentiment"], data["offsets"],
+                       str(data["source"]) or None)
+
+class ReviewTableBuilder:
+    '''
+    Incrementally builds ReviewTable from Review objects.
+    Columns are accumulated in compact typed arrays, Review objects are not kept.
+    Parameters:
+        source (str): path to JSON file reviews come from
+    '''
+    def __init__(self, source=None):
+        self.source = source
+        self.user_codes = {}
+        self.product_codes = {}
+        self.users = array('i')
+        self.products = array('i')
+        self.timestamps = array('q')
+        self.ratings = array('f')
+        self.sentiment = array('f')
+        self.offsets = array('q')
+
+    def append(self, review, offset=-1):
+        '''
+        Append review to table.
+        Parameters:
+            review (Review): review to append
+            offset (int): byte offset of review line in source file
+        Returns:
+            None
+        '''
+        self.users.append(self.user_codes.setdefault(review.user_id, len(self.user_codes)))
+        self.products.append(self.product_codes.setdefault(review.product_id, len(self.product_codes)))
+        self.timestamps.append(review.timestamp)
+        self.ratings.append(review.score)
+        self.sentiment.append(np.nan if review._sentiment is None else review._sentiment)
+        self.offsets.append(offset)
+
+    def build(self):
+        '''
+        Build ReviewTable from appended reviews.
+        Returns:
+            table (ReviewTable): table of reviews
+        '''
+        return ReviewTable(
+            user_ids=list(self.user_codes),
+            product_ids=list(self.product_codes),
+            users=np.frombuffer(self.users, dtype=np.int32),
+            products=np.frombuffer(self.products, dtype=np.int32),
+            timestamps=np.frombuffer(self.timestamps, dtype=np.int64),
+            ratings=np.frombuffer(self.ratings, dtype=np.float32),
+            sentiment=np.frombuffer(self.sentiment, dtype=np.float32),
+            offsets=np.frombuffer(self.offsets, dtype=np.int64),
+            source=self.source
+        )
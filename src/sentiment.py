@@ -0,0 +1,116 @@
+import os
+import sqlite3
+from itertools import islice
+from multiprocessing import Pool
+
+def polarity(text):
+    '''
+    Calculate sentiment polarity of text with TextBlob.
+    TextBlob is imported here, so it is needed only when sentiment is actually requested.
+    Parameters:
+        text (str): text to analyze
+    Returns:
+        polarity (float): polarity in range [-1, 1]
+    '''
+    from textblob import TextBlob
+    return TextBlob(text).sentiment.polarity
+
+def _polarity_batch(texts):
+    '''
+    Calculate polarity of every text in batch. Runs in worker process.
+    Parameters:
+        texts (list): list of texts
+    Returns:
+        polarities (list): list of polarities in the same order
+    '''
+    return [polarity(text) for text in texts]
+
+class SentimentCache:
+    '''
+    On-disk cache of sentiment polarities stored in SQLite, keyed by Review.key.
+    Parameters:
+        cache_path (str): path to SQLite file with cache
+    '''
+    def __init__(self, cache_path):
+        directory = os.path.dirname(cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(cache_path)
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS sentiment (
+                                key TEXT PRIMARY KEY,
+                                polarity REAL
+                            )''')
+
+    def get_many(self, keys, chunk_size=900):
+        '''
+        Get cached polarities of given keys.
+        Parameters:
+            keys (list): list of review keys
+            chunk_size (int): maximal number of parameters in one query
+        Returns:
+            found (dict): dictionary where keys are review keys, values are cached polarities
+        '''
+        found = {}
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(f'SELECT key, polarity FROM sentiment WHERE key IN ({placeholders})', chunk)
+            found.update(rows)
+        return found
+
+    def put_many(self, items):
+        '''
+        Store polarities in cache.
+        Parameters:
+            items (list): list of tuples (review key, polarity)
+        Returns:
+            None
+        '''
+        self.conn.executemany('INSERT OR REPLACE INTO sentiment (key, polarity) VALUES (?, ?)', items)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+def score_sentiments(reviews, cache_path="../data/sentiment.db", processes=None, batch_size=10000, chunk_size=500):
+    '''
+    Assign sentiment to reviews as a separate, batched stage.
+    Reviews are read in batches, polarities already present in on-disk cache are reused and
+    the rest are calculated in a process pool and stored in cache.
+    Reviews are yielded back in input order, so this stage can be chained with iter_reviews().
+    Parameters:
+        reviews (iterable): iterable of Review objects
+        cache_path (str): path to SQLite file with sentiment cache
+        processes (int): number of worker processes, defaults to number of CPUs
+        batch_size (int): number of reviews read at once
+        chunk_size (int): number of texts sent to a worker in one task
+    Yields:
+        review (Review): review with sentiment assigned
+    '''
+    cache = SentimentCache(cache_path)
+    reviews = iter(reviews)
+    scored = 0
+    cached = 0
+    try:
+        with Pool(processes) as pool:
+            while True:
+                batch = list(islice(reviews, batch_size))
+                if not batch:
+                    break
+                known = cache.get_many([review.key for review in batch])
+                missing = [review for review in batch if review.key not in known]
+                texts = [review.text for review in missing]
+                chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+                polarities = [value for chunk in pool.map(_polarity_batch, chunks) for value in chunk]
+                cache.put_many([(review.key, value) for review, value in zip(missing, polarities)])
+                for review, value in zip(missing, polarities):
+                    review.sentiment = value
+                for review in batch:
+                    if review.key in known:
+                        review.sentiment = known[review.key]
+                scored += len(missing)
+                cached += len(batch) - len(missing)
+                yield from batch
+    finally:
+        cache.close()
+    print(f"Sentiment scored for {scored} reviews, {cached} taken from cache.")
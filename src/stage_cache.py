@@ -0,0 +1,212 @@
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import shutil
+import time
+
+def file_hash(path, cache_file=None, chunk_size=1 << 24):
+    '''
+    Calculate SHA-256 hash of file content.
+    Hashes of big input files are remembered in cache_file by path, size and modification time,
+    so unchanged files are not read again.
+    Parameters:
+        path (str): path to file
+        cache_file (str): path to JSON file with remembered hashes, None to always hash
+        chunk_size (int): number of bytes read at once
+    Returns:
+        digest (str): hex digest of file content
+    '''
+    stat = os.stat(path)
+    signature = f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    known = {}
+    if cache_file and os.path.exists(cache_file):
+        with open(cache_file, 'r') as f:
+            known = json.load(f)
+        if signature in known:
+            return known[signature]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    digest = digest.hexdigest()
+    if cache_file:
+        known[signature] = digest
+        os.makedirs(os.path.dirname(cache_file) or ".", exist_ok=True)
+        with open(cache_file, 'w') as f:
+            json.dump(known, f)
+    return digest
+
+def code_version(*modules):
+    '''
+    Calculate version of code as hash of source files of given modules.
+    Parameters:
+        modules (module): modules implementing a stage
+    Returns:
+        version (str): hex digest of sources
+    '''
+    digest = hashlib.sha256()
+    for module in modules:
+        with open(inspect.getfile(module), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def save_pickle(value, path):
+    with open(os.path.join(path, "value.pkl"), 'wb') as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+def load_pickle(path):
+    with open(os.path.join(path, "value.pkl"), 'rb') as f:
+        return pickle.load(f)
+
+class StageResult:
+    '''
+    Result of a pipeline stage, value is loaded from cache or computed on first access.
+    Parameters:
+        cache (StageCache): cache holding the stage
+        name (str): name of stage
+        key (str): content address of stage result
+        compute (callable): function without arguments computing value
+        save (callable): function saving value to directory, save(value, path)
+        load (callable): function loading value from directory, load(path)
+    '''
+    def __init__(self, cache, name, key, compute, save, load):
+        self.cache = cache
+        self.name = name
+        self.key = key
+        self.compute = compute
+        self.save = save
+        self.load = load
+        self._value = None
+        self._ready = False
+
+    @property
+    def path(self):
+        return self.cache.entry_path(self.name, self.key)
+
+    @property
+    def cached(self):
+        return os.path.exists(os.path.join(self.cache.entry_path(self.name, self.key), "meta.json"))
+
+    @property
+    def value(self):
+        if not self._ready:
+            self._value = self.cache.get_or_compute(self)
+            self._ready = True
+        return self._value
+
+class StageCache:
+    '''
+    Content-addressed cache of pipeline stages.
+    Key of every stage combines keys or hashes of its inputs, its parameters and version of its code,
+    so a stage is recomputed only when something it depends on has changed.
+    Entries not used for longer than max_age_days are evicted, then least recently used entries
+    are evicted until total size is below max_bytes.
+    Parameters:
+        cache_dir (str): directory with cache entries
+        max_age_days (float): maximal time since last use of entry
+        max_bytes (int): maximal total size of cache
+    '''
+    def __init__(self, cache_dir="../data/cache", max_age_days=30, max_bytes=100 * 1024**3):
+        self.cache_dir = cache_dir
+        self.max_age = max_age_days * 24 * 3600
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self.evict()
+
+    def file_hash(self, path):
+        '''
+        Hash of input file, remembered in cache directory, see file_hash().
+        '''
+        return file_hash(path, os.path.join(self.cache_dir, "file_hashes.json"))
+
+    def key(self, name, inputs=(), params=None, modules=()):
+        '''
+        Calculate content address of stage.
+        Parameters:
+            name (str): name of stage
+            inputs (list): keys of upstream stages or hashes of input files
+            params (dict): parameters of stage, must be JSON serializable
+            modules (list): modules implementing stage
+        Returns:
+            key (str): hex digest
+        '''
+        description = json.dumps({"stage": name, "inputs": list(inputs), "params": params or {},
+                                  "code": code_version(*modules)}, sort_keys=True)
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def entry_path(self, name, key):
+        return os.path.join(self.cache_dir, f"{name}-{key[:20]}")
+
+    def stage(self, name, compute, inputs=(), params=None, modules=(), save=save_pickle, load=load_pickle):
+        '''
+        Declare pipeline stage. Nothing is computed until value of returned result is accessed.
+        Parameters:
+            name (str): name of stage
+            compute (callable): function without arguments computing value
+            inputs (list): keys of upstream stages or hashes of input files
+            params (dict): parameters of stage, must be JSON serializable
+            modules (list): modules implementing stage
+            save (callable): function saving value to directory, save(value, path)
+            load (callable): function loading value from directory, load(path)
+        Returns:
+            result (StageResult): lazy result of stage
+        '''
+        return StageResult(self, name, self.key(name, inputs, params, modules), compute, save, load)
+
+    def get_or_compute(self, result):
+        '''
+        Load value of stage from cache, or compute and store it.
+        Parameters:
+            result (StageResult): stage to evaluate
+        Returns:
+            value: value of stage
+        '''
+        path = self.entry_path(result.name, result.key)
+        meta = os.path.join(path, "meta.json")
+        if os.path.exists(meta):
+            print(f"Stage {result.name} loaded from cache {path}")
+            os.utime(meta)
+            return result.load(path)
+        print(f"Computing stage {result.name}...")
+        start = time.time()
+        value = result.compute()
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        result.save(value, path)
+        with open(meta, 'w') as f:
+            json.dump({"stage": result.name, "key": result.key, "seconds": time.time() - start}, f)
+        print(f"Stage {result.name} computed in {time.time() - start:.1f}s and cached in {path}")
+        return value
+
+    def evict(self):
+        '''
+        Remove cache entries that are too old, then least recently used entries until cache fits in max_bytes.
+        Returns:
+            removed (int): number of removed entries
+        '''
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            meta = os.path.join(path, "meta.json")
+            if not os.path.isdir(path):
+                continue
+            if not os.path.exists(meta):
+                shutil.rmtree(path, ignore_errors=True)
+                continue
+            size = sum(os.path.getsize(os.path.join(root, file)) for root, _, files in os.walk(path) for file in files)
+            entries.append((os.path.getmtime(meta), size, path))
+        entries.sort()
+        now = time.time()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for used, size, path in entries:
+            if now - used <= self.max_age and total <= self.max_bytes:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            removed += 1
+        if removed:
+            print(f"Evicted {removed} stale entries from {self.cache_dir}")
+        return removed
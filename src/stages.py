@@ -0,0 +1,71 @@
+'''
+Compute, save and load functions of cached stages of main.py.
+They are kept out of main.py, so that this module can be listed in modules of stages and changing them invalidates cache.
+'''
+import os
+import numpy as np
+import scipy.sparse as sp
+from data_processing import filter_bipartite_arrays
+from projection import limit_heavy_users, project_incidence, projection_savings
+from review_table import ReviewTable
+
+def save_arrays(arrays, path):
+    np.savez(os.path.join(path, "arrays.npz"), *arrays)
+
+def load_arrays(path):
+    with np.load(os.path.join(path, "arrays.npz")) as data:
+        return tuple(data[f"arr_{i}"] for i in range(len(data.files)))
+
+def save_table(table, path):
+    table.save(os.path.join(path, "table.npz"))
+
+def load_table(path):
+    return ReviewTable.load(os.path.join(path, "table.npz"))
+
+def save_projection(value, path):
+    matrix, products = value
+    sp.save_npz(os.path.join(path, "projection.npz"), sp.csr_matrix(matrix))
+    np.save(os.path.join(path, "products.npy"), np.array(products, dtype=str))
+
+def load_projection(path):
+    return sp.csr_array(sp.load_npz(os.path.join(path, "projection.npz"))), np.load(os.path.join(path, "products.npy")).tolist()
+
+def bipartite_arrays(table):
+    '''
+    Distinct edges of bipartite graph of table of reviews.
+    Parameters:
+        table (ReviewTable): table of reviews
+    Returns:
+        arrays (tuple): user IDs, product IDs, user index and product index of every edge
+    '''
+    return (np.array(table.user_ids, dtype=str), np.array(table.product_ids, dtype=str), *table.edges())
+
+def filter_arrays(bipartite, min_reviews):
+    '''
+    Filter bipartite graph with filter_bipartite_arrays().
+    Parameters:
+        bipartite (tuple): result of bipartite_arrays()
+        min_reviews (int): minimal degree of products to keep
+    Returns:
+        kept_users (np.ndarray): boolean mask of users that passed filtering
+        kept_products (np.ndarray): boolean mask of products that passed filtering
+    '''
+    user_ids, product_ids, users, products = bipartite
+    return filter_bipartite_arrays(users, products, len(user_ids), len(product_ids), min_reviews)
+
+def build_projection(bipartite, filtered, mode, max_degree, percentile, seed):
+    '''
+    Project filtered bipartite graph, see projection.limit_heavy_users() for parameters.
+    Parameters:
+        bipartite (tuple): result of bipartite_arrays()
+        filtered (tuple): result of filter_arrays()
+    Returns:
+        projection (sp.csr_array): product x product matrix of weights
+        products (list): product IDs in order of rows
+    '''
+    user_ids, product_ids, users, products = bipartite
+    kept_users, kept_products = filtered
+    kept = kept_users[users] & kept_products[products]
+    incidence = sp.csr_array((np.ones(int(kept.sum()), dtype=np.int32), (users[kept], products[kept])), shape=(len(user_ids), len(product_ids)))
+    projection_savings(incidence, max_degree, percentile)
+    return project_incidence(*limit_heavy_users(incidence, mode, max_degree, percentile, seed)), product_ids.tolist()
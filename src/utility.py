@@ -1,10 +1,15 @@
-from clustering import calculate_density, analyze_centrality
+from clustering import community_statistics
+from centrality import analyze_centrality
+from partition import Partition, as_partition
+from graph_store import as_csr_graph
+import io
 import os
 import database
 import random
 import sqlite3
 import networkx as nx
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 
 
 ##########################################################
@@ -26,47 +31,31 @@ def jaccard_similarity(set1, set2):
         return 1
     return len(intersection_of_sets) / len(union_of_sets)
 
-def normalize_clusters(cluster):
-    '''
-    Normalize cluster dictionary, starting dictionary has nodes as keys and communities as values
-    Returns dictionary where keys are communities identifiers, values are lists of nodes in that community.
-    Parameters:
-        cluster (dict): dictionary where keys are nodes, values are community assignments
-    Returns:
-        normalized_cluster (dict): dictionary where keys are community identifiers, values are lists of nodes in that community
-    Examples:
-        cluster = {1: 0, 2: 0, 3: 1, 4: 1}
-        normalize_clusters(cluster) -> {0: [1, 2], 1: [3, 4]}
-    '''
-    return {c: [k for k, v in cluster.items() if v == c] for c in set(cluster.values())}
-
-def find_dense(G, clusters, num_communities=10):
+def find_dense(G, clusters, num_communities=10, community_stats=None):
     '''
     Find densest communities for each method in clusters dictionary.
     Parameters:
-        G (nx.Graph): graph to analyze
-        clusters (dict): dictionary where keys are method names, values are partition results.
+        G (nx.Graph or CSRGraph): graph to analyze
+        clusters (dict): dictionary where keys are method names, values are Partition objects or partition results.
         num_communities (int): number of densest communities to return
+        community_stats (dict): dictionary where keys are method names, values are results of community_statistics(),
+            calculated if None
     Returns:
         densest_communities (dict): dictionary where keys are method names, values are communities
     '''
     densest_communities = {}
     for method, cluster in clusters.items():
-        communities = normalize_clusters(cluster)
-        
-        community_densities = []
-        for idx, community in communities.items():
-            density = calculate_density(G, community)
-            community_densities.append((community, density))
-        
-        densest_communities[method] = [community for community, _ in sorted(community_densities, key=lambda x: x[1], reverse=True)[:num_communities]]
+        partition = as_partition(cluster)
+        stats = community_stats[method] if community_stats else community_statistics(G, partition)
+        densest = np.argsort(-stats["density"], kind="stable")[:num_communities]
+        densest_communities[method] = [partition.members[c] for c in densest]
     return densest_communities
         
 def find_largest(clusters, num_communities=10):
     '''
     Find largest, medium and smallest communities for each method in clusters dictionary.
     Parameters:
-        clusters (dict): dictionary where keys are method names, values are partition results.
+        clusters (dict): dictionary where keys are method names, values are Partition objects or partition results.
         num_communities (int): number of communities to return
     Returns:
         largest_communities (dict): dictionary where keys are method names, values are lists of largest communities
@@ -77,13 +66,8 @@ def find_largest(clusters, num_communities=10):
     smallest_communities = {}
     medium_communities = {}
     for method, cluster in clusters.items():
-        communities = normalize_clusters(cluster)
-        
-        community_sizes = []
-        for idx, community in communities.items():
-            community_sizes.append(community)
-
-        sorted_by_size = sorted(community_sizes, key=lambda x: len(x))
+        partition = as_partition(cluster)
+        sorted_by_size = [partition.members[c] for c in partition.by_size]
         
         largest_communities[method] = sorted_by_size[-num_communities:]
         smallest_communities[method] = sorted_by_size[:num_communities]
@@ -94,15 +78,14 @@ def find_random(clusters, num_communities=10):
     '''
     Find random communities for each method in clusters dictionary.
     Parameters:
-        clusters (dict): dictionary where keys are method names, values are partition results.
+        clusters (dict): dictionary where keys are method names, values are Partition objects or partition results.
         num_communities (int): number of communities to return
     Returns:
         random_communities (dict): dictionary where keys are method names, values are lists of random communities
     '''
     random_communities = {}
     for method, cluster in clusters.items():
-        communities = normalize_clusters(cluster)
-        community_list = list(communities.values())
+        community_list = as_partition(cluster).members
         random_communities[method] = random.sample(community_list, min(num_communities, len(community_list)))
     return random_communities
 
@@ -111,25 +94,18 @@ def get_moderate_community(cluster, min_size=50, max_size=500):
     Get moderate community from cluster.
     Looks for communities with size good for representation
     Parameters:
-        cluster (dict): dictionary where keys are nodes, values are community assignments   
+        cluster (Partition or dict): partition or dictionary where keys are nodes, values are community assignments   
+        min_size (float): community has to be bigger than min_size
+        max_size (float): community has to be smaller than max_size
     Returns:
-        community (list): list of nodes in community
+        community (list): list of nodes in community, None if there is no community of such size
     '''
-    communities = normalize_clusters(cluster)
-    #print(communities)
-    #sizes = [len(community) for community in communities.values()]
-    # mean_size = np.mean(sizes)
-    # std_dev = np.std(sizes)
-    # biggest_yet = 0
-    # index = 0
-    # for idx, community in communities.items():
-    #     if len(community) > min_size and len(community) < max_size:
-    #         return community
-    #return None
-    return next(
-        filter(lambda community: print(f"Checking community: if {min_size}<{len(community)}<{max_size} ") or min_size < len(community) < max_size, communities.values()),
-        None
-    )
+    partition = as_partition(cluster)
+    candidates = np.flatnonzero((partition.sizes > min_size) & (partition.sizes < max_size))
+    print(f"Checking communities: {len(candidates)} of {len(partition)} with {min_size}<size<{max_size}")
+    if len(candidates) == 0:
+        return None
+    return partition.members[candidates[0]]
 
 
 
@@ -137,6 +113,80 @@ def get_moderate_community(cluster, min_size=50, max_size=500):
 ##########################################################
 ## Helper functions - printing or saving data
 ##########################################################
+def render_community(community, metadata, db_path, error=None):
+    '''
+    Render product metadata of community as text of community file.
+    Parameters:
+        community (list): list of product IDs
+        metadata (dict): dictionary where keys are product IDs, values are their metadata or None
+        db_path (str): path to SQLite database, used in messages
+        error (sqlite3.Error): error of fetching metadata, written for every product if not None
+    Returns:
+        text (str): text of community file
+    '''
+    buffer = io.StringIO()
+    buffer.write(f"Size: {len(community)}\n\n")
+    for product_id in community:
+        product_metadata = metadata.get(product_id)
+        if error is not None:
+            buffer.write(f"Error while fetching {product_id} in {db_path}: {error}\n\n")
+        elif product_metadata:
+            buffer.write(
+                f"Product ID: {product_id}\n"
+                f"Title: {product_metadata.get('title', 'N/A')}\n"
+                f"Subtitle: {product_metadata.get('subtitle', 'N/A')}\n"
+                f"Category: {product_metadata.get('main_category', 'N/A')}\n"
+                f"Subcategories: {product_metadata.get('categories', 'N/A')}\n"
+                f"Average Rating: {product_metadata.get('average_rating', 'N/A')}\n"
+                f"Rating Number: {product_metadata.get('rating_number', 'N/A')}\n"
+                f"Author: {product_metadata.get('author', 'N/A')}\n"
+                f"Bought from: {product_metadata.get('store', 'N/A')}\n\n"
+            )
+        else:
+            buffer.write(f"Product ID: {product_id} not found in {db_path}\n\n")
+    return buffer.getvalue()
+
+def save_community_reports(selections, db_path, output_dir="../output", max_workers=None):
+    '''
+    Save product metadata of selected communities to files.
+    Metadata of all products of all selections is fetched in one bulk pass, then every community
+    file is rendered in memory and written by a pool of threads.
+    Parameters:
+        selections (dict): dictionary where keys are names of selections (e.g. "largest"), values are dictionaries
+            where keys are method names, values are lists of communities
+        db_path (str): path to SQLite database
+        output_dir (str): directory with outputs of methods
+        max_workers (int): number of threads, default of ThreadPoolExecutor if None
+    Returns:
+        None
+    '''
+    jobs = []
+    asins = {}
+    for prefix, communities in selections.items():
+        for method, community_list in communities.items():
+            directory = os.path.join(output_dir, method, prefix)
+            os.makedirs(directory, exist_ok=True)
+            for i, community in enumerate(community_list):
+                jobs.append((os.path.join(directory, f"community_{i}.txt"), community))
+                asins.update(dict.fromkeys(community))
+    try:
+        metadata = database.get_client(db_path).get_many(asins)
+        error = None
+    except sqlite3.Error as e:
+        metadata, error = {}, e
+
+    def write(job):
+        filename, community = job
+        text = render_community(community, metadata, db_path, error)
+        with open(filename, "w") as f:
+            f.write(text)
+
+    with ThreadPoolExecutor(max_workers) as executor:
+        list(executor.map(write, jobs))
+    for prefix, communities in selections.items():
+        files = sum(len(community_list) for community_list in communities.values())
+        print(f"Saved {files} {prefix} communities of {', '.join(communities)} to {output_dir}/<method>/{prefix}")
+
 def save_communities(communities, db_path, prefix):
     '''
     Save product metadata of communities to files.
@@ -146,61 +196,97 @@ def save_communities(communities, db_path, prefix):
         prefix (str): prefix for output directory
     Returns:
         None'''
-    for method, community_list in communities.items():
-        for i, community in enumerate(community_list):
-            directory = f"../output/{method}/{prefix}"
-            os.makedirs(directory, exist_ok=True)
-            
-            with open(f"../output/{method}/{prefix}/community_{i}.txt", "w") as f:
-                f.write(f"Size: {len(community)}\n")
-                f.write("\n")
-                for product_id in community:
-                    #print(f"{type(product_id)}")
-                    try:
-                        product_metadata = database.get_metadata(product_id, db_path)
-                        if product_metadata:
-                            f.write(f"Product ID: {product_id}\n")
-                            f.write(f"Title: {product_metadata.get('title', 'N/A')}\n")
-                            f.write(f"Subtitle: {product_metadata.get('subtitle', 'N/A')}\n")
-                            f.write(f"Category: {product_metadata.get('main_category', 'N/A')}\n")
-                            f.write(f"Subcategories: {product_metadata.get('categories', 'N/A')}\n")
-                            f.write(f"Average Rating: {product_metadata.get('average_rating', 'N/A')}\n")
-                            f.write(f"Rating Number: {product_metadata.get('rating_number', 'N/A')}\n")
-                            f.write(f"Author: {product_metadata.get('author', 'N/A')}\n")
-                            f.write(f"Bought from: {product_metadata.get('store', 'N/A')}\n")
-                            f.write("\n")
-                        else:
-                            f.write(f"Product ID: {product_id} not found in {db_path}\n")
-                            f.write("\n")
-                    except sqlite3.Error as e:
-                        f.write(f"Error while fetching {product_id} in {db_path}: {e}\n")
-                        f.write("\n")
-                else:
-                    f.write(f"Product ID: {product_id}\n")
-                    f.write("Metadata not found\n\n")
-            print(f"Saved {prefix} {method} community {i} to {prefix}/{method}/community_{i}.txt")
+    save_community_reports({prefix: communities}, db_path)
+
+def save_community_statistics(clusters, community_stats, output_dir="../output"):
+    '''
+    Save statistics of every community to tab separated file in directory of each method.
+    Parameters:
+        clusters (dict): dictionary where keys are method names, values are Partition objects or partition results.
+        community_stats (dict): dictionary where keys are method names, values are results of community_statistics()
+        output_dir (str): directory with outputs of methods
+    Returns:
+        None
+    '''
+    columns = ["sizes", "internal_edges", "internal_weight", "cut_weight", "density", "conductance", "modularity"]
+    for method, cluster in clusters.items():
+        partition = as_partition(cluster)
+        stats = community_stats[method]
+        os.makedirs(os.path.join(output_dir, method), exist_ok=True)
+        filename = os.path.join(output_dir, method, "community_statistics.tsv")
+        rows = ["community\t" + "\t".join(columns)]
+        for c in partition.by_size[::-1]:
+            rows.append("\t".join([str(partition.label_ids[c])] + [f"{stats[column][c]:g}" for column in columns]))
+        with open(filename, 'w') as f:
+            f.write("\n".join(rows) + "\n")
+        print(f"Community statistics of {method} saved to {filename}")
+
+def save_resolution_sweep(sweep, output_dir="../output/resolution_sweep"):
+    '''
+    Save summary of resolution sweep to tab separated file and partition of every resolution
+    to .npz file, which can be loaded later with Partition.load().
+    Parameters:
+        sweep (dict): result of resolution_sweep()
+        output_dir (str): directory to save files to
+    Returns:
+        None
+    '''
+    os.makedirs(output_dir, exist_ok=True)
+    quantiles = list(next(iter(sweep.values()))["size_quantiles"]) if sweep else []
+    rows = ["resolution\tmodularity\tcommunities\t" + "\t".join(f"size_q{q:g}" for q in quantiles) + "\tpartition"]
+    for resolution, result in sorted(sweep.items()):
+        filename = f"leiden_{resolution:g}.npz"
+        Partition.from_dict(result["partition"]).save(os.path.join(output_dir, filename))
+        sizes = "\t".join(f"{result['size_quantiles'][q]:g}" for q in quantiles)
+        rows.append(f"{resolution:g}\t{result['modularity']:.6f}\t{result['communities']}\t{sizes}\t{filename}")
+    with open(os.path.join(output_dir, "resolution_sweep.tsv"), 'w') as f:
+        f.write("\n".join(rows) + "\n")
+    print(f"Resolution sweep saved to {output_dir}")
+
+def save_consensus_stability(consensus, output_dir="../output/consensus"):
+    '''
+    Save consensus community and stability of every node to tab separated file, least stable nodes first.
+    Parameters:
+        consensus (dict): result of consensus_clustering()
+        output_dir (str): directory to save file to
+    Returns:
+        None
+    '''
+    os.makedirs(output_dir, exist_ok=True)
+    filename = os.path.join(output_dir, "stability.tsv")
+    stability = consensus["stability"]
+    rows = ["node\tcommunity\tstability"]
+    for node in sorted(stability, key=stability.get):
+        rows.append(f"{node}\t{consensus['partition'][node]}\t{stability[node]:.4f}")
+    with open(filename, 'w') as f:
+        f.write("\n".join(rows) + "\n")
+    print(f"Stability of {consensus['runs']} clustering runs saved to {filename}")
 
-def save_central_nodes(G, db_path, amount=10, output_dir="../output/centralities"):
+def save_central_nodes(G, db_path, amount=10, output_dir="../output/centralities", results=None):
     '''
     Save most central nodes in graph to files.
-    Finds most central nodes using degree, closeness and betweenness centrality and saves them to files.
+    Finds most central nodes using measures of centrality.analyze_centrality() and saves them to files.
     Parameters:
-        G (nx.Graph): graph to analyze
+        G (CSRGraph): graph to analyze
         db_path (str): path to SQLite database
+        results (dict): already calculated result of analyze_centrality(), calculated if None
     Returns:
         None
     '''
-    results = analyze_centrality(G, amount)
+    if results is None:
+        results = analyze_centrality(G, amount)
     os.makedirs(output_dir, exist_ok=True)
+    metadata = database.get_client(db_path).get_many([node for nodes in results.values() for node, _, _ in nodes])
     for measure, nodes in results.items():
         filename = os.path.join(output_dir, f"{measure.replace(' ', '_').lower()}_centrality.txt")
         with open(filename, 'w') as f:
             mean_rating = 0
-            for node, value in nodes:
-                product_metadata = database.get_metadata(node, db_path)
+            for node, value, error in nodes:
+                product_metadata = metadata[node]
                 r_number = product_metadata.get('rating_number', 'N/A')
                 subcategories = product_metadata.get('categories', 'N/A')
                 f.write(f"Centrality: {value}\n")
+                f.write(f"Error bound: {error}\n")
                 f.write(f"Product ID: {node}\n")
                 f.write(f"Title: {product_metadata.get('title', 'N/A')}\n")
                 f.write(f"Category: {product_metadata.get('main_category', 'N/A')}\n")
@@ -214,26 +300,26 @@ def save_central_nodes(G, db_path, amount=10, output_dir="../output/centralities
             mean_rating/=amount
         print(f"{measure} saved to {filename}. Mean rating: {mean_rating}")
     compare_centralities(results)
-    mean_revs_amount(G)
+    mean_revs_amount(G, db_path=db_path)
 
 def mean_revs_amount(graph, amount = 1000, db_path = '../data/metadata.db'):
     '''
     Use Monte Carlo technique for finding mean rating number
     Used for comparing mean node with most central nodes
+    Rating number is read from typed column, products without rating number are not counted in mean.
     Parameters:
-        graph (nx.Graph): analyzed graph
+        graph (CSRGraph): analyzed graph
         amount (int): amount of nodes to be randomly chosen
         db_path (str): path to metadata database
     Returns:
         None
     '''
-    random_nodes = random.sample(list(graph.nodes), amount)
-    rev_amount= 0
-    for node in random_nodes:
-        product_metadata = database.get_metadata(node, db_path)
-        rev_amount += product_metadata.get('rating_number')
-    rev_amount/=amount
-    print(f"Mean rating number: {rev_amount}")
+    random_nodes = random.sample(graph.ids.tolist(), amount)
+    client = database.get_client(db_path)
+    fields = client.get_fields(random_nodes, ["rating_number"])
+    values = [product['rating_number'] for product in fields.values() if product['rating_number'] is not None]
+    rev_amount = sum(values) / len(values) if values else float("nan")
+    print(f"Mean rating number: {rev_amount} ({len(values)} of {amount} products with rating number)")
 
 def compare_centralities(results):
     '''
@@ -241,7 +327,7 @@ def compare_centralities(results):
     Jaccard similarity is calculated as intersection of nodes found by two measures divided by union of nodes found by two measures.
     It is used to print out similarity between two centralities, rather than saving it, because its only one line. 
     Parameters:
-        results (dict): dictionary where keys are centrality measures, values are lists of tuples (node, centrality value)
+        results (dict): dictionary where keys are centrality measures, values are lists of tuples (node, centrality value, error bound)
     Returns:
         None
     '''
@@ -250,8 +336,8 @@ def compare_centralities(results):
         for j in range(i+1, len(metrics)):
             metric1 = metrics[i]
             metric2 = metrics[j]
-            nodes1 = set([node for node, _ in results[metric1]])
-            nodes2 = set([node for node, _ in results[metric2]])
+            nodes1 = set([node for node, _, _ in results[metric1]])
+            nodes2 = set([node for node, _, _ in results[metric2]])
             similarity = jaccard_similarity(nodes1, nodes2)
             print(f"Similarity between {metric1} and {metric2}: {similarity}")
    
@@ -259,25 +345,26 @@ def save_basic_stats(graph, filepath = '../output/basic_stats.txt'):
     '''
     Finds graphs statistics and saves it in LaTeX friendly format
     Parameters:
-        graph (nx.Graph): examinated graph
+        graph (nx.Graph or CSRGraph): examinated graph
         filepath (str): path to file where results are saved
     Returns:
         None
     '''
+    graph = as_csr_graph(graph)
     with open(filepath, 'w') as f:
         num_nodes = graph.number_of_nodes()
         f.write(f"Liczba wierzchołków & {num_nodes} \\\\ \\hline \n")
         num_edges = graph.number_of_edges()
         f.write(f"Liczba krawędzi & {num_edges} \\\\ \\hline \n")
-        avg_degree = sum(dict(graph.degree()).values()) / num_nodes
+        avg_degree = 2 * num_edges / num_nodes
         f.write(f"Średni stopień wierzchołków & {avg_degree} \\\\ \\hline \n")
-        num_components = nx.number_connected_components(graph)
+        num_components, _ = graph.connected_components()
         f.write(f"Liczba spójnych składowych & {num_components} \\\\ \\hline \n")
         # largest_cc = max(nx.connected_components(review_graph), key=len)
         # subgraph = review_graph.subgraph(largest_cc).copy()
         # avg_path_length = nx.average_shortest_path_length(subgraph)
 
-        density = nx.density(graph)
+        density = 2 * num_edges / (num_nodes * (num_nodes - 1)) if num_nodes > 1 else 0
         f.write(f"Gęstość grafu & {density} \n")
         # sample_nodes = random.sample(graph.nodes(), k=10000)
         # clustering_coeff = nx.average_clustering(graph, nodes=sample_nodes)
@@ -0,0 +1,71 @@
+import networkx as nx
+import numpy as np
+import pytest
+from centrality import analyze_centrality, degree_centrality, eigenvector_centrality, pagerank, sampled_betweenness, sampled_closeness, top_k, weighted_degree_centrality
+from graph_store import CSRGraph
+
+def connected_graph(seed=0):
+    graph = nx.connected_watts_strogatz_graph(120, 6, 0.2, seed=seed)
+    return CSRGraph.from_networkx(nx.relabel_nodes(graph, lambda node: f"P{node}"))
+
+def weighted_graph(seed=0):
+    graph = nx.relabel_nodes(nx.gnm_random_graph(80, 400, seed=seed), lambda node: f"P{node}")
+    rng = np.random.default_rng(seed)
+    for u, v in graph.edges:
+        graph[u][v]["weight"] = int(rng.integers(1, 6))
+    return CSRGraph.from_networkx(graph)
+
+def exact(measure, graph):
+    values = measure(graph.to_networkx())
+    return np.array([values[node] for node in graph.ids.tolist()])
+
+def test_degree_centralities_match_networkx():
+    graph = weighted_graph()
+    assert degree_centrality(graph) == pytest.approx(exact(nx.degree_centrality, graph))
+    strength = exact(lambda G: dict(G.degree(weight="weight")), graph)
+    assert weighted_degree_centrality(graph) == pytest.approx(strength / strength.sum())
+
+def test_eigenvector_centrality_matches_networkx():
+    graph = weighted_graph()
+    expected = exact(lambda G: nx.eigenvector_centrality_numpy(G, weight=None), graph)
+    assert eigenvector_centrality(graph) == pytest.approx(expected, abs=1e-6)
+    expected = exact(lambda G: nx.eigenvector_centrality_numpy(G, weight="weight"), graph)
+    assert eigenvector_centrality(graph, weighted=True) == pytest.approx(expected, abs=1e-6)
+
+def test_pagerank_matches_networkx():
+    graph = weighted_graph()
+    expected = exact(lambda G: nx.pagerank(G, weight="weight", tol=1e-10), graph)
+    assert pagerank(graph, tol=1e-10, max_iter=1000) == pytest.approx(expected, abs=1e-8)
+
+def test_top_k_sorts_by_score():
+    scores = np.array([0.1, 0.5, 0.3, 0.5, 0.2])
+    assert top_k(scores, list("abcde"), 3) == [("b", 0.5, 0.0), ("d", 0.5, 0.0), ("c", 0.3, 0.0)]
+    assert top_k(scores, list("abcde"), 10)[-1] == ("a", 0.1, 0.0)
+
+def test_all_sources_give_networkx_betweenness():
+    graph = connected_graph()
+    centrality, error = sampled_betweenness(graph, samples=None, processes=0)
+    assert centrality == pytest.approx(exact(nx.betweenness_centrality, graph))
+    assert not error.any()
+
+def test_all_pivots_give_networkx_closeness():
+    graph = connected_graph()
+    centrality, error = sampled_closeness(graph, samples=None, processes=0)
+    assert centrality == pytest.approx(exact(nx.closeness_centrality, graph))
+    assert not error.any()
+
+@pytest.mark.parametrize("top", [None, 5])
+def test_sampled_estimates_are_within_error_bounds(top):
+    graph = connected_graph(1)
+    for measure, reference in ((sampled_betweenness, nx.betweenness_centrality), (sampled_closeness, nx.closeness_centrality)):
+        centrality, error = measure(graph, samples=80, processes=0, seed=0, top=top)
+        assert (np.abs(centrality - exact(reference, graph)) <= error).all()
+
+def test_analyze_centrality_reports_error_bounds():
+    graph = connected_graph()
+    results = analyze_centrality(graph, 5, measures=["Degree Centrality", "Betweenness Centrality"], samples=None, processes=0)
+    betweenness = exact(nx.betweenness_centrality, graph)
+    ids = graph.ids.tolist()
+    top = sorted(range(len(ids)), key=lambda i: -betweenness[i])[:5]
+    assert [node for node, _, _ in results["Betweenness Centrality"]] == [ids[i] for i in top]
+    assert all(error == 0 for nodes in results.values() for _, _, error in nodes)
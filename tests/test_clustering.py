@@ -0,0 +1,82 @@
+import random
+import igraph as ig
+import networkx as nx
+import pytest
+from partition import as_partition
+from clustering import calculate_modularity, community_statistics, label_propagation, louvain, prepare_graph, resolution_sweep
+
+def weighted_planted_graph(seed=0):
+    graph = nx.relabel_nodes(nx.planted_partition_graph(8, 40, 0.3, 0.02, seed=seed), lambda node: f"P{node}")
+    rng = random.Random(seed)
+    for u, v in graph.edges:
+        graph[u][v]["weight"] = rng.randint(1, 5)
+    return graph
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_louvain_modularity_matches_networkx(seed):
+    graph = weighted_planted_graph(seed)
+    prepared = prepare_graph(graph)
+    partition = prepared.to_dict(louvain(prepared, seed=seed))
+    expected = nx.community.modularity(graph, nx.community.louvain_communities(graph, weight="weight", seed=seed), weight="weight")
+    assert calculate_modularity(graph, partition) >= expected - 0.01
+
+def test_modularity_matches_networkx():
+    graph = weighted_planted_graph()
+    prepared = prepare_graph(graph)
+    partition = prepared.to_dict(louvain(prepared, seed=0))
+    communities = {}
+    for node, community in partition.items():
+        communities.setdefault(community, set()).add(node)
+    for resolution in (0.5, 1.0, 2.0):
+        assert calculate_modularity(graph, partition, resolution) == pytest.approx(
+            nx.community.modularity(graph, communities.values(), weight="weight", resolution=resolution))
+
+def test_modularity_with_self_loops_matches_networkx():
+    graph = weighted_planted_graph()
+    graph.add_edge("P0", "P0", weight=3)
+    graph.add_edge("P50", "P50", weight=1)
+    prepared = prepare_graph(graph)
+    partition = prepared.to_dict(louvain(prepared, seed=0))
+    communities = {}
+    for node, community in partition.items():
+        communities.setdefault(community, set()).add(node)
+    assert calculate_modularity(graph, partition) == pytest.approx(nx.community.modularity(graph, communities.values(), weight="weight"))
+
+def test_resolution_sweep_reports_modularity_of_partitions():
+    graph = weighted_planted_graph()
+    sweep = resolution_sweep(graph, (0.5, 1.0, 2.0), processes=0, seed=0)
+    for resolution, result in sweep.items():
+        assert result["modularity"] == pytest.approx(calculate_modularity(graph, result["partition"], resolution))
+        assert result["communities"] == len(set(result["partition"].values()))
+
+def test_seeded_label_propagation_restores_igraph_generator():
+    prepared = prepare_graph(weighted_planted_graph())
+    random.seed(1)
+    expected = ig.Graph.Erdos_Renyi(n=30, p=0.2).get_edgelist()
+    assert label_propagation(prepared, seed=3) == label_propagation(prepared, seed=3)
+    random.seed(1)
+    assert ig.Graph.Erdos_Renyi(n=30, p=0.2).get_edgelist() == expected
+
+@pytest.mark.parametrize("random_labels", [False, True])
+def test_community_statistics_match_networkx(random_labels):
+    graph = weighted_planted_graph()
+    if random_labels:
+        rng = random.Random(0)
+        cluster = {node: rng.randrange(6) for node in graph}
+    else:
+        prepared = prepare_graph(graph)
+        cluster = prepared.to_dict(louvain(prepared, seed=0))
+    partition = as_partition(cluster)
+    stats = community_statistics(graph, partition)
+    for index, members in enumerate(partition.members):
+        subgraph = graph.subgraph(members)
+        size = len(members)
+        assert stats["sizes"][index] == size
+        assert stats["internal_edges"][index] == subgraph.number_of_edges()
+        assert stats["internal_weight"][index] == pytest.approx(subgraph.size(weight="weight"))
+        assert stats["cut_weight"][index] == pytest.approx(nx.cut_size(graph, members, weight="weight"))
+        assert stats["volume"][index] == pytest.approx(nx.volume(graph, members, weight="weight"))
+        assert stats["density"][index] == pytest.approx(nx.density(subgraph) if size > 1 else 0)
+        assert stats["conductance"][index] == pytest.approx(nx.conductance(graph, members, weight="weight"))
+    assert stats["modularity"].sum() == pytest.approx(
+        nx.community.modularity(graph, [set(members) for members in partition.members], weight="weight"))
@@ -0,0 +1,93 @@
+import json
+import sqlite3
+from collections import Counter
+import pytest
+from database import MetadataClient, create_metadata_db
+
+PRODUCTS = [
+    {"parent_asin": "A1", "title": "First", "main_category": "Books", "average_rating": 4.5, "rating_number": 10,
+     "author": {"name": "Author One"}, "store": "Store", "categories": ["Books", "Fantasy", "Epic"]},
+    {"parent_asin": "A2", "title": "Second", "main_category": "Books", "average_rating": "3.0", "rating_number": 2,
+     "author": None, "store": None, "categories": ["Books", "Fantasy"]},
+    {"parent_asin": "A3", "title": "Third", "categories": []},
+]
+
+def write_jsonl(path):
+    with open(path, "w") as f:
+        for product in PRODUCTS:
+            f.write(json.dumps(product) + "\n")
+
+def expected_counts(asins):
+    return Counter(category for product in PRODUCTS if product["parent_asin"] in asins for category in product["categories"])
+
+@pytest.fixture
+def db_path(tmp_path):
+    write_jsonl(tmp_path / "meta.jsonl")
+    path = str(tmp_path / "metadata.db")
+    create_metadata_db(str(tmp_path / "meta.jsonl"), path, processes=1)
+    return path
+
+@pytest.fixture
+def old_db_path(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE metadata (asin TEXT PRIMARY KEY, data TEXT)")
+    conn.executemany("INSERT INTO metadata (asin, data) VALUES (?, ?)", [(product["parent_asin"], json.dumps(product)) for product in PRODUCTS])
+    conn.commit()
+    conn.close()
+    return path
+
+def test_category_counts(db_path):
+    client = MetadataClient(db_path)
+    assert client.category_counts(["A1", "A2", "A3", "missing"]) == expected_counts({"A1", "A2", "A3"})
+    assert client.category_counts(["A1"]) == expected_counts({"A1"})
+    assert client.category_counts([]) == {}
+
+def test_category_counts_of_database_without_category_table(old_db_path):
+    client = MetadataClient(old_db_path)
+    assert client.category_counts(["A1", "A2"]) == expected_counts({"A1", "A2"})
+    client.close()
+    assert MetadataClient(old_db_path).category_counts(["A2"]) == expected_counts({"A2"})
+
+def expected_record(product):
+    record = {
+        "title": product.get("title"),
+        "main_category": product.get("main_category"),
+        "average_rating": float(product["average_rating"]) if "average_rating" in product else None,
+        "rating_number": product.get("rating_number"),
+        "author": (product.get("author") or {}).get("name"),
+        "store": product.get("store"),
+    }
+    record = {field: value for field, value in record.items() if value is not None}
+    record["categories"] = product["categories"]
+    return record
+
+@pytest.mark.parametrize("fixture", ["db_path", "old_db_path"])
+def test_get_many_reads_typed_fields(fixture, request):
+    client = MetadataClient(request.getfixturevalue(fixture))
+    records = client.get_many(["A1", "A2", "A3", "missing"])
+    assert records == {**{product["parent_asin"]: expected_record(product) for product in PRODUCTS}, "missing": None}
+    assert client.get("A1") == expected_record(PRODUCTS[0])
+    assert client.hits == 1 and client.misses == 4
+
+def test_get_many_raw_decodes_json(db_path):
+    client = MetadataClient(db_path)
+    assert client.get_many(["A1", "A2", "missing"], raw=True) == {"A1": PRODUCTS[0], "A2": PRODUCTS[1], "missing": None}
+    assert client.get("A3", raw=True) == PRODUCTS[2]
+
+def test_get_fields(db_path):
+    fields = MetadataClient(db_path).get_fields(["A1", "A2", "missing"], ["rating_number", "average_rating"])
+    assert fields == {"A1": {"rating_number": 10, "average_rating": 4.5}, "A2": {"rating_number": 2, "average_rating": 3.0}}
+    with pytest.raises(ValueError):
+        MetadataClient(db_path).get_fields(["A1"], ["data"])
+
+def test_plot_data_distro_saves_counts_to_csv(db_path, tmp_path):
+    from plotting import plot_data_distro
+    output_dir = str(tmp_path) + "/"
+    values, counts = plot_data_distro(["A1", "A2", "A3"], "categories", "Category", "Products", "Categories of community", db_path, output_dir)
+    expected = expected_counts({"A1", "A2", "A3"})
+    expected.pop("Books")
+    assert dict(zip(values, counts)) == expected
+    with open(output_dir + "Categories_of_community.csv") as f:
+        assert f.read().splitlines() == ["value,count"] + [f"{value},{count}" for value, count in zip(values, counts)]
+    assert (tmp_path / "Categories_of_community.png").exists()
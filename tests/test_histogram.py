@@ -0,0 +1,45 @@
+import csv
+import numpy as np
+import pytest
+from histogram import log_bins, save_csv, value_counts
+
+def test_value_counts_of_small_integers_uses_bincount_order():
+    distinct, counts = value_counts([3, 1, 3, 0, 3, 7])
+    assert distinct.tolist() == [0, 1, 3, 7]
+    assert counts.tolist() == [1, 1, 3, 1]
+
+@pytest.mark.parametrize("values", [[10**9, 5, 10**9], [-2, 4, -2], [0.5, 0.25, 0.5]])
+def test_value_counts_matches_unique(values):
+    distinct, counts = value_counts(values)
+    expected_distinct, expected_counts = np.unique(values, return_counts=True)
+    assert distinct.tolist() == expected_distinct.tolist()
+    assert counts.tolist() == expected_counts.tolist()
+
+def test_value_counts_of_empty_values():
+    distinct, counts = value_counts([])
+    assert len(distinct) == 0 and len(counts) == 0
+
+def test_log_bins_partition_positive_values():
+    rng = np.random.default_rng(0)
+    distinct, counts = value_counts(rng.zipf(2.0, 5000))
+    bins = log_bins(distinct, counts, bins_per_decade=5)
+    assert bins["count"].sum() == counts.sum()
+    assert (bins["left"] < bins["right"]).all() and (bins["right"][:-1] <= bins["left"][1:]).all()
+    assert (bins["left"] == np.floor(bins["left"])).all() and (bins["right"] == np.floor(bins["right"])).all()
+    for left, right, count, density in zip(bins["left"], bins["right"], bins["count"], bins["density"]):
+        inside = (distinct >= left) & (distinct < right)
+        assert count == counts[inside].sum()
+        assert density == pytest.approx(count / (right - left))
+        assert left <= distinct[inside].min() and distinct[inside].max() < right
+
+def test_log_bins_skip_non_positive_values():
+    bins = log_bins(np.array([0, 1, 2]), np.array([5, 1, 1]))
+    assert bins["count"].sum() == 2
+    assert all(len(column) == 0 for column in log_bins(np.array([0]), np.array([3])).values())
+
+def test_save_csv_writes_numbers_and_text(tmp_path):
+    path = tmp_path / "counts.csv"
+    save_csv(str(path), {"value": ["Fantasy", "Arts, Music & Photography"], "count": np.array([3, 1]), "share": [0.75, 0.25]})
+    with open(path, newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows == [["value", "count", "share"], ["Fantasy", "3", "0.75"], ["Arts, Music & Photography", "1", "0.25"]]
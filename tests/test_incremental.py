@@ -0,0 +1,98 @@
+import json
+import numpy as np
+import pytest
+from data_processing import load_review_table
+from incremental import BipartiteState
+
+def write_reviews(path, pairs, start=0):
+    with open(path, 'w', encoding='utf-8') as f:
+        for i, (user, product) in enumerate(pairs):
+            f.write(json.dumps({"user_id": user, "parent_asin": product, "timestamp": (start + i) * 1000,
+                                "rating": 4.0, "text": "good book"}) + "\n")
+
+def random_pairs(count, n_users, n_products, seed):
+    rng = np.random.default_rng(seed)
+    return [(f"U{u}", f"P{p}") for u, p in zip(rng.integers(0, n_users, count), rng.integers(0, n_products, count))]
+
+def projection_weights(state):
+    upper = state.projection.tocoo()
+    return {(state.product_ids[i], state.product_ids[j]): w for i, j, w in zip(upper.row, upper.col, upper.data) if w}
+
+def kept_ids(ids, mask):
+    return {node for node, kept in zip(ids, mask) if kept}
+
+@pytest.fixture
+def reviews(tmp_path):
+    base = random_pairs(800, 300, 150, seed=0)
+    # New users and products, repeated pairs and pairs of existing nodes
+    delta = random_pairs(300, 360, 180, seed=1) + base[:20]
+    write_reviews(tmp_path / "base.json", base)
+    write_reviews(tmp_path / "delta.json", delta, start=len(base))
+    write_reviews(tmp_path / "all.json", base + delta)
+    return tmp_path
+
+def build(path, tmp_path, **params):
+    return BipartiteState.from_table(load_review_table(str(path), error_log=str(tmp_path / "errors.txt")), **params)
+
+def assert_same_state(state, rebuilt):
+    assert set(zip(np.array(state.user_ids)[state.edge_users], np.array(state.product_ids)[state.edge_products])) == \
+        set(zip(np.array(rebuilt.user_ids)[rebuilt.edge_users], np.array(rebuilt.product_ids)[rebuilt.edge_products]))
+    assert kept_ids(state.user_ids, state.kept_users) == kept_ids(rebuilt.user_ids, rebuilt.kept_users)
+    assert kept_ids(state.product_ids, state.kept_products) == kept_ids(rebuilt.product_ids, rebuilt.kept_products)
+    weights = projection_weights(state)
+    expected = projection_weights(rebuilt)
+    assert weights.keys() == expected.keys()
+    assert [weights[pair] for pair in expected] == pytest.approx(list(expected.values()))
+
+@pytest.mark.parametrize("params", [{}, {"mode": "newman"}, {"mode": "cap_drop", "max_degree": 4}, {"min_reviews": 3}])
+def test_update_matches_rebuild(reviews, params):
+    state = build(reviews / "base.json", reviews, **params)
+    state.update(str(reviews / "delta.json"), error_log=str(reviews / "errors.txt"))
+    assert_same_state(state, build(reviews / "all.json", reviews, **params))
+
+@pytest.mark.parametrize("params", [{}, {"mode": "newman"}, {"mode": "cap_drop", "max_degree": 4}])
+def test_many_small_updates_match_rebuild(tmp_path, params):
+    base = random_pairs(600, 300, 150, seed=2)
+    write_reviews(tmp_path / "base.json", base)
+    state = build(tmp_path / "base.json", tmp_path, **params)
+    pairs = list(base)
+    for i in range(8):
+        delta = random_pairs(60, 330, 170, seed=10 + i)
+        write_reviews(tmp_path / "delta.json", delta, start=len(pairs))
+        pairs += delta
+        state.update(str(tmp_path / "delta.json"), error_log=str(tmp_path / "errors.txt"))
+        if i % 3 == 2:
+            state.save(str(tmp_path / "state"))
+            state = BipartiteState.load(str(tmp_path / "state"))
+    assert len(state.user_edges.blocks) > 1
+    write_reviews(tmp_path / "all.json", pairs)
+    assert_same_state(state, build(tmp_path / "all.json", tmp_path, **params))
+
+@pytest.mark.parametrize("mode", ["cap_sample", "percentile"])
+def test_update_rejects_global_modes(reviews, mode):
+    state = build(reviews / "base.json", reviews, mode=mode)
+    with pytest.raises(ValueError, match=mode):
+        state.update(str(reviews / "delta.json"), error_log=str(reviews / "errors.txt"))
+
+def test_repeated_update_adds_nothing(reviews):
+    state = build(reviews / "base.json", reviews)
+    state.update(str(reviews / "delta.json"), error_log=str(reviews / "errors.txt"))
+    weights = projection_weights(state)
+    assert state.update(str(reviews / "delta.json"), error_log=str(reviews / "errors.txt")) == 0
+    assert projection_weights(state) == weights
+
+def test_saved_state_keeps_applied_deltas(reviews):
+    state = build(reviews / "base.json", reviews)
+    state.applied_deltas.append("hash")
+    state.key = "key"
+    state.save(str(reviews / "state"))
+    loaded = BipartiteState.load(str(reviews / "state"))
+    assert loaded.applied_deltas == ["hash"]
+    assert BipartiteState.stored_key(str(reviews / "state")) == "key"
+    assert projection_weights(loaded) == projection_weights(state)
+
+def test_stored_params_without_state(tmp_path):
+    assert BipartiteState.stored_params(str(tmp_path / "missing")) is None
+    assert BipartiteState.stored_key(str(tmp_path / "missing")) is None
+    with pytest.raises(FileNotFoundError, match="delta_path = None"):
+        BipartiteState.load(str(tmp_path / "missing"))
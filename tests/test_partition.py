@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from partition import Partition, as_partition, build_partitions
+
+CLUSTER = {"P3": 7, "P1": 2, "P4": 7, "P2": 40, "P0": 2, "P5": 7}
+
+def test_from_dict_numbers_communities_in_label_order():
+    partition = Partition.from_dict(CLUSTER)
+    assert len(partition) == 3
+    assert partition.label_ids.tolist() == [2, 7, 40]
+    assert partition.sizes.tolist() == [2, 3, 1]
+    assert partition.members == [["P1", "P0"], ["P3", "P4", "P5"], ["P2"]]
+    assert partition.by_size.tolist() == [2, 0, 1]
+    assert partition.to_dict() == CLUSTER
+
+def test_labels_for_uses_community_indices():
+    partition = Partition.from_dict(CLUSTER)
+    assert partition.labels_for(["P2", "P0", "P5"]).tolist() == [2, 0, 1]
+    with pytest.raises(KeyError):
+        partition.labels_for(["missing"])
+
+def test_save_and_load_keep_nodes_and_labels(tmp_path):
+    partition = Partition.from_dict(CLUSTER)
+    filename = str(tmp_path / "partition.npz")
+    partition.save(filename)
+    loaded = Partition.load(filename)
+    assert loaded.nodes == partition.nodes
+    assert loaded.to_dict() == CLUSTER
+    assert np.array_equal(loaded.labels, partition.labels) and np.array_equal(loaded.label_ids, partition.label_ids)
+    assert loaded.members == partition.members
+
+def test_empty_partition_round_trip(tmp_path):
+    partition = Partition.from_dict({})
+    assert len(partition) == 0 and partition.members == []
+    partition.save(str(tmp_path / "empty.npz"))
+    assert Partition.load(str(tmp_path / "empty.npz")).to_dict() == {}
+
+def test_as_partition_keeps_built_partitions():
+    partition = Partition.from_dict(CLUSTER)
+    assert as_partition(partition) is partition
+    partitions = build_partitions({"a": partition, "b": CLUSTER})
+    assert partitions["a"] is partition and partitions["b"].to_dict() == CLUSTER
@@ -0,0 +1,71 @@
+from itertools import combinations
+import networkx as nx
+import numpy as np
+import scipy.sparse as sp
+from projection import limit_heavy_users, project_incidence, projection_to_csr, projection_to_graph
+
+def random_incidence(n_users=300, n_products=120, reviews=1500, seed=0):
+    rng = np.random.default_rng(seed)
+    users = rng.integers(0, n_users, reviews)
+    products = rng.integers(0, n_products, reviews)
+    incidence = sp.csr_array((np.ones(reviews, dtype=np.int32), (users, products)), shape=(n_users, n_products))
+    incidence.data[:] = 1
+    return incidence
+
+def pairwise_projection(incidence, products):
+    '''
+    Edge-by-edge projection of every pair of products reviewed by the same user.
+    '''
+    product_graph = nx.Graph()
+    for user in range(incidence.shape[0]):
+        rated = [products[p] for p in incidence.indices[incidence.indptr[user]:incidence.indptr[user + 1]]]
+        for p1, p2 in combinations(rated, 2):
+            if product_graph.has_edge(p1, p2):
+                product_graph[p1][p2]['weight'] += 1
+            else:
+                product_graph.add_edge(p1, p2, weight=1)
+    return product_graph
+
+def edge_weights(graph):
+    return {frozenset((u, v)): w for u, v, w in graph.edges(data="weight")}
+
+def test_sparse_projection_matches_pairwise_loop():
+    incidence = random_incidence()
+    products = [f"P{i}" for i in range(incidence.shape[1])]
+    projected = projection_to_graph(project_incidence(incidence), products)
+    expected = pairwise_projection(incidence, products)
+    assert set(projected.nodes) == set(expected.nodes)
+    assert edge_weights(projected) == edge_weights(expected)
+
+def test_newman_weights_match_pairwise_loop():
+    incidence = random_incidence(seed=1)
+    degrees = np.diff(incidence.indptr)
+    projection = project_incidence(*limit_heavy_users(incidence, "newman"))
+    expected = np.zeros(projection.shape)
+    for user in range(incidence.shape[0]):
+        rated = incidence.indices[incidence.indptr[user]:incidence.indptr[user + 1]]
+        for p1, p2 in combinations(rated, 2):
+            expected[p1, p2] += 1 / (degrees[user] - 1)
+            expected[p2, p1] += 1 / (degrees[user] - 1)
+    np.testing.assert_allclose(projection.toarray(), expected)
+
+def test_percentile_ignores_filtered_users():
+    incidence = random_incidence(n_users=1000, reviews=5000, seed=2)
+    padded = sp.vstack([incidence, sp.csr_array((9000, incidence.shape[1]), dtype=np.int32)]).tocsr()
+    limited, _ = limit_heavy_users(padded, "percentile", percentile=90)
+    expected, _ = limit_heavy_users(incidence, "percentile", percentile=90)
+    assert limited.nnz == expected.nnz > 0
+
+def test_projection_csr_matches_networkx_graph():
+    incidence = random_incidence(n_users=400, n_products=300, reviews=600, seed=3)
+    products = [f"P{i}" for i in range(incidence.shape[1])]
+    projection = project_incidence(incidence)
+    graph = projection_to_csr(projection, products)
+    expected = projection_to_graph(projection, products)
+    assert sorted(graph.ids.tolist()) == sorted(expected.nodes)
+    assert edge_weights(graph.to_networkx()) == edge_weights(expected)
+    count, _ = graph.connected_components()
+    assert count == nx.number_connected_components(expected)
+    largest = max(nx.connected_components(expected), key=len)
+    assert set(graph.largest_component().ids.tolist()) == largest
+    assert edge_weights(graph.largest_component().to_networkx()) == edge_weights(expected.subgraph(largest))
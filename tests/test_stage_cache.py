@@ -0,0 +1,78 @@
+import os
+import time
+import types
+from stage_cache import StageCache, file_hash
+
+def make_module(path, source):
+    path.write_text(source)
+    module = types.ModuleType(path.stem)
+    module.__file__ = str(path)
+    return module
+
+def counting(value):
+    calls = []
+    def compute():
+        calls.append(1)
+        return value
+    return compute, calls
+
+def test_stage_computed_once_and_loaded(tmp_path):
+    cache = StageCache(str(tmp_path / "cache"))
+    compute, calls = counting({"a": 1})
+    assert cache.stage("s", compute, ["input"], {"p": 1}).value == {"a": 1}
+    assert StageCache(str(tmp_path / "cache")).stage("s", compute, ["input"], {"p": 1}).value == {"a": 1}
+    assert len(calls) == 1
+
+def test_key_changes_with_inputs_params_and_code(tmp_path):
+    cache = StageCache(str(tmp_path / "cache"))
+    module = make_module(tmp_path / "stage_module.py", "x = 1\n")
+    key = cache.key("s", ["input"], {"p": 1}, [module])
+    assert cache.key("s", ["input"], {"p": 1}, [module]) == key
+    assert cache.key("s", ["other"], {"p": 1}, [module]) != key
+    assert cache.key("s", ["input"], {"p": 2}, [module]) != key
+    assert cache.key("t", ["input"], {"p": 1}, [module]) != key
+    make_module(tmp_path / "stage_module.py", "x = 2\n")
+    assert cache.key("s", ["input"], {"p": 1}, [module]) != key
+
+def test_edited_module_recomputes_stage(tmp_path):
+    cache = StageCache(str(tmp_path / "cache"))
+    module = make_module(tmp_path / "stage_module.py", "x = 1\n")
+    compute, calls = counting(1)
+    cache.stage("s", compute, modules=[module]).value
+    cache.stage("s", compute, modules=[module]).value
+    make_module(tmp_path / "stage_module.py", "x = 2\n")
+    cache.stage("s", compute, modules=[module]).value
+    assert len(calls) == 2
+
+def test_file_hash_remembered_until_file_changes(tmp_path):
+    path = tmp_path / "input.json"
+    path.write_text("first")
+    remembered = str(tmp_path / "hashes.json")
+    first = file_hash(str(path), remembered)
+    assert file_hash(str(path), remembered) == first
+    path.write_text("second line")
+    assert file_hash(str(path), remembered) != first
+
+def test_eviction_by_age_and_size(tmp_path):
+    cache = StageCache(str(tmp_path / "cache"))
+    old = cache.stage("old", lambda: b"x" * 1000)
+    new = cache.stage("new", lambda: b"y" * 1000)
+    old.value, new.value
+    past = time.time() - 40 * 24 * 3600
+    os.utime(os.path.join(old.path, "meta.json"), (past, past))
+    assert cache.evict() == 1
+    assert not old.cached and new.cached
+
+    newer = cache.stage("newer", lambda: b"z" * 1000)
+    newer.value
+    past = time.time() - 3600
+    os.utime(os.path.join(new.path, "meta.json"), (past, past))
+    cache.max_bytes = 1500
+    assert cache.evict() == 1
+    assert not new.cached and newer.cached
+
+def test_incomplete_entries_removed(tmp_path):
+    cache = StageCache(str(tmp_path / "cache"))
+    os.makedirs(tmp_path / "cache" / "broken-0000")
+    cache.evict()
+    assert not os.path.exists(tmp_path / "cache" / "broken-0000")